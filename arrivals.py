@@ -0,0 +1,281 @@
+"""
+Open loop load generation of charging sessions.
+
+An arrival process is an iterator of offsets, in seconds from the start of the load, at which a new charging session
+begins. :class:`LoadGenerator` starts each session on an idle, already connected ChargePoint at its offset, whatever
+the state of the previous sessions, so the offered load is held regardless of how the broker keeps up.
+
+>>> generator = LoadGenerator(chargers, poisson(rate=2), session_seconds=600, duration=3600)
+>>> report = await generator.run()
+"""
+import asyncio
+import datetime
+import math
+import random
+
+from collections import deque
+
+from clock import Clock
+
+
+def poisson(rate, seed=None):
+    """
+    Poisson arrivals, with exponential gaps of mean ``1 / rate``.
+
+    Parameters
+    ----------
+    rate : float
+        Sessions per second.
+    seed : int/None
+        Seed of the random generator.
+    """
+    rng = random.Random(seed)
+    offset = 0.0
+    while True:
+        offset += rng.expovariate(rate)
+        yield offset
+
+
+def fixed_rate(rate):
+    """
+    Arrivals evenly spaced by ``1 / rate`` seconds.
+
+    Parameters
+    ----------
+    rate : float
+        Sessions per second.
+    """
+    offset = 0.0
+    while True:
+        yield offset
+        offset += 1 / rate
+
+
+def ramp(start_rate, end_rate, duration):
+    """
+    Evenly spaced arrivals whose rate changes linearly from ``start_rate`` to ``end_rate`` along ``duration``
+    seconds, staying at ``end_rate`` afterwards.
+
+    Parameters
+    ----------
+    start_rate : float
+        Sessions per second at the start.
+    end_rate : float
+        Sessions per second after ``duration``.
+    duration : float
+        Seconds of the ramp.
+    """
+    offset = 0.0
+    while True:
+        progress = min(offset / duration, 1.0) if duration > 0 else 1.0
+        rate = start_rate + (end_rate - start_rate) * progress
+        yield offset
+        offset += 1 / max(rate, 1e-9)
+
+
+def trace(timestamps):
+    """
+    Replay the arrivals of a recorded trace, keeping the gaps between its timestamps.
+
+    Parameters
+    ----------
+    timestamps : list
+        Epoch seconds or datetimes of each session start.
+    """
+    seconds = sorted(t.timestamp() if isinstance(t, datetime.datetime) else float(t) for t in timestamps)
+    for timestamp in seconds:
+        yield timestamp - seconds[0]
+
+
+def load_trace(path):
+    """
+    Read a trace file with one session start per line, as epoch seconds or ISO 8601 datetimes.
+
+    Parameters
+    ----------
+    path : str
+        Path to the trace file.
+
+    Returns
+    -------
+    list
+        Epoch seconds of each session start.
+    """
+    timestamps = []
+    with open(path, "r") as trace_file:
+        for line in trace_file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                timestamps.append(float(line))
+            except ValueError:
+                timestamps.append(datetime.datetime.fromisoformat(line.replace("Z", "+00:00")).timestamp())
+    return timestamps
+
+
+_RATE_SPECS = {
+    "poisson": "poisson:<rate>",
+    "fixed": "fixed:<rate>",
+    "ramp": "ramp:<start_rate>:<end_rate>:<seconds>"
+}
+
+
+def parse_arrivals(spec):
+    """
+    Build an arrival process from a text spec.
+
+    Parameters
+    ----------
+    spec : str
+        One of ``poisson:<rate>``, ``fixed:<rate>``, ``ramp:<start_rate>:<end_rate>:<seconds>`` or
+        ``trace:<path>``.
+
+    Returns
+    -------
+    iterator
+        The arrival process.
+
+    Raises
+    ------
+    ValueError
+        If the process is unknown, or its rates are not positive numbers (a rate of 0 would never start the next
+        session) or the ramp duration is negative.
+    """
+    kind, _, arguments = spec.partition(":")
+    if kind == "trace":
+        return trace(load_trace(arguments))
+    elif kind not in _RATE_SPECS:
+        raise ValueError("unknown arrival process {0}".format(spec))
+
+    try:
+        numbers = [float(argument) for argument in arguments.split(":")]
+    except ValueError:
+        numbers = []
+    if len(numbers) == 3 and kind == "ramp":
+        rates, duration = numbers[:2], numbers[2]
+    elif len(numbers) == 1 and kind != "ramp":
+        rates, duration = numbers, 0.0
+    else:
+        rates, duration = [], -1.0
+    if not rates or not all(0 < rate < math.inf for rate in rates) or not 0 <= duration < math.inf:
+        raise ValueError("arrival process must be {0} with positive rates, not {1!r}".format(_RATE_SPECS[kind], spec))
+
+    if kind == "poisson":
+        return poisson(rate=numbers[0])
+    elif kind == "fixed":
+        return fixed_rate(rate=numbers[0])
+    else:
+        start_rate, end_rate, duration = numbers
+        return ramp(start_rate=start_rate, end_rate=end_rate, duration=duration)
+
+
+class LoadGenerator:
+    """
+    Starts charging sessions on connected chargers following an arrival process.
+
+    Attributes
+    ----------
+    chargers : list
+        Connected ChargePoints. Each one runs at most one session at a time.
+    arrivals : iterator
+        Arrival process giving the offset of each session start.
+    session_seconds : float/callable
+        Duration of each session, or a function returning it.
+    duration : float
+        Seconds during which sessions are started.
+    clock : clock.Clock
+        Clock used to wait for each arrival.
+    """
+    def __init__(self, chargers, arrivals, session_seconds, duration, clock=None):
+        self.chargers = chargers
+        self.arrivals = arrivals
+        self.session_seconds = session_seconds
+        self.duration = duration
+        self.clock = clock if clock is not None else Clock()
+        self.scheduled = 0
+        self.started = 0
+        self.completed = 0
+        self.rejected = 0
+        self.target_messages = 0
+
+    def _next_session_seconds(self):
+        if callable(self.session_seconds):
+            return self.session_seconds()
+        return self.session_seconds
+
+    def _session_messages(self, seconds):
+        # Messages a session of ``seconds`` sends when nothing is dropped: its actions, one meter value per interval
+        if not self.chargers:
+            return 0
+        charge_point = self.chargers[0]
+        actions = charge_point.actions
+        messages = sum(action in actions for action in ('authorize', 'start_transaction', 'stop_transaction'))
+        if 'meter_values' in actions:
+            messages += math.ceil(seconds / charge_point.sample_interval_seconds)
+        return messages
+
+    async def _session(self, charge_point, idle, seconds):
+        try:
+            await charge_point.charge(charging_seconds=seconds)
+            self.completed += 1
+        finally:
+            idle.append(charge_point)
+
+    def _messages_sent(self):
+        return sum(cp.mqtt_client.messages_sent for cp in self.chargers)
+
+    async def run(self):
+        """
+        Start the sessions along ``duration`` and wait for the last ones to finish.
+
+        Returns
+        -------
+        dict
+            Report with the target and achieved sessions per second, the target (every scheduled session sending
+            all its messages) and achieved messages per second, and the number of sessions scheduled, started,
+            completed and rejected because no charger was idle.
+        """
+        idle = deque(self.chargers)
+        sessions = set()
+        messages_before = self._messages_sent()
+        start = self.clock.time()
+
+        for offset in self.arrivals:
+            if offset > self.duration:
+                break
+            self.scheduled += 1
+            seconds = self._next_session_seconds()
+            self.target_messages += self._session_messages(seconds)
+
+            await self.clock.sleep(max(0.0, start + offset - self.clock.time()))
+
+            if not idle:
+                self.rejected += 1
+                continue
+
+            self.started += 1
+            session = asyncio.ensure_future(self._session(idle.popleft(), idle, seconds))
+            sessions.add(session)
+            session.add_done_callback(sessions.discard)
+
+        load_seconds = max(self.clock.time() - start, self.duration)
+
+        if sessions:
+            await asyncio.gather(*sessions)
+
+        elapsed = self.clock.time() - start
+        messages = self._messages_sent() - messages_before
+        return {
+            "target_sessions_per_second": self.scheduled / self.duration if self.duration else 0.0,
+            "achieved_sessions_per_second": self.started / load_seconds if load_seconds else 0.0,
+            "target_messages_per_second": self.target_messages / elapsed if elapsed else 0.0,
+            "messages_per_second": messages / elapsed if elapsed else 0.0,
+            "target_messages": self.target_messages,
+            "messages_sent": messages,
+            "sessions_scheduled": self.scheduled,
+            "sessions_started": self.started,
+            "sessions_completed": self.completed,
+            "sessions_rejected": self.rejected,
+            "elapsed_seconds": elapsed
+        }
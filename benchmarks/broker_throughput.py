@@ -0,0 +1,122 @@
+"""
+Run the simulator against the local broker stand-in at increasing fleet sizes.
+
+The broker runs in this process, on its own thread. Each fleet size runs the real scenario runner of ``main``
+(connection manager, sampling scheduler, ChargePoint, mqtt.Client) in a fresh worker process: one stage with no
+hold and a ``--seconds`` long session. The report gives the messages per second of the session, the CPU time of the
+worker per message (connection included) and the resident memory growth per charger, next to what the broker
+received.
+
+Usage::
+
+    python -m benchmarks.broker_throughput --sizes 160 1000 5000 --seconds 60 --speed virtual
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.mqtt_transport import current_rss, raise_open_files_limit
+from broker import BrokerThread
+from mqtt import TRANSPORTS
+
+
+async def measure(main, chargers, seconds):
+    from scenarios import expand_stages
+
+    devices = {f"benchmark_{index}": f"bench{index}" for index in range(chargers)}
+    stage = expand_stages({"stages": [{"chargers": chargers, "hold_seconds": 0, "charging_seconds": seconds}]})[0]
+    runner = main.make_scenario_runner(devices)
+
+    rss_before = current_rss()
+    cpu_before = time.process_time()
+    result = await runner.run_stage(stage)
+    cpu_seconds = time.process_time() - cpu_before
+    rss_growth = current_rss() - rss_before
+
+    messages = result["messages_sent"]
+    return {
+        "chargers": chargers,
+        "connected": result.get("connected", 0),
+        "sent": messages,
+        "acked": result["messages_acked"],
+        "dropped": result["messages_dropped"],
+        "messages_per_second": round(result["messages_per_second"], 1),
+        "cpu_us_per_message": round(cpu_seconds / messages * 1e6, 1) if messages else None,
+        "rss_kb_per_charger": round(rss_growth / chargers / 1024, 1),
+    }  # The worker process exits right after, closing every connection at once
+
+
+def run_worker(args):
+    raise_open_files_limit()
+    os.environ.update({
+        "DOJOT_HOST": "127.0.0.1",
+        "MQTT_PORT": str(args.port),
+        "HTTP_PORT": "0",
+        "MQTT_TRANSPORT": args.transport,
+        "MQTT_QOS": str(args.qos),
+        "SIMULATION_SPEED": args.speed,
+    })
+    import main  # Reads its settings from the environment set above
+
+    if not args.log:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    print(json.dumps(asyncio.run(measure(main, args.chargers, args.seconds))))
+
+
+def run_all(args):
+    header = ("chargers", "connected", "sent", "acked", "received", "dropped", "messages_per_second",
+              "cpu_us_per_message", "rss_kb_per_charger")
+    rows = []
+    with BrokerThread(port=args.port) as broker:
+        for chargers in args.sizes:
+            broker.reset()
+            command = [
+                sys.executable, "-m", "benchmarks.broker_throughput",
+                "--worker",
+                "--chargers", str(chargers),
+                "--port", str(broker.port),
+                "--seconds", str(args.seconds),
+                "--speed", args.speed,
+                "--transport", args.transport,
+                "--qos", str(args.qos),
+            ] + (["--log"] if args.log else [])
+            output = subprocess.run(command, capture_output=True, text=True, cwd=os.getcwd())
+            if output.returncode != 0:
+                print(f"{chargers} chargers failed:\n{output.stderr}", file=sys.stderr)
+                continue
+            row = json.loads(output.stdout.strip().splitlines()[-1])
+            row["received"] = broker.stats()["messages"]
+            rows.append(row)
+
+    print("".join(f"{column:>20}" for column in header))
+    for row in rows:
+        print("".join(f"{str(row[column]):>20}" for column in header))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=0, help="port of the broker, any free one by default")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[160, 1000, 5000])
+    parser.add_argument("--seconds", type=float, default=60, help="simulated seconds of the charging session")
+    parser.add_argument("--speed", default="virtual", help="SIMULATION_SPEED of the simulator")
+    parser.add_argument("--transport", default="asyncio", choices=list(TRANSPORTS))
+    parser.add_argument("--qos", type=int, default=0, choices=[0, 1])
+    parser.add_argument("--log", action="store_true", help="keep the per message INFO logs")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--chargers", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+    else:
+        run_all(args)
+
+
+if __name__ == "__main__":
+    main()
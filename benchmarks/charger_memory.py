@@ -0,0 +1,146 @@
+"""
+Measure the memory per simulated charger of the classic ChargePoint model and of the compact fleet.Fleet model.
+
+Each (model, fleet size) pair runs in a fresh worker process on the asyncio transport and a virtual clock. The worker
+reports the resident memory growth per charger once the chargers are built (and connected), and again halfway
+through a charging session, next to the bytes of simulator state of each charger (the ChargePoint and its
+``__dict__``, or the fleet arrays and the Charger handle, the MQTT client excluded) and the number of asyncio tasks
+alive at that point.
+
+By default the chargers are not connected and send nothing, which measures the simulator alone and fits in the open
+files limit at any size. ``--connect`` connects them to the local broker stand-in and sends every message, which
+needs two file descriptors per charger (the broker runs in this process).
+
+Usage::
+
+    python -m benchmarks.charger_memory --sizes 1000 10000 50000 --seconds 30
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+
+from benchmarks.mqtt_transport import current_rss, raise_open_files_limit
+from broker import BrokerThread
+
+
+def state_bytes(charger):
+    if hasattr(charger, "fleet"):
+        fleet = charger.fleet
+        return fleet.nbytes / len(fleet) + sys.getsizeof(charger)
+    return sys.getsizeof(charger) + sys.getsizeof(charger.__dict__)
+
+
+async def measure(main, model, chargers, seconds, connect):
+    from scenarios import ScenarioRunner, expand_stages
+
+    devices = {f"benchmark_{index}": f"bench{index}" for index in range(chargers)}
+    overrides = {"chargers": chargers, "hold_seconds": 0, "charging_seconds": seconds}
+    if not connect:
+        overrides["messages"] = []
+    stage = expand_stages({"stages": [overrides]})[0]
+
+    async def skip_connect(new_chargers):
+        return new_chargers, {}
+
+    clocks = []
+
+    def make_clock():
+        clocks.append(main.make_clock("virtual"))
+        return clocks[-1]
+
+    rss_before = current_rss()
+    fleet = main.make_fleet() if model == "compact" else None
+    runner = ScenarioRunner(devices, main.make_charger if fleet is None else fleet.add,
+                            main.connect_chargers if connect else skip_connect, make_clock, fleet=fleet)
+    await runner.connect_up_to(chargers)
+    rss_built = current_rss()
+
+    async def sample_halfway():
+        while not clocks:
+            await asyncio.sleep(0.01)
+        await clocks[-1].sleep(seconds / 2)
+        return current_rss(), len(asyncio.all_tasks()), threading.active_count()
+
+    result, (rss_session, tasks, threads) = await asyncio.gather(runner.run_stage(stage), sample_halfway())
+
+    return {
+        "model": model,
+        "chargers": chargers,
+        "connected": sum(cp.mqtt_client.connected for cp in runner.chargers),
+        "sent": result["messages_sent"],
+        "state_bytes_per_charger": round(state_bytes(runner.chargers[0])),
+        "built_bytes_per_charger": round((rss_built - rss_before) / chargers),
+        "session_bytes_per_charger": round((rss_session - rss_before) / chargers),
+        "session_mb": round((rss_session - rss_before) / 2 ** 20, 1),
+        "tasks": tasks,
+        "threads": threads,
+    }  # The worker process exits right after, closing every connection at once
+
+
+def run_worker(args):
+    raise_open_files_limit()
+    os.environ.update({
+        "DOJOT_HOST": "127.0.0.1",
+        "MQTT_PORT": str(args.port),
+        "HTTP_PORT": "0",
+        "MQTT_TRANSPORT": "asyncio",
+        "CHARGER_MODEL": args.model,
+    })
+    import main  # Reads its settings from the environment set above
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(json.dumps(asyncio.run(measure(main, args.model, args.chargers, args.seconds, args.connect))))
+
+
+def run_all(args):
+    header = ("model", "chargers", "connected", "sent", "state_bytes_per_charger", "built_bytes_per_charger",
+              "session_bytes_per_charger", "session_mb", "tasks", "threads")
+    rows = []
+    with BrokerThread(port=args.port) as broker:
+        for chargers in args.sizes:
+            for model in args.models:
+                command = [
+                    sys.executable, "-m", "benchmarks.charger_memory",
+                    "--worker",
+                    "--model", model,
+                    "--chargers", str(chargers),
+                    "--port", str(broker.port),
+                    "--seconds", str(args.seconds),
+                ] + (["--connect"] if args.connect else [])
+                output = subprocess.run(command, capture_output=True, text=True, cwd=os.getcwd())
+                if output.returncode != 0:
+                    print(f"{model} with {chargers} chargers failed:\n{output.stderr}", file=sys.stderr)
+                    continue
+                rows.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    print("".join(f"{column:>27}" for column in header))
+    for row in rows:
+        print("".join(f"{str(row[column]):>27}" for column in header))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=0, help="port of the broker, any free one by default")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--models", nargs="+", default=["classic", "compact"], choices=["classic", "compact"])
+    parser.add_argument("--seconds", type=float, default=30, help="simulated seconds of the charging session")
+    parser.add_argument("--connect", action="store_true", help="connect to the broker stand-in and send messages")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--model", help=argparse.SUPPRESS)
+    parser.add_argument("--chargers", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+    else:
+        run_all(args)
+
+
+if __name__ == "__main__":
+    main()
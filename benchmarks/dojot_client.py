@@ -0,0 +1,112 @@
+"""
+Time the Dojot client against the local Dojot stand-in and count the REST round trips of each operation.
+
+For each fleet size a fresh :class:`fake_dojot.FakeDojot` is started with the first template of ``templates.json``,
+and the client runs, in order: ``create_all_devices`` of the whole fleet, ``get_device``, ``get_device_history`` and
+``send_data_to_device`` on ``--samples`` devices (the data is published to the local MQTT broker stand-in and
+flushed), then ``delete_all_created_devices``. The report gives the time of each operation and its requests per
+call, so a change adding round trips shows up even when the latency hides nothing.
+
+Usage::
+
+    python -m benchmarks.dojot_client --sizes 160 1000 10000 --latency 0.001 --json dojot_client.json
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from broker import BrokerThread
+from dojot import Dojot, get_templates
+from fake_dojot import FakeDojot
+
+
+def measure(server, name, calls, operation):
+    server.reset()
+    start = time.perf_counter()
+    operation()
+    elapsed = time.perf_counter() - start
+    requests = server.stats()["requests"]
+    total = sum(requests.values())
+    return {
+        "operation": name,
+        "calls": calls,
+        "seconds": round(elapsed, 3),
+        "ms_per_call": round(elapsed / calls * 1000, 3),
+        "requests": total,
+        "requests_per_call": round(total / calls, 2),
+        "routes": requests
+    }
+
+
+def run_size(size, args, broker, jwt_path):
+    templates = get_templates()
+    template_label = next(iter(templates))
+    attrs = list(templates[template_label]["dynamic"])
+    devices = {template_label: [{"name": "benchmark_{0}".format(index)} for index in range(size)]}
+    labels = random.Random(size).sample([device["name"] for device in devices[template_label]],
+                                        min(args.samples, size))
+    data = dict({attr: {"value": 1.0} for attr in attrs}, timestamp="2020-02-05T20:38:54.741000Z")
+
+    with FakeDojot(latency=args.latency, history_size=args.history_size) as server:
+        server.populate(template_label=template_label, attrs=attrs, labels=[])
+        with Dojot(user="admin", password="admin", ip="127.0.0.1", http_port=server.port, mqtt_port=broker.port,
+                   templates=templates, http_pool_size=args.workers, jwt_path=jwt_path) as dojot:
+
+            def get_devices():
+                for label in labels:
+                    dojot.get_device(device_label=label)
+
+            def get_histories():
+                for label in labels:
+                    dojot.get_device_history(device_label=label, last_n=args.history_size)
+
+            def send_data():
+                for label in labels:
+                    dojot.send_data_to_device(device_label=label, data=dict(data))
+                dojot.publishers.flush(timeout=60)
+
+            rows = [
+                measure(server, "create_all_devices", size,
+                        lambda: dojot.create_all_devices(devices=devices, max_workers=args.workers)),
+                measure(server, "get_device", len(labels), get_devices),
+                measure(server, "get_device_history", len(labels), get_histories),
+                measure(server, "send_data_to_device", len(labels), send_data),
+                measure(server, "delete_all_created_devices", size,
+                        lambda: dojot.delete_all_created_devices(devices=devices, max_workers=args.workers)),
+            ]
+
+    for row in rows:
+        row["devices"] = size
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[160, 1000, 10000])
+    parser.add_argument("--samples", type=int, default=100, help="devices used by the per device operations")
+    parser.add_argument("--latency", type=float, default=0.001, help="seconds each REST request waits")
+    parser.add_argument("--history-size", type=int, default=100, help="history values of each attribute")
+    parser.add_argument("--workers", type=int, default=8, help="max_workers of the bulk operations")
+    parser.add_argument("--json", help="also write the rows, with the requests by route, to this file")
+    args = parser.parse_args()
+
+    rows = []
+    with BrokerThread(port=0) as broker, tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            rows.extend(run_size(size, args, broker, jwt_path=os.path.join(directory, ".jwt.json")))
+
+    header = ("devices", "operation", "calls", "seconds", "ms_per_call", "requests", "requests_per_call")
+    print(f"{header[0]:>8}{header[1]:>28}" + "".join(f"{column:>18}" for column in header[2:]))
+    for row in rows:
+        print(f"{row['devices']:>8}{row['operation']:>28}" + "".join(f"{row[column]:>18}" for column in header[2:]))
+
+    if args.json is not None:
+        with open(args.json, "w") as json_file:
+            json.dump(rows, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
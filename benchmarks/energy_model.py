@@ -0,0 +1,61 @@
+"""
+Measure the cost of advancing every open charging session by one tick, batched and one session at a time.
+
+The batched case is :meth:`energy.ChargingSessions.advance`, one NumPy call over every open session, as the sampling
+scheduler and the fleet do each tick. The per session case calls :func:`energy.cc_cv_step` once per session, as each
+charger advancing its own session would.
+
+Usage::
+
+    python -m benchmarks.energy_model --sizes 1000 10000 50000 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from energy import CHARGER_POWER_W, ChargingSessions, cc_cv_step
+
+
+def build(sessions_count):
+    sessions = ChargingSessions(capacity=sessions_count, seed=0)
+    for index in range(sessions_count):
+        sessions.open(0.0, 0, CHARGER_POWER_W[index % len(CHARGER_POWER_W)])
+    return sessions
+
+
+def time_batched(sessions, ticks):
+    start = time.perf_counter()
+    for tick in range(1, ticks + 1):
+        sessions.advance(float(tick))
+    return (time.perf_counter() - start) / ticks
+
+
+def time_per_session(sessions, ticks):
+    rows = [np.array([row]) for row in range(len(sessions))]
+    start = time.perf_counter()
+    for tick in range(1, ticks + 1):
+        for row in rows:
+            soc, grid_wh = cc_cv_step(sessions.soc[row], sessions.capacity_wh[row], sessions.power_w[row], 1.0)
+            sessions.soc[row] = soc
+            sessions.meter_wh[row] += grid_wh
+    return (time.perf_counter() - start) / ticks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000, 100000])
+    parser.add_argument("--ticks", type=int, default=100, help="ticks timed in the batched case")
+    parser.add_argument("--per-session-ticks", type=int, default=2, help="ticks timed in the per session case")
+    args = parser.parse_args()
+
+    print(f"{'sessions':>10}{'batched ms/tick':>18}{'batched ns/session':>20}{'per session ms/tick':>22}{'speedup':>10}")
+    for size in args.sizes:
+        batched = time_batched(build(size), args.ticks)
+        per_session = time_per_session(build(size), args.per_session_ticks)
+        print(f"{size:>10}{batched * 1e3:>18.3f}{batched / size * 1e9:>20.1f}{per_session * 1e3:>22.1f}"
+              f"{per_session / batched:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Compare the thread-per-client MQTT transport with the shared event loop transport.
+
+Each (transport, fleet size) pair runs in a fresh process, connects that many clients to the broker, publishes
+``--messages`` meter values per client as fast as the transport accepts them and reports the number of threads,
+the resident memory growth and the publish rate.
+
+Usage::
+
+    python -m benchmarks.mqtt_transport --host localhost --port 1883 --sizes 160 1000 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+from mqtt import TRANSPORTS
+
+
+PAYLOAD = json.dumps({
+    "meter_values": [
+        2,
+        "2961:137639",
+        "MeterValues",
+        {
+            "connectorId": 1,
+            "meterValue": [
+                {
+                    "sampledValue": [
+                        {
+                            "unit": "Percent",
+                            "context": "Transaction.Begin",
+                            "measurand": "SoC",
+                            "location": "EV",
+                            "value": 50
+                        }
+                    ]
+                }
+            ]
+        }
+    ]
+})
+
+
+def current_rss():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def raise_open_files_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def measure(transport, chargers, host, port, messages, timeout):
+    rss_before = current_rss()
+
+    clients = [TRANSPORTS[transport]('admin', f'bench_{i}') for i in range(chargers)]
+
+    start = time.perf_counter()
+    for client in clients:
+        client.connect(host, port)
+        await asyncio.sleep(0)
+    connect_seconds = time.perf_counter() - start
+
+    await asyncio.sleep(1)  # Let the CONNACKs arrive before publishing
+
+    total = chargers * messages
+    start = time.perf_counter()
+    for _ in range(messages):
+        for client in clients:
+            await client.publish(PAYLOAD)  # Waits only when the client's window is full
+        await asyncio.sleep(0)
+
+    deadline = start + timeout
+    while sum(client.acked for client in clients) < total and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    publish_seconds = time.perf_counter() - start
+
+    result = {
+        "transport": transport,
+        "chargers": chargers,
+        "threads": threading.active_count(),
+        "rss_mb": round((current_rss() - rss_before) / 2 ** 20, 1),
+        "connect_seconds": round(connect_seconds, 2),
+        "published": sum(client.acked for client in clients),
+        "messages_per_second": round(total / publish_seconds, 1),
+    }
+
+    return result  # The worker process exits right after, closing every connection at once
+
+
+def run_worker(args):
+    raise_open_files_limit()
+    result = asyncio.run(measure(args.worker, args.chargers, args.host, args.port, args.messages, args.timeout))
+    print(json.dumps(result))
+
+
+def run_all(args):
+    rows = []
+    for chargers in args.sizes:
+        for transport in args.transports:
+            command = [
+                sys.executable, "-m", "benchmarks.mqtt_transport",
+                "--worker", transport,
+                "--chargers", str(chargers),
+                "--host", args.host,
+                "--port", str(args.port),
+                "--messages", str(args.messages),
+                "--timeout", str(args.timeout),
+            ]
+            output = subprocess.run(command, capture_output=True, text=True, cwd=os.getcwd())
+            if output.returncode != 0:
+                print(f"{transport} with {chargers} chargers failed:\n{output.stderr}", file=sys.stderr)
+                continue
+            rows.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    header = ("transport", "chargers", "threads", "rss_mb", "connect_seconds", "published", "messages_per_second")
+    print("".join(f"{column:>20}" for column in header))
+    for row in rows:
+        print("".join(f"{row[column]:>20}" for column in header))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[160, 1000, 5000])
+    parser.add_argument("--transports", nargs="+", default=list(TRANSPORTS), choices=list(TRANSPORTS))
+    parser.add_argument("--messages", type=int, default=10, help="messages published by each client")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for the publishes to flush")
+    parser.add_argument("--worker", choices=list(TRANSPORTS), help=argparse.SUPPRESS)
+    parser.add_argument("--chargers", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+    else:
+        run_all(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Check the precompiled OCPP templates against json.dumps and measure their encodes per second.
+
+The reference functions below build the same messages with json.dumps of the whole structure. The check runs
+every template against them on random values (unicode and escaped characters on the idTag included) and stops on
+the first difference, before any timing is done.
+
+Usage::
+
+    python -m benchmarks.ocpp_encoding --samples 10000 --number 100000
+"""
+import argparse
+import datetime
+import json
+import random
+import string
+import timeit
+
+from ocpp_messages import AUTHORIZE, START_TRANSACTION, METER_VALUES, STOP_TRANSACTION
+
+
+def reference_authorize(id_tag):
+    return json.dumps({
+        "authorize": [
+            2,
+            "abcdefg",
+            "Authorize",
+            { "idTag": id_tag }
+        ]
+    }).encode()
+
+
+def reference_meter_values(soc, energy_wh):
+    return json.dumps({
+        "meter_values": [
+            2,
+            "2961:137639",
+            "MeterValues",
+            {
+                "connectorId": 1,
+                "meterValue": [
+                    {
+                        "sampledValue": [
+                            {
+                                "unit": "Percent",
+                                "context": "Transaction.Begin",
+                                "measurand": "SoC",
+                                "location": "EV",
+                                "value": soc
+                            },
+                            {
+                                "unit": "Wh",
+                                "context": "Sample.Periodic",
+                                "measurand": "Energy.Active.Import.Register",
+                                "location": "Outlet",
+                                "value": energy_wh
+                            }
+                        ]
+                    }
+                ]
+            }
+        ]
+    }).encode()
+
+
+def reference_start_transaction(id_tag, meter_start, timestamp):
+    return json.dumps({
+        "start_transaction": [
+            2,
+            "2961:137638",
+            "StartTransaction",
+            {
+                "connectorId": 1,
+                "idTag": id_tag,
+                "meterStart": meter_start,
+                "timestamp": timestamp
+            }
+        ]
+    }).encode()
+
+
+def reference_stop_transaction(meter_stop, timestamp):
+    return json.dumps({
+        "stop_transaction": [
+            2,
+            "2961:137794",
+            "StopTransaction",
+            {
+                "reason": "Other",
+                "transactionId": 0,
+                "meterStop": meter_stop,
+                "timestamp": timestamp
+            }
+        ]
+    }).encode()
+
+
+def random_id_tag():
+    alphabet = string.ascii_letters + string.digits + "_-\"\\/\n\tçãé\u0000\U0001F600"
+    return "".join(random.choice(alphabet) for _ in range(random.randint(0, 32)))
+
+
+def random_timestamp():
+    seconds = random.uniform(0, 2 ** 31)
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).isoformat()
+
+
+def check_equivalence(samples):
+    for _ in range(samples):
+        id_tag = random_id_tag()
+        timestamp = random_timestamp()
+        soc = random.choice([random.randint(0, 100), random.uniform(0, 100), -1, 10 ** 20])
+        meter_start = random.randint(0, 10 ** 9)
+        meter_stop = meter_start + random.randint(0, 10 ** 6)
+
+        pairs = [
+            (AUTHORIZE.encode(id_tag=id_tag), reference_authorize(id_tag)),
+            (METER_VALUES.encode(soc=soc, energy_wh=meter_stop), reference_meter_values(soc, meter_stop)),
+            (START_TRANSACTION.encode(id_tag=id_tag, meter_start=meter_start, timestamp=timestamp),
+             reference_start_transaction(id_tag, meter_start, timestamp)),
+            (STOP_TRANSACTION.encode(meter_stop=meter_stop, timestamp=timestamp),
+             reference_stop_transaction(meter_stop, timestamp)),
+        ]
+        for encoded, expected in pairs:
+            if encoded != expected:
+                raise AssertionError(f"template output differs from json.dumps:\n{encoded!r}\n{expected!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samples", type=int, default=10000, help="random messages compared with json.dumps")
+    parser.add_argument("--number", type=int, default=100000, help="encodes timed per message type")
+    args = parser.parse_args()
+
+    check_equivalence(args.samples)
+    print(f"{args.samples} random messages of each type are byte for byte equal to json.dumps")
+
+    timestamp = random_timestamp()
+    cases = [
+        ("Authorize", lambda: reference_authorize("eletroposto_simulado_0"),
+         lambda: AUTHORIZE.encode(id_tag="eletroposto_simulado_0")),
+        ("MeterValues", lambda: reference_meter_values(57, 2810542),
+         lambda: METER_VALUES.encode(soc=57, energy_wh=2810542)),
+        ("StartTransaction", lambda: reference_start_transaction("eletroposto_simulado_0", 2656119, timestamp),
+         lambda: START_TRANSACTION.encode(id_tag="eletroposto_simulado_0", meter_start=2656119, timestamp=timestamp)),
+        ("StopTransaction", lambda: reference_stop_transaction(2810542, timestamp),
+         lambda: STOP_TRANSACTION.encode(meter_stop=2810542, timestamp=timestamp)),
+    ]
+
+    print(f"{'action':>20}{'json.dumps/s':>20}{'template/s':>20}{'speedup':>10}")
+    for action, reference, template in cases:
+        reference_rate = args.number / timeit.timeit(reference, number=args.number)
+        template_rate = args.number / timeit.timeit(template, number=args.number)
+        print(f"{action:>20}{reference_rate:>20,.0f}{template_rate:>20,.0f}{template_rate / reference_rate:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
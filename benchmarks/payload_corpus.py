@@ -0,0 +1,123 @@
+"""
+Compare the publish rate of live stages with the one of pre-generated payload corpus stages.
+
+The broker runs in this process, on its own thread. For each fleet size and stage mode (``STAGE_MODE`` of ``main``)
+a fresh worker process connects the chargers and runs one stage with no hold and a ``--seconds`` long session. The
+report gives the messages per second (publishing only, for corpus stages), the CPU time of the worker per message,
+and for corpus stages the seconds spent generating and publishing and the fraction spent generating, next to what
+the broker received. A corpus stage publishing no faster than the live one means the broker, not the simulator, is
+the limit.
+
+Usage::
+
+    python -m benchmarks.payload_corpus --sizes 160 1000 5000 --seconds 60
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.mqtt_transport import raise_open_files_limit
+from broker import BrokerThread
+from mqtt import TRANSPORTS
+
+
+async def measure(main, mode, chargers, seconds):
+    from scenarios import expand_stages
+
+    devices = {f"benchmark_{index}": f"bench{index}" for index in range(chargers)}
+    stage = expand_stages({"stages": [{"chargers": chargers, "hold_seconds": 0, "charging_seconds": seconds}]})[0]
+    runner = main.make_scenario_runner(devices)
+    await runner.connect_up_to(chargers)
+
+    cpu_before = time.process_time()
+    result = await main.run_stage(runner, stage)
+    cpu_seconds = time.process_time() - cpu_before
+
+    messages = result["messages_sent"]
+    return {
+        "mode": mode,
+        "chargers": chargers,
+        "sent": messages,
+        "dropped": result["messages_dropped"],
+        "messages_per_second": round(result["messages_per_second"], 1),
+        "cpu_us_per_message": round(cpu_seconds / messages * 1e6, 1) if messages else None,
+        "generation_seconds": round(result.get("generation_seconds", 0), 3) if mode == "corpus" else None,
+        "publish_seconds": round(result.get("publish_seconds", 0), 3) if mode == "corpus" else None,
+        "generation_fraction": round(result.get("generation_fraction", 0), 3) if mode == "corpus" else None,
+    }  # The worker process exits right after, closing every connection at once
+
+
+def run_worker(args):
+    raise_open_files_limit()
+    os.environ.update({
+        "DOJOT_HOST": "127.0.0.1",
+        "MQTT_PORT": str(args.port),
+        "HTTP_PORT": "0",
+        "MQTT_TRANSPORT": args.transport,
+        "SIMULATION_SPEED": args.speed,
+        "STAGE_MODE": args.mode,
+    })
+    import main  # Reads its settings from the environment set above
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(json.dumps(asyncio.run(measure(main, args.mode, args.chargers, args.seconds))))
+
+
+def run_all(args):
+    header = ("mode", "chargers", "sent", "received", "dropped", "messages_per_second", "cpu_us_per_message",
+              "generation_seconds", "publish_seconds", "generation_fraction")
+    rows = []
+    with BrokerThread(port=args.port) as broker:
+        for chargers in args.sizes:
+            for mode in args.modes:
+                broker.reset()
+                command = [
+                    sys.executable, "-m", "benchmarks.payload_corpus",
+                    "--worker",
+                    "--mode", mode,
+                    "--chargers", str(chargers),
+                    "--port", str(broker.port),
+                    "--seconds", str(args.seconds),
+                    "--speed", args.speed,
+                    "--transport", args.transport,
+                ]
+                output = subprocess.run(command, capture_output=True, text=True, cwd=os.getcwd())
+                if output.returncode != 0:
+                    print(f"{mode} with {chargers} chargers failed:\n{output.stderr}", file=sys.stderr)
+                    continue
+                row = json.loads(output.stdout.strip().splitlines()[-1])
+                row["received"] = broker.stats()["messages"]
+                rows.append(row)
+
+    print("".join(f"{column:>20}" for column in header))
+    for row in rows:
+        print("".join(f"{str(row[column]):>20}" for column in header))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=0, help="port of the broker, any free one by default")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[160, 1000, 5000])
+    parser.add_argument("--modes", nargs="+", default=["live", "corpus"], choices=["live", "corpus"])
+    parser.add_argument("--seconds", type=float, default=60, help="simulated seconds of the charging session")
+    parser.add_argument("--speed", default="virtual", help="SIMULATION_SPEED of the live stages")
+    parser.add_argument("--transport", default="asyncio", choices=list(TRANSPORTS))
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    parser.add_argument("--chargers", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+    else:
+        run_all(args)
+
+
+if __name__ == "__main__":
+    main()
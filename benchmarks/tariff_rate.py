@@ -0,0 +1,95 @@
+"""
+Compare the tariff classification of date_tools with the implementation it replaced.
+
+The timestamps are every ``--step`` seconds of ``--days`` days, from ``--start`` on the wall clock of ``--timezone``,
+by default a month minute by minute (including the window ends and a holiday). Three classifiers run on them:
+
+* ``legacy``: the former ``get_tariff_rate``, parsing the windows, building their datetimes and a holiday calendar
+  on every call (on the first ``--legacy-samples`` timestamps only, it is slow);
+* ``scalar``: ``date_tools.get_tariff_rate``, one datetime at a time;
+* ``vectorized``: ``TariffSchedule.classify`` on the whole array of POSIX timestamps.
+
+The report gives the classifications per second of each and the number of timestamps where they disagree with the
+scalar one (which must be 0).
+
+Usage::
+
+    python -m benchmarks.tariff_rate --days 30 --step 60
+"""
+import argparse
+import time
+
+from datetime import datetime
+
+import numpy as np
+import pytz
+from holidays import Brazil
+
+from date_tools import (TARIFF_RATES, from_timestamp, get_holidays, get_tariff_rate, get_tariff_schedule,
+                        interval_to_tuple, is_in_interval, is_weekend)
+
+
+def legacy_tariff_rate(datetime_object, peak_times=("18:30-21:30",),
+                       intermediate_times=("17:30-18:30", "21:30-22:30")):
+    if is_weekend(datetime_object=datetime_object):
+        return "off_peak"
+    elif datetime_object.date() in Brazil(years=datetime_object.year).keys():
+        return "off_peak"
+    for rate, intervals in (("peak", peak_times), ("intermediate", intermediate_times)):
+        for interval in intervals:
+            start_hour, start_minute, end_hour, end_minute = interval_to_tuple(interval=interval)
+            window = [
+                datetime(year=datetime_object.year, month=datetime_object.month, day=datetime_object.day,
+                         hour=hour, minute=minute, tzinfo=datetime_object.tzinfo)
+                for hour, minute in ((start_hour, start_minute), (end_hour, end_minute))
+            ]
+            if is_in_interval(datetime_object=datetime_object, interval_start=window[0], interval_end=window[1]):
+                return rate
+    return "off_peak"
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--start", default="2024-11-01", help="first day, YYYY-MM-DD")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--step", type=float, default=60, help="seconds between two timestamps")
+    parser.add_argument("--timezone", default="America/Belem")
+    parser.add_argument("--legacy-samples", type=int, default=5000)
+    args = parser.parse_args()
+
+    timezone = pytz.timezone(args.timezone)
+    first = timezone.localize(datetime.strptime(args.start, "%Y-%m-%d")).timestamp()
+    timestamps = first + np.arange(0, args.days * 86400, args.step)
+    datetimes = [from_timestamp(timestamp, timezone=timezone) for timestamp in timestamps.tolist()]
+    legacy_datetimes = datetimes[:args.legacy_samples]
+
+    for year in {datetime_object.year for datetime_object in datetimes}:
+        get_holidays(year=year)  # Loads the calendar once, so every classifier runs warm
+    get_tariff_schedule().classify(timestamps[:1], timezone=timezone)
+    get_tariff_rate(datetimes[0])
+    scalar, scalar_seconds = timed(lambda: [get_tariff_rate(datetime_object) for datetime_object in datetimes])
+    legacy, legacy_seconds = timed(lambda: [legacy_tariff_rate(datetime_object) for datetime_object in legacy_datetimes])
+    codes, vectorized_seconds = timed(lambda: get_tariff_schedule().classify(timestamps, timezone=timezone))
+    vectorized = np.array(TARIFF_RATES)[codes].tolist()
+
+    rows = [
+        ("legacy", len(legacy), legacy_seconds, sum(a != b for a, b in zip(legacy, scalar))),
+        ("scalar", len(scalar), scalar_seconds, 0),
+        ("vectorized", len(vectorized), vectorized_seconds, sum(a != b for a, b in zip(vectorized, scalar))),
+    ]
+    print(f"{'classifier':>12}{'timestamps':>14}{'seconds':>12}{'per_second':>16}{'speedup':>12}{'mismatches':>12}")
+    legacy_rate = len(legacy) / legacy_seconds
+    for name, count, seconds, mismatches in rows:
+        rate = count / seconds
+        print(f"{name:>12}{count:>14}{seconds:>12.4f}{rate:>16.0f}{rate / legacy_rate:>12.1f}{mismatches:>12}")
+    print("rates:", {rate: scalar.count(rate) for rate in TARIFF_RATES})
+
+
+if __name__ == "__main__":
+    main()
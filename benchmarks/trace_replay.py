@@ -0,0 +1,149 @@
+"""
+Compare the rate of live generation with the replay of its recorded trace, against the local broker stand-in.
+
+The broker runs in this process, on its own thread. For each fleet size a first worker process runs one stage of the
+real scenario runner of ``main`` (no hold, a ``--seconds`` long session on the ``--speed`` clock) while recording
+every message to a trace; a second worker process then replays that trace at ``--replay-speed`` (``max`` by default)
+through as many fresh connections. The report gives, for both, the messages per second of the publishing (connection
+excluded), the CPU time of the worker per message and what the broker received, next to the trace size.
+
+Usage::
+
+    python -m benchmarks.trace_replay --sizes 160 1000 5000 --seconds 60 --trace-suffix .gz
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.mqtt_transport import raise_open_files_limit
+from broker import BrokerThread
+from mqtt import TRANSPORTS
+
+
+async def measure_live(main, chargers, seconds, trace_path):
+    from mqtt import Client
+    from scenarios import expand_stages
+    from traces import TraceWriter
+
+    devices = {f"benchmark_{index}": f"bench{index}" for index in range(chargers)}
+    stage = expand_stages({"stages": [{"chargers": chargers, "hold_seconds": 0, "charging_seconds": seconds}]})[0]
+    runner = main.make_scenario_runner(devices)
+    await runner.connect_up_to(chargers)
+
+    Client.recorder = TraceWriter(trace_path)
+    cpu_before = time.process_time()
+    result = await runner.run_stage(stage)
+    cpu_seconds = time.process_time() - cpu_before
+    Client.recorder.close()
+
+    messages = result["messages_sent"]
+    return {
+        "mode": "live",
+        "chargers": chargers,
+        "sent": messages,
+        "dropped": result["messages_dropped"],
+        "messages_per_second": round(result["messages_per_second"], 1),
+        "cpu_us_per_message": round(cpu_seconds / messages * 1e6, 1) if messages else None,
+        "trace_bytes": os.path.getsize(trace_path),
+    }
+
+
+async def measure_replay(main, chargers, trace_path):
+    cpu_before = time.process_time()
+    report = await main.run_replay(trace_path)
+    cpu_seconds = time.process_time() - cpu_before  # Connection included, unlike the live worker
+
+    messages = report["published"]
+    return {
+        "mode": "replay",
+        "chargers": chargers,
+        "sent": messages,
+        "dropped": report["dropped"],
+        "messages_per_second": round(report["messages_per_second"], 1),
+        "cpu_us_per_message": round(cpu_seconds / messages * 1e6, 1) if messages else None,
+        "trace_bytes": os.path.getsize(trace_path),
+    }  # The worker process exits right after, closing every connection at once
+
+
+def run_worker(args):
+    raise_open_files_limit()
+    os.environ.update({
+        "DOJOT_HOST": "127.0.0.1",
+        "MQTT_PORT": str(args.port),
+        "HTTP_PORT": "0",
+        "MQTT_TRANSPORT": args.transport,
+        "SIMULATION_SPEED": args.speed,
+        "TRACE_REPLAY_SPEED": args.replay_speed,
+    })
+    import main  # Reads its settings from the environment set above
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.worker == "live":
+        measurement = measure_live(main, args.chargers, args.seconds, args.trace)
+    else:
+        measurement = measure_replay(main, args.chargers, args.trace)
+    print(json.dumps(asyncio.run(measurement)))
+
+
+def run_all(args):
+    header = ("mode", "chargers", "sent", "received", "dropped", "messages_per_second", "cpu_us_per_message",
+              "trace_bytes")
+    rows = []
+    with BrokerThread(port=args.port) as broker, tempfile.TemporaryDirectory() as directory:
+        for chargers in args.sizes:
+            trace_path = os.path.join(directory, f"{chargers}.trace{args.trace_suffix}")
+            for mode in ("live", "replay"):
+                broker.reset()
+                command = [
+                    sys.executable, "-m", "benchmarks.trace_replay",
+                    "--worker", mode,
+                    "--chargers", str(chargers),
+                    "--port", str(broker.port),
+                    "--seconds", str(args.seconds),
+                    "--speed", args.speed,
+                    "--replay-speed", args.replay_speed,
+                    "--transport", args.transport,
+                    "--trace", trace_path,
+                ]
+                output = subprocess.run(command, capture_output=True, text=True, cwd=os.getcwd())
+                if output.returncode != 0:
+                    print(f"{mode} with {chargers} chargers failed:\n{output.stderr}", file=sys.stderr)
+                    break
+                row = json.loads(output.stdout.strip().splitlines()[-1])
+                row["received"] = broker.stats()["messages"]
+                rows.append(row)
+
+    print("".join(f"{column:>20}" for column in header))
+    for row in rows:
+        print("".join(f"{str(row[column]):>20}" for column in header))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=0, help="port of the broker, any free one by default")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[160, 1000, 5000])
+    parser.add_argument("--seconds", type=float, default=60, help="simulated seconds of the charging session")
+    parser.add_argument("--speed", default="virtual", help="SIMULATION_SPEED of the live run")
+    parser.add_argument("--replay-speed", default="max", help="TRACE_REPLAY_SPEED of the replay")
+    parser.add_argument("--trace-suffix", default="", choices=["", ".gz", ".zst"], help="compression of the trace")
+    parser.add_argument("--transport", default="asyncio", choices=list(TRANSPORTS))
+    parser.add_argument("--worker", choices=["live", "replay"], help=argparse.SUPPRESS)
+    parser.add_argument("--chargers", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--trace", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+    else:
+        run_all(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+"""
+Local MQTT 3.1.1 broker stand-in, to run the simulator without Dojot.
+
+It implements what the simulator and the latency probe use: CONNECT with Dojot's ``<tenant>:<device>`` username,
+PUBLISH at QoS 0 and 1 (acknowledged with PUBACK), SUBSCRIBE and UNSUBSCRIBE (forwarding at QoS 0, with ``+`` and
+``#`` wildcards), PINGREQ and DISCONNECT. Like Dojot, a device may only publish under its own ``<tenant>:<device>/``
+topics. The messages and bytes received are counted per topic.
+
+Usage::
+
+    python broker.py --port 1883 --allow-anonymous
+
+>>> with BrokerThread(port=0) as broker:
+...     run_simulator(port=broker.port)
+...     broker.stats()
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+CONNACK_ACCEPTED = 0
+CONNACK_UNACCEPTABLE_PROTOCOL = 1
+CONNACK_BAD_USERNAME_PASSWORD = 4
+CONNACK_NOT_AUTHORIZED = 5
+
+
+def _encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        encoded.append(byte | 128 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def _read_string(body, position):
+    length = int.from_bytes(body[position:position + 2], "big")
+    start = position + 2
+    return body[start:start + length].decode("utf-8"), start + length
+
+
+def topic_matches(topic_filter, topic):
+    """
+    Check whether ``topic`` matches an MQTT topic filter with ``+`` and ``#`` wildcards.
+    """
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for index, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if index >= len(topic_levels) or (level != "+" and level != topic_levels[index]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class _Connection(asyncio.Protocol):
+    def __init__(self, broker):
+        self.broker = broker
+        self.buffer = bytearray()
+        self.transport = None
+        self.connected = False
+        self.anonymous = False
+        self.username = None
+        self.keepalive = 0
+        self.last_seen = time.monotonic()
+        self.subscriptions = set()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.broker._connections.add(self)
+
+    def connection_lost(self, exc):
+        self.broker._connections.discard(self)
+        if self.subscriptions:
+            self.broker._subscribers_changed()
+        self.transport = None
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    def data_received(self, data):
+        self.last_seen = time.monotonic()
+        buffer = self.buffer
+        buffer += data
+        position = 0
+        size = len(buffer)
+
+        while size - position >= 2:
+            header = buffer[position]
+            length = 0
+            shift = 0
+            index = position + 1
+            complete = False
+            while index < size:
+                byte = buffer[index]
+                index += 1
+                length |= (byte & 127) << shift
+                if not byte & 128:
+                    complete = True
+                    break
+                shift += 7
+                if shift > 21:
+                    self.close()  # Remaining length over 4 bytes
+                    return
+            if not complete or index + length > size:
+                break  # Wait for the rest of the packet
+
+            body = bytes(buffer[index:index + length])
+            position = index + length
+            self._handle(header >> 4, header & 15, body)
+            if self.transport is None or self.transport.is_closing():
+                return
+
+        del buffer[:position]
+
+    def _handle(self, packet_type, flags, body):
+        if not self.connected and packet_type != CONNECT:
+            self.close()  # Nothing but CONNECT is allowed before the CONNACK
+            return
+
+        if packet_type == PUBLISH:
+            self._publish(flags, body)
+        elif packet_type == CONNECT:
+            self._connect(body)
+        elif packet_type == PINGREQ:
+            self.transport.write(b"\xd0\x00")
+        elif packet_type == SUBSCRIBE:
+            self._subscribe(body)
+        elif packet_type == UNSUBSCRIBE:
+            self._unsubscribe(body)
+        elif packet_type == DISCONNECT:
+            self.close()
+        elif packet_type == PUBACK:
+            pass  # Forwarded messages are QoS 0, nothing waits for it
+        else:
+            self.close()  # QoS 2 and the server to client packets are not supported
+
+    def _connect(self, body):
+        if self.connected:
+            self.close()  # A second CONNECT is a protocol violation
+            return
+
+        protocol, position = _read_string(body, 0)
+        level = body[position]
+        flags = body[position + 1]
+        keepalive = int.from_bytes(body[position + 2:position + 4], "big")
+        client_id, position = _read_string(body, position + 4)
+        if flags & 0x04:  # Will topic and message
+            _, position = _read_string(body, position)
+            _, position = _read_string(body, position)
+        username = None
+        password = None
+        if flags & 0x80:
+            username, position = _read_string(body, position)
+        if flags & 0x40:
+            password, position = _read_string(body, position)
+
+        if protocol != "MQTT" or level != 4:
+            code = CONNACK_UNACCEPTABLE_PROTOCOL
+        else:
+            code = self.broker.authenticate(username, password)
+
+        self.transport.write(bytes((CONNACK << 4, 2, 0, code)))
+        if code != CONNACK_ACCEPTED:
+            self.broker.refused += 1
+            self.close()
+            return
+
+        self.broker.accepted += 1
+        self.connected = True
+        self.anonymous = username is None
+        self.username = username
+        self.keepalive = keepalive
+
+    def _publish(self, flags, body):
+        qos = (flags >> 1) & 3
+        topic_length = int.from_bytes(body[:2], "big")
+        topic = body[2:2 + topic_length].decode("utf-8")
+        position = 2 + topic_length
+
+        if self.anonymous or not topic.startswith(self.username + "/") or qos > 1:
+            self.broker.rejected += 1
+            self.close()  # Like Dojot, a device may only publish on its own topics
+            return
+
+        if qos:
+            packet_id = body[position:position + 2]
+            position += 2
+            self.transport.write(b"\x40\x02" + packet_id)
+
+        payload_length = len(body) - position
+        self.broker._count(topic, payload_length)
+
+        subscribers = self.broker._subscribers_of(topic)
+        if subscribers:
+            packet = (
+                bytes((PUBLISH << 4,)) + _encode_length(2 + topic_length + payload_length) +
+                body[:2 + topic_length] + body[position:]
+            )
+            for subscriber in subscribers:
+                if subscriber.transport is not None:
+                    subscriber.transport.write(packet)
+
+    def _subscribe(self, body):
+        packet_id = body[:2]
+        position = 2
+        granted = bytearray()
+        while position < len(body):
+            topic_filter, position = _read_string(body, position)
+            position += 1  # Requested QoS, forwarding is always QoS 0
+            self.subscriptions.add(topic_filter)
+            granted.append(0)
+        self.broker._subscribers_changed()
+        self.transport.write(bytes((SUBACK << 4,)) + _encode_length(2 + len(granted)) + packet_id + bytes(granted))
+
+    def _unsubscribe(self, body):
+        packet_id = body[:2]
+        position = 2
+        while position < len(body):
+            topic_filter, position = _read_string(body, position)
+            self.subscriptions.discard(topic_filter)
+        self.broker._subscribers_changed()
+        self.transport.write(b"\xb0\x02" + packet_id)
+
+
+class Broker:
+    """
+    Asyncio MQTT 3.1.1 broker counting what the devices publish.
+
+    Attributes
+    ----------
+    host : str
+        Address to listen on.
+    port : int
+        Port to listen on, 0 for any free port (the chosen one is set after :meth:`start`).
+    tenants : set/None
+        Tenants allowed to connect, any if None.
+    allow_anonymous : bool
+        Whether connections without username may subscribe (they may never publish).
+    messages : int
+        Messages received.
+    bytes : int
+        Payload bytes received.
+    topics : dict
+        ``[messages, bytes]`` received on each topic.
+    """
+    def __init__(self, host="127.0.0.1", port=1883, tenants=None, allow_anonymous=False):
+        self.host = host
+        self.port = port
+        self.tenants = set(tenants) if tenants is not None else None
+        self.allow_anonymous = allow_anonymous
+        self._connections = set()
+        self._server = None
+        self._reaper = None
+        self._subscribers = {}
+        self.reset()
+
+    def reset(self):
+        self.messages = 0
+        self.bytes = 0
+        self.topics = {}
+        self.accepted = 0
+        self.refused = 0
+        self.rejected = 0
+
+    def authenticate(self, username, password):
+        """
+        Check the username of a CONNECT, which must be ``<tenant>:<device>``.
+
+        Returns
+        -------
+        int
+            CONNACK return code.
+        """
+        if username is None:
+            return CONNACK_ACCEPTED if self.allow_anonymous else CONNACK_NOT_AUTHORIZED
+        tenant, _, device = username.partition(":")
+        if not tenant or not device or ":" in device or "/" in username:
+            return CONNACK_BAD_USERNAME_PASSWORD
+        if self.tenants is not None and tenant not in self.tenants:
+            return CONNACK_NOT_AUTHORIZED
+        return CONNACK_ACCEPTED
+
+    def _count(self, topic, length):
+        self.messages += 1
+        self.bytes += length
+        counts = self.topics.get(topic)
+        if counts is None:
+            counts = self.topics[topic] = [0, 0]
+        counts[0] += 1
+        counts[1] += length
+
+    def _subscribers_changed(self):
+        self._subscribers = {}
+
+    def _subscribers_of(self, topic):
+        subscribers = self._subscribers.get(topic)
+        if subscribers is None:
+            subscribers = self._subscribers[topic] = [
+                connection for connection in self._connections
+                if any(topic_matches(topic_filter, topic) for topic_filter in connection.subscriptions)
+            ]
+        return subscribers
+
+    async def _reap_idle(self):
+        # Closes the connections silent for 1.5 times their keepalive, as the spec asks
+        while True:
+            await asyncio.sleep(1)
+            now = time.monotonic()
+            for connection in list(self._connections):
+                if connection.keepalive and now - connection.last_seen > 1.5 * connection.keepalive:
+                    connection.close()
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._server = await loop.create_server(lambda: _Connection(self), self.host, self.port, backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._reaper = loop.create_task(self._reap_idle())
+
+    async def stop(self):
+        self._reaper.cancel()
+        self._server.close()
+        for connection in list(self._connections):
+            connection.close()
+        await self._server.wait_closed()
+
+    def stats(self):
+        """
+        Get the counters.
+
+        Returns
+        -------
+        dict
+            Connections open, accepted and refused, publishes rejected by the topic check, messages and bytes
+            received in total and by topic.
+        """
+        return {
+            "connections": len(self._connections),
+            "accepted": self.accepted,
+            "refused": self.refused,
+            "rejected": self.rejected,
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "topics": {topic: {"messages": counts[0], "bytes": counts[1]} for topic, counts in self.topics.items()}
+        }
+
+
+class BrokerThread:
+    """
+    Runs a :class:`Broker` on its own event loop in a background thread, so it does not share the loop (nor the
+    CPU time of the loop thread) with the simulator.
+    """
+    def __init__(self, **kwargs):
+        self.broker = Broker(**kwargs)
+        self._loop = None
+        self._thread = None
+        self._started = threading.Event()
+
+    @property
+    def port(self):
+        return self.broker.port
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self.broker.start())
+        self._started.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self.broker.stop())
+        self._loop.close()
+
+    def _call(self, function):
+        async def call():
+            return function()
+        return asyncio.run_coroutine_threadsafe(call(), self._loop).result()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="mqtt-broker", daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def stats(self):
+        return self._call(self.broker.stats)
+
+    def reset(self):
+        self._call(self.broker.reset)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+async def serve(broker, report_seconds):
+    await broker.start()
+    print(f"listening on {broker.host}:{broker.port}", flush=True)
+    messages = 0
+    while True:
+        await asyncio.sleep(report_seconds)
+        rate = (broker.messages - messages) / report_seconds
+        messages = broker.messages
+        print(f"{len(broker._connections)} connections, {broker.messages} messages, {rate:.1f} msg/s", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local MQTT 3.1.1 broker stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--tenant", action="append", help="tenant allowed to connect, any if not given")
+    parser.add_argument("--allow-anonymous", action="store_true", help="let clients without username subscribe")
+    parser.add_argument("--report-seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    broker = Broker(host=args.host, port=args.port, tenants=args.tenant, allow_anonymous=args.allow_anonymous)
+    try:
+        asyncio.run(serve(broker, args.report_seconds))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
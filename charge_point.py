@@ -1,11 +1,17 @@
 import asyncio
-import json
 import logging
-import datetime
 import os
-
-from random import randint
-from mqtt import Client
+import weakref
+
+from random import choice, randint
+from time import perf_counter
+from clock import Clock
+from energy import CHARGER_POWER_W, INITIAL_METER_WH, ChargingSessions
+from latency import probe_message_id
+from logs import log_meter_value
+from metrics import Counter, Gauge, Histogram
+from mqtt import TRANSPORTS
+from ocpp_messages import AUTHORIZE, START_TRANSACTION, METER_VALUES, STOP_TRANSACTION
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,124 +19,203 @@ load_dotenv()
 DOJOT_HOST = os.getenv('DOJOT_HOST')
 MQTT_PORT = int(os.getenv('MQTT_PORT'))
 
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('charge_point')
+
+ACTIONS = ('authorize', 'start_transaction', 'meter_values', 'stop_transaction')
+
+MESSAGES_PUBLISHED = Counter('simulator_messages_published', 'MQTT messages published by the charge points', ['action'])
+BYTES_SENT = Counter('simulator_sent_bytes', 'Payload bytes published by the charge points', ['action'])
+MESSAGES_DROPPED = Counter('simulator_messages_dropped', 'Messages dropped because the MQTT window was full', ['action'])
+PUBLISH_SECONDS = Histogram(
+    'simulator_publish_call_seconds',
+    'Time spent in the MQTT publish call',
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 1.0)
+)
+CONNECTED_CLIENTS = Gauge('simulator_connected_clients', 'Charge points with an accepted MQTT connection')
+ACTIVE_SESSIONS = Gauge('simulator_active_charging_sessions', 'Charge points in a charging session')
+INFLIGHT_MESSAGES = Gauge('simulator_inflight_messages', 'Messages published and waiting for their acknowledgement')
+QUEUED_MESSAGES = Gauge('simulator_queued_messages', 'Messages queued behind the in-flight window')
+
+# Children bound once, so publishing skips the label lookup
+_published = {action: MESSAGES_PUBLISHED.labels(action) for action in ACTIONS}
+_bytes_sent = {action: BYTES_SENT.labels(action) for action in ACTIONS}
+_dropped = {action: MESSAGES_DROPPED.labels(action) for action in ACTIONS}
+
+_charge_points = weakref.WeakSet()
+
+def _sum_clients(attribute):
+    while True:
+        try:
+            return sum(getattr(cp.mqtt_client, attribute) for cp in _charge_points)
+        except RuntimeError: # a charge point was created meanwhile
+            continue
+
+CONNECTED_CLIENTS.set_function(lambda: _sum_clients('connected'))
+INFLIGHT_MESSAGES.set_function(lambda: _sum_clients('inflight'))
+QUEUED_MESSAGES.set_function(lambda: _sum_clients('queued'))
+
+def track_charge_point(charge_point):
+    # Anything with an mqtt_client attribute (and weak referenceable) counts on the client gauges
+    _charge_points.add(charge_point)
+
+def send_message(mqtt_client, action, msg):
+    start = perf_counter()
+    sent = mqtt_client.send(msg)
+    PUBLISH_SECONDS.observe(perf_counter() - start)
+
+    if sent:
+        _published[action].inc()
+        _bytes_sent[action].inc(len(msg))
+    else:
+        _dropped[action].inc()
+
+    return sent
 
 class ChargePoint:
 
     sample_interval_seconds = 1
     charging_seconds = 10 * 60 # 10 minutes
+    transport = 'thread'
+    qos = 0
+    actions = ACTIONS # message mix, the other actions are skipped
+    latency_probe = False # stamp the message ids for latency.LatencyProbe
     
-    def __init__(self, id, device, host, port):
+    def __init__(self, id, device, host, port, transport=None, scheduler=None, clock=None, latency_probe=None, qos=None, sessions=None):
         self.id = id
         self.is_charging = False
-        self.mqtt_client = Client('admin', device)
-
-    async def run(self):
+        self.scheduler = scheduler
+        # Shared with the fleet so the scheduler advances every session at once, see energy.ChargingSessions
+        self.sessions = sessions
+        self.session = None
+        self.max_power_w = choice(CHARGER_POWER_W)
+        self.meter_wh = randint(*INITIAL_METER_WH)
+        self.clock = clock if clock is not None else Clock()
+        if transport is not None:
+            self.transport = transport
+        if latency_probe is not None:
+            self.latency_probe = latency_probe
+        if qos is not None:
+            self.qos = qos
+        self.sequence = 0
+        self.mqtt_client = TRANSPORTS[self.transport]('admin', device, qos=self.qos)
+        track_charge_point(self)
+
+    def connect(self):
         self.mqtt_client.connect(DOJOT_HOST, MQTT_PORT)
 
-        await asyncio.sleep(self.charging_seconds)
+    def message_fields(self):
+        if not self.latency_probe:
+            return {}
+
+        message_id = probe_message_id(self.mqtt_client.device_id, self.sequence)
+        self.sequence += 1
+
+        return {'message_id': message_id}
+
+    def send(self, action, msg):
+        if action not in self.actions:
+            return False
+
+        return send_message(self.mqtt_client, action, msg)
+
+    async def publish(self, action, msg):
+        await self.mqtt_client.wait_for_room()
+
+        return self.send(action, msg)
+
+    async def run(self, connect=True):
+        if connect:
+            self.connect()
+
+        await self.clock.sleep(self.charging_seconds)
         
         await self.charge()
 
 
 
     async def send_authorize(self):
-        msg = json.dumps({
-            "authorize": [
-                2,
-                "abcdefg",
-                "Authorize",
-                { "idTag": self.id }
-            ]
-        })
+        msg = AUTHORIZE.encode(**self.message_fields(), id_tag=self.id)
+
+        logger.info('%s:%s', self.id, msg.decode())
+
+        await self.publish('authorize', msg)
 
-        logging.info(f'{self.id}:{msg}')
 
-        self.mqtt_client.send(msg)
+    def sample_meter_value(self):
+        if self.session is None: # the transaction stopped since the sample was due
+            return
 
+        if self.scheduler is None: # the scheduler advances the sessions once per tick
+            self.sessions.advance(self.clock.time())
+
+        msg = METER_VALUES.encode(
+            **self.message_fields(),
+            soc=self.sessions.soc_percent(self.session),
+            energy_wh=self.sessions.energy_wh(self.session)
+        )
+
+        self.send('meter_values', msg) # dropped, not waited for, when the window is full, see scheduler.py
+
+        log_meter_value(self.id, msg)
 
     async def send_meter_values(self):
+        if self.scheduler is not None:
+            self.scheduler.register(self)
+            return
+
         while self.is_charging:
-            msg = json.dumps({
-                "meter_values": [
-                    2,
-                    "2961:137639",
-                    "MeterValues",
-                    {
-                        "connectorId": 1,
-                        "meterValue": [
-                            {
-                                "sampledValue": [
-                                    {
-                                        "unit": "Percent",
-                                        "context": "Transaction.Begin",
-                                        "measurand": "SoC",
-                                        "location": "EV",
-                                        "value": randint(0,100)
-                                    }
-                                ]
-                            }
-                        ]
-                    }
-                ]
-            })
-            
-            self.mqtt_client.send(msg)
-
-            logging.info(f'{self.id}:{msg}')
-
-            await asyncio.sleep(self.sample_interval_seconds)            
+            await self.mqtt_client.wait_for_room()
+
+            if not self.is_charging: # stopped while waiting for room
+                break
+
+            self.sample_meter_value()
+
+            await self.clock.sleep(self.sample_interval_seconds)            
 
     async def send_start_transaction(self):
         self.is_charging = True
+        ACTIVE_SESSIONS.inc()
+        if self.sessions is None:
+            self.sessions = ChargingSessions(capacity=1)
+        self.session = self.sessions.open(self.clock.time(), self.meter_wh, self.max_power_w)
 
-        msg = json.dumps({
-            "start_transaction": [
-                2,
-                "2961:137638",
-                "StartTransaction",
-                {
-                    "connectorId": 1,
-                    "idTag": self.id,
-                    "meterStart": 2656119,
-                    "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat()
-                }
-            ]
-        })
+        msg = START_TRANSACTION.encode(
+            **self.message_fields(),
+            id_tag=self.id,
+            meter_start=self.meter_wh,
+            timestamp=self.clock.now().isoformat()
+        )
 
-        logging.info(f'{self.id}:{msg}')
+        logger.info('%s:%s', self.id, msg.decode())
 
-        self.mqtt_client.send(msg)
+        await self.publish('start_transaction', msg)
 
 
         await self.send_meter_values()
 
-    async def send_stop_transaction(self):
-        await asyncio.sleep(self.charging_seconds)
+    async def send_stop_transaction(self, charging_seconds=None):
+        if charging_seconds is None:
+            charging_seconds = self.charging_seconds
+
+        await self.clock.sleep(charging_seconds)
 
         self.is_charging = False
+        ACTIVE_SESSIONS.dec()
+        if self.scheduler is not None:
+            self.scheduler.unregister(self)
+        self.meter_wh = self.sessions.close(self.session, self.clock.time())
+        self.session = None
+
+        msg = STOP_TRANSACTION.encode(**self.message_fields(), meter_stop=self.meter_wh, timestamp=self.clock.now().isoformat())
+
+        await self.publish('stop_transaction', msg)
+
+        logger.info('%s:%s', self.id, msg.decode())
 
-        msg = json.dumps({
-            "stop_transaction": [
-                2,
-                "2961:137794",
-                "StopTransaction",
-                {
-                    "reason": "Other",
-                    "transactionId": 0,
-                    "meterStop": 2810542,
-                    "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat()
-                }
-            ]
-        })
-
-        self.mqtt_client.send(msg)
-
-        logging.info(f'{self.id}:{msg}')
-
-    async def charge(self):
+    async def charge(self, charging_seconds=None):
         await asyncio.gather(
             self.send_authorize(),
             self.send_start_transaction(),
-            self.send_stop_transaction()
+            self.send_stop_transaction(charging_seconds)
         )
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""
+Clocks used by the charge points and the scenario runner.
+
+All clocks give the simulated seconds elapsed since they were created (:meth:`Clock.time`), the simulated current
+datetime used on the message timestamps (:meth:`Clock.now`) and a coroutine to wait simulated seconds
+(:meth:`Clock.sleep`).
+
+* :class:`Clock` follows the wall clock.
+* :class:`ScaledClock` runs ``speed`` times faster than the wall clock.
+* :class:`VirtualClock` jumps straight to the next wake up whenever every task is waiting on it, so a scenario runs
+  as fast as the CPU allows.
+
+>>> clock = make_clock("60")  # One simulated hour per wall minute
+"""
+import asyncio
+import datetime
+import heapq
+import itertools
+import time
+
+
+class Clock:
+    """
+    Wall clock.
+    """
+    def __init__(self, start=None):
+        self.start = start if start is not None else datetime.datetime.now(datetime.timezone.utc)
+        self._origin = time.monotonic()
+
+    def time(self):
+        return time.monotonic() - self._origin
+
+    def now(self):
+        return self.start + datetime.timedelta(seconds=self.time())
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+
+class ScaledClock(Clock):
+    """
+    Clock running ``speed`` times faster than the wall clock.
+    """
+    def __init__(self, speed, start=None):
+        if not speed > 0:
+            raise ValueError("clock speed must be positive, not {0}".format(speed))
+        super().__init__(start=start)
+        self.speed = speed
+
+    def time(self):
+        return (time.monotonic() - self._origin) * self.speed
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds / self.speed)
+
+
+class VirtualClock(Clock):
+    """
+    Discrete event clock: simulated time only moves when every task is blocked on :meth:`sleep`, and then it jumps
+    to the earliest wake up.
+
+    The clock considers the loop idle after ``settle_yields`` consecutive loop iterations without a new sleep, so
+    tasks waiting on something other than the clock (a thread, a socket) are not waited for.
+    """
+    settle_yields = 3
+
+    def __init__(self, start=None):
+        super().__init__(start=start)
+        self._now = 0.0
+        self._sleepers = []
+        self._sequence = itertools.count()  # Keeps the wake up order of equal deadlines
+        self._version = 0
+        self._driver = None
+
+    def time(self):
+        return self._now
+
+    async def sleep(self, seconds):
+        if seconds <= 0:
+            await asyncio.sleep(0)
+            return
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._sleepers, (self._now + seconds, next(self._sequence), future))
+        self._version += 1
+
+        if self._driver is None:
+            self._driver = loop.create_task(self._drive())
+
+        await future
+
+    async def _drive(self):
+        while self._sleepers:
+            idle = 0
+            while idle < self.settle_yields:
+                version = self._version
+                await asyncio.sleep(0)
+                idle = idle + 1 if version == self._version else 0
+
+            self._now = max(self._now, self._sleepers[0][0])
+            while self._sleepers and self._sleepers[0][0] <= self._now:
+                future = heapq.heappop(self._sleepers)[2]
+                if not future.done():  # The sleeping task may have been cancelled
+                    future.set_result(None)
+
+        self._driver = None
+
+
+def make_clock(speed=None):
+    """
+    Create the clock for a simulation speed.
+
+    Parameters
+    ----------
+    speed : str/float/None
+        ``"virtual"`` for a :class:`VirtualClock`, a number different from 1 for a :class:`ScaledClock`, None or 1
+        for the wall :class:`Clock`.
+
+    Returns
+    -------
+    Clock
+        A new clock.
+
+    Raises
+    ------
+    ValueError
+        If ``speed`` (the ``SIMULATION_SPEED`` setting) is neither ``"virtual"`` nor a positive number.
+    """
+    if speed is None or str(speed).strip() == "":
+        return Clock()
+    elif str(speed).strip().lower() == "virtual":
+        return VirtualClock()
+
+    try:
+        factor = float(speed)
+    except ValueError:
+        factor = None
+    if factor is None or not factor > 0 or factor == float("inf"):
+        raise ValueError("SIMULATION_SPEED must be 'virtual' or a positive number, not {0!r}".format(speed))
+
+    if factor == 1:
+        return Clock()
+    return ScaledClock(speed=factor)
@@ -0,0 +1,173 @@
+"""
+Rate limited connection of a fleet of MQTT clients.
+
+paho's ``connect`` blocks on the TCP handshake, so :class:`ConnectionManager` runs it on a small thread pool (which
+also caps how many handshakes are in progress) and spaces the connection starts to a connections per second rate,
+optionally ramped up from a lower rate. Failed attempts are retried with jittered exponential backoff, and every
+attempt counts against the rate, so a struggling broker is never hit by a burst of retries.
+
+>>> manager = ConnectionManager(host, port, rate=50, ramp_seconds=30, concurrency=32)
+>>> report = await manager.connect_all([charge_point.mqtt_client for charge_point in chargers])
+"""
+import asyncio
+import random
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import paho.mqtt.client as mqtt
+
+from latency import LatencyHistogram
+
+
+class ConnectionManager:
+    """
+    Connects :class:`mqtt.Client` instances off the event loop at a limited rate.
+
+    Attributes
+    ----------
+    rate : float/None
+        Connection starts per second once ramped up. None does not limit the rate.
+    ramp_seconds : float
+        Seconds along which the rate grows linearly from ``start_rate`` to ``rate``.
+    start_rate : float
+        Connection starts per second at the beginning of the ramp.
+    concurrency : int
+        Maximum connections waiting for their handshake and CONNACK at once.
+    retries : int
+        Attempts after the first one before a client is given up.
+    backoff : float
+        Base seconds of the exponential backoff between attempts.
+    max_backoff : float
+        Maximum seconds of a single backoff.
+    connack_timeout : float
+        Seconds to wait for the CONNACK of an attempt.
+    latencies : latency.LatencyHistogram
+        Seconds from the start of each successful attempt to its CONNACK.
+    """
+    def __init__(self, host, port, rate=None, ramp_seconds=0, start_rate=1, concurrency=32, retries=3, backoff=0.5,
+                 max_backoff=10, connack_timeout=10):
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.ramp_seconds = ramp_seconds
+        self.start_rate = start_rate
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.connack_timeout = connack_timeout
+        self.latencies = LatencyHistogram()
+        self.connected = 0
+        self.failed = 0
+        self.attempts = 0
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="mqtt-connect")
+        self._origin = None
+        self._next_start = None
+
+    def _rate_at(self, elapsed):
+        if self.ramp_seconds <= 0 or elapsed >= self.ramp_seconds:
+            return self.rate
+        return self.start_rate + (self.rate - self.start_rate) * elapsed / self.ramp_seconds
+
+    def _reserve_start(self):
+        # Only called from the event loop thread, so no lock is needed
+        now = time.monotonic()
+        if self.rate is None:
+            return now
+        if self._origin is None:
+            self._origin = self._next_start = now
+        start = max(now, self._next_start)
+        self._next_start = start + 1 / max(self._rate_at(start - self._origin), 1e-9)
+        return start
+
+    def _connect_blocking(self, client):
+        start = time.monotonic()
+        client.connack_received.clear()
+        try:
+            client.connect(self.host, self.port)
+            if not client.connack_received.wait(self.connack_timeout):
+                raise TimeoutError("no CONNACK after {0} seconds".format(self.connack_timeout))
+            if client.connack != mqtt.CONNACK_ACCEPTED:
+                raise ConnectionRefusedError(mqtt.connack_string(client.connack))
+        except Exception:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+            raise
+        return time.monotonic() - start
+
+    def _backoff_seconds(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))  # Full jitter
+
+    async def connect(self, client):
+        """
+        Connect ``client``, retrying with jittered backoff.
+
+        Parameters
+        ----------
+        client : mqtt.Client
+            Client to connect.
+
+        Returns
+        -------
+        float
+            Seconds from the start of the successful attempt to its CONNACK.
+
+        Raises
+        ------
+        ConnectionError
+            If every attempt failed, chained to the error of the last one.
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries + 1):
+            await asyncio.sleep(max(0.0, self._reserve_start() - time.monotonic()))
+            self.attempts += 1
+            try:
+                seconds = await loop.run_in_executor(self._executor, self._connect_blocking, client)
+            except Exception as error:
+                if attempt == self.retries:
+                    self.failed += 1
+                    raise ConnectionError("could not connect {0} after {1} attempts".format(
+                        client.device_id, attempt + 1)) from error
+                await asyncio.sleep(self._backoff_seconds(attempt))
+            else:
+                self.connected += 1
+                self.latencies.record(seconds)
+                return seconds
+
+    async def connect_all(self, clients):
+        """
+        Connect every client, each as soon as the rate allows.
+
+        Parameters
+        ----------
+        clients : list
+            Clients to connect.
+
+        Returns
+        -------
+        dict
+            Report with the clients connected and failed, the attempts made, the achieved connections per second
+            and the connect latency summary (see :meth:`latency.LatencyHistogram.summary`), prefixed by
+            ``connect_``.
+        """
+        start = time.monotonic()
+        await asyncio.gather(*(self.connect(client) for client in clients), return_exceptions=True)
+        elapsed = time.monotonic() - start
+        return self.report(elapsed)
+
+    def report(self, elapsed=None):
+        report = {
+            "connected": self.connected,
+            "connect_failures": self.failed,
+            "connect_attempts": self.attempts,
+        }
+        if elapsed is not None:
+            report["connects_per_second"] = self.connected / elapsed if elapsed else 0.0
+        report.update({"connect_" + key: value for key, value in self.latencies.summary().items() if key != "count"})
+        return report
+
+    def close(self):
+        self._executor.shutdown(wait=False)
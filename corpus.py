@@ -0,0 +1,192 @@
+"""
+Pre-generated payloads, to publish at the maximum rate the transport allows.
+
+At high rates the simulator's own work on each message (building and encoding it, formatting the timestamps, logging)
+is what limits the live stages, hiding the broker's ceiling. :func:`generate_corpus` does all of that ahead of time
+for a whole stage: the messages of every charger, in the order a live stage sends them, are encoded and kept as
+bytes, with the index of the charger sending each one on an array. :func:`publish_corpus` then only hands each
+payload, as it is, to its client: paho publishes bytes without copying them, so nothing is allocated per message.
+
+>>> corpus = generate_corpus(["cp_0", "cp_1"], charging_seconds=[60, 60])
+>>> len(corpus), corpus.payload(0)
+(126, b'{"authorize": [2, "abcdefg", "Authorize", {"idTag": "cp_0"}]}')
+>>> report = await publish_corpus(corpus, [client_0, client_1])
+
+The messages carry the default OCPP message ids, so the latency probe does not measure corpus stages.
+"""
+import asyncio
+import datetime
+import time
+
+import numpy as np
+
+from charge_point import ACTIONS, send_message
+from energy import CHARGER_POWER_W, INITIAL_METER_WH, cc_cv_step, draw_sessions
+from ocpp_messages import AUTHORIZE, START_TRANSACTION, METER_VALUES, STOP_TRANSACTION
+
+
+class PayloadCorpus:
+    """
+    Encoded messages of a stage, in publishing order.
+
+    Attributes
+    ----------
+    payloads : list
+        Every payload, as bytes.
+    streams : np.ndarray
+        Index of the charger (and client) publishing each payload.
+    actions : np.ndarray
+        Index on :data:`charge_point.ACTIONS` of each payload.
+    generation_seconds : float
+        Seconds taken to generate the corpus.
+    """
+    def __init__(self, payloads, streams, actions, generation_seconds=0.0):
+        self.payloads = payloads
+        self.streams = streams
+        self.actions = actions
+        self.generation_seconds = generation_seconds
+
+    def __len__(self):
+        return len(self.streams)
+
+    def payload(self, index):
+        return self.payloads[index]
+
+    @property
+    def nbytes(self):
+        return sum(map(len, self.payloads)) + self.streams.nbytes + self.actions.nbytes
+
+
+def generate_corpus(id_tags, charging_seconds, sample_interval_seconds=1, actions=ACTIONS, start=None, seed=None):
+    """
+    Generate the messages of one session of each charger.
+
+    Every charger sends its ``authorize`` and ``start_transaction``, then the meter values of all the chargers still
+    charging are interleaved, one per charger and sampling interval, and the ``stop_transaction`` of each charger
+    follows its last meter value. The sessions follow the CC/CV curve of :mod:`energy`.
+
+    Parameters
+    ----------
+    id_tags : list
+        Id tag (label) of each charger.
+    charging_seconds : list
+        Session length of each charger.
+    sample_interval_seconds : float
+        Seconds between two meter values of a charger.
+    actions : list
+        Actions generated, the other ones are skipped.
+    start : datetime.datetime/None
+        Start of the sessions on the message timestamps, now by default.
+    seed : int/None
+        Seed of the chargers and vehicles.
+
+    Returns
+    -------
+    PayloadCorpus
+        The messages.
+    """
+    began = time.perf_counter()
+    count = len(id_tags)
+    start = start if start is not None else datetime.datetime.now(datetime.timezone.utc)
+    random = np.random.default_rng(seed)
+    charger_power_w = random.choice(np.array(CHARGER_POWER_W, dtype=np.float64), count)
+    meter_wh = random.integers(*INITIAL_METER_WH, count).astype(np.float64)
+    soc, capacity_wh, power_w = draw_sessions(random, charger_power_w)
+    charging_seconds = np.asarray(charging_seconds, dtype=np.float64)
+    samples = np.ceil(charging_seconds / sample_interval_seconds).astype(np.int64)
+
+    payloads = []
+    streams = []
+    action_indexes = []
+
+    def append(stream, action, payload):
+        payloads.append(payload)
+        streams.append(stream)
+        action_indexes.append(action)
+
+    authorize, start_transaction, meter_values, stop_transaction = (
+        ACTIONS.index(action) if action in actions else None for action in ACTIONS)
+
+    timestamp = start.isoformat()
+    for stream, (id_tag, meter_start) in enumerate(zip(id_tags, meter_wh.astype(np.int64).tolist())):
+        if authorize is not None:
+            append(stream, authorize, AUTHORIZE.encode(id_tag=id_tag))
+        if start_transaction is not None:
+            append(stream, start_transaction, START_TRANSACTION.encode(
+                id_tag=id_tag, meter_start=meter_start, timestamp=timestamp))
+
+    def stop(rows, seconds):
+        rows_soc, grid_wh = cc_cv_step(soc[rows], capacity_wh[rows], power_w[rows], seconds)
+        soc[rows] = rows_soc
+        meter_wh[rows] += grid_wh
+        if stop_transaction is None:
+            return
+        for stream, meter_stop, session_seconds in zip(
+                rows.tolist(), meter_wh[rows].astype(np.int64).tolist(), charging_seconds[rows].tolist()):
+            append(stream, stop_transaction, STOP_TRANSACTION.encode(
+                meter_stop=meter_stop, timestamp=(start + datetime.timedelta(seconds=session_seconds)).isoformat()))
+
+    stop(np.flatnonzero(samples == 0), charging_seconds[samples == 0])
+    for tick in range(int(samples.max()) if count else 0):
+        rows = np.flatnonzero(samples > tick)
+        if meter_values is not None:
+            for stream, soc_percent, energy_wh in zip(
+                    rows.tolist(), (soc[rows] * 100).astype(np.int64).tolist(), meter_wh[rows].astype(np.int64).tolist()):
+                append(stream, meter_values, METER_VALUES.encode(soc=soc_percent, energy_wh=energy_wh))
+
+        last = rows[samples[rows] == tick + 1]
+        rows = rows[samples[rows] > tick + 1]
+        soc[rows], grid_wh = cc_cv_step(soc[rows], capacity_wh[rows], power_w[rows], sample_interval_seconds)
+        meter_wh[rows] += grid_wh
+        stop(last, charging_seconds[last] - tick * sample_interval_seconds)
+
+    return PayloadCorpus(payloads, np.array(streams, dtype=np.uint32), np.array(action_indexes, dtype=np.uint8),
+                         generation_seconds=time.perf_counter() - began)
+
+
+async def publish_corpus(corpus, clients, yield_every=256):
+    """
+    Publish every payload of a corpus, as fast as the clients' windows allow.
+
+    Each payload goes through :func:`charge_point.send_message`, so the per action metrics are the ones of a live
+    stage.
+
+    Parameters
+    ----------
+    corpus : PayloadCorpus
+        Payloads to publish.
+    clients : list
+        Connected :class:`mqtt.Client` of each stream of the corpus.
+    yield_every : int
+        Payloads published between two yields to the event loop, so the sockets get written.
+
+    Returns
+    -------
+    dict
+        Payloads published and dropped (window full or refused), the wall seconds of the publishing and the payloads
+        published per second.
+    """
+    payloads = corpus.payloads
+    streams = corpus.streams.tolist()
+    actions = [ACTIONS[action] for action in corpus.actions.tolist()]
+    published = dropped = 0
+
+    start = time.perf_counter()
+    for index, (payload, stream, action) in enumerate(zip(payloads, streams, actions)):
+        if index % yield_every == 0:
+            await asyncio.sleep(0)
+        client = clients[stream]
+        if not client.has_room():
+            await client.wait_for_room()
+        if send_message(client, action, payload):
+            published += 1
+        else:
+            dropped += 1
+
+    elapsed = time.perf_counter() - start
+    return {
+        "published": published,
+        "dropped": dropped,
+        "publish_seconds": elapsed,
+        "messages_per_second": published / elapsed if elapsed else 0.0
+    }
@@ -1,6 +1,8 @@
+import numpy as np
 import pytz
 
 from datetime import datetime, timedelta, date
+from functools import lru_cache
 
 # from dateutil.relativedelta import relativedelta
 # from dateutil.parser import parse
@@ -167,8 +169,13 @@ def is_weekend(datetime_object):
         return False
 
 
+@lru_cache(maxsize=None)
+def get_holidays(year, country=Brazil):
+    return frozenset(country(years=year).keys())
+
+
 def is_holiday(datetime_object, country=Brazil):
-    if datetime_object.date() in country(years=datetime_object.year).keys():
+    if datetime_object.date() in get_holidays(year=datetime_object.year, country=country):
         return True
     else:
         return False
@@ -206,52 +213,85 @@ def get_previous_month(year, month):
     return year, month
 
 
+TARIFF_RATES = ("off_peak", "intermediate", "peak")
+
+MINUTES_PER_DAY = 24 * 60
+
+EPOCH_DATE = date(year=1970, month=1, day=1)
+
+
+class TariffSchedule:
+    """
+    Peak and intermediate windows compiled to minute-of-day tables of TARIFF_RATES indexes.
+
+    A window includes both its ends, so an instant exactly on a minute takes the ``exact`` table (ending windows
+    included) and any other instant of the minute the ``within`` one. Peak windows win over intermediate ones.
+    """
+
+    def __init__(self, peak_times=("18:30-21:30",), intermediate_times=("17:30-18:30", "21:30-22:30"), country=Brazil):
+        self.country = country
+        exact = np.zeros(MINUTES_PER_DAY, dtype=np.uint8)
+        within = np.zeros(MINUTES_PER_DAY, dtype=np.uint8)
+        for rate, intervals in ((TARIFF_RATES.index("intermediate"), intermediate_times),
+                                (TARIFF_RATES.index("peak"), peak_times)):
+            for interval in intervals:
+                start_hour, start_minute, end_hour, end_minute = interval_to_tuple(interval=interval)
+                start = start_hour * 60 + start_minute
+                end = end_hour * 60 + end_minute
+                exact[start:end + 1] = rate
+                within[start:end] = rate
+        self.exact_table = exact
+        self.within_table = within
+        self._exact = exact.tobytes()
+        self._within = within.tobytes()
+
+    def is_off_peak_day(self, datetime_object):
+        return datetime_object.weekday() >= 5 or datetime_object.date() in get_holidays(
+            year=datetime_object.year, country=self.country)
+
+    def rate(self, datetime_object):
+        if self.is_off_peak_day(datetime_object=datetime_object):
+            return "off_peak"
+        minute = datetime_object.hour * 60 + datetime_object.minute
+        if datetime_object.second == 0 and datetime_object.microsecond == 0:
+            return TARIFF_RATES[self._exact[minute]]
+        return TARIFF_RATES[self._within[minute]]
+
+    def classify(self, timestamps, timezone=pytz.timezone("America/Belem")):
+        """
+        Get the TARIFF_RATES index of each POSIX timestamp, on the wall clock of ``timezone``.
+
+        The UTC offset is looked up once per distinct UTC hour, so it must only change on whole hours.
+        """
+        if isinstance(timezone, str):
+            timezone = pytz.timezone(timezone)
+        microseconds = np.round(np.asarray(timestamps, dtype=np.float64) * 1e6).astype(np.int64)
+
+        hours, hour_index = np.unique(np.floor_divide(microseconds, 3600 * 10 ** 6), return_inverse=True)
+        offsets = np.array([
+            datetime.fromtimestamp(int(hour) * 3600, tz=timezone).utcoffset() // timedelta(microseconds=1)
+            for hour in hours
+        ], dtype=np.int64)
+        local = microseconds + offsets[hour_index.reshape(microseconds.shape)]
+
+        days, day_microseconds = np.divmod(local, 24 * 3600 * 10 ** 6)
+        minutes, minute_microseconds = np.divmod(day_microseconds, 60 * 10 ** 6)
+        rates = np.where(minute_microseconds == 0, self.exact_table[minutes], self.within_table[minutes])
+
+        unique_days, day_index = np.unique(days, return_inverse=True)
+        off_peak_days = np.array([
+            self.is_off_peak_day(datetime_object=datetime.combine(EPOCH_DATE + timedelta(days=int(day)), datetime.min.time()))
+            for day in unique_days
+        ], dtype=bool)
+        rates[off_peak_days[day_index.reshape(days.shape)]] = TARIFF_RATES.index("off_peak")
+        return rates
+
+
+@lru_cache(maxsize=None)
+def get_tariff_schedule(peak_times=("18:30-21:30",), intermediate_times=("17:30-18:30", "21:30-22:30"), country=Brazil):
+    return TariffSchedule(peak_times=peak_times, intermediate_times=intermediate_times, country=country)
+
+
 def get_tariff_rate(datetime_object, peak_times=("18:30-21:30",), intermediate_times=("17:30-18:30", "21:30-22:30")):
-    if is_weekend(datetime_object=datetime_object):
-        return "off_peak"
-    elif is_holiday(datetime_object=datetime_object):
-        return "off_peak"
-    else:
-        for time in peak_times:
-            start_hour, start_minute, end_hour, end_minute = interval_to_tuple(interval=time)
-            start_peak = datetime(
-                year=datetime_object.year,
-                month=datetime_object.month,
-                day=datetime_object.day,
-                hour=start_hour,
-                minute=start_minute,
-                tzinfo=datetime_object.tzinfo
-            )
-            end_peak = datetime(
-                year=datetime_object.year,
-                month=datetime_object.month,
-                day=datetime_object.day,
-                hour=end_hour,
-                minute=end_minute,
-                tzinfo=datetime_object.tzinfo
-            )
-            if is_in_interval(datetime_object=datetime_object, interval_start=start_peak, interval_end=end_peak):
-                return "peak"
-
-        for time in intermediate_times:
-            start_hour, start_minute, end_hour, end_minute = interval_to_tuple(interval=time)
-            start_intermediate = datetime(
-                year=datetime_object.year,
-                month=datetime_object.month,
-                day=datetime_object.day,
-                hour=start_hour,
-                minute=start_minute,
-                tzinfo=datetime_object.tzinfo
-            )
-            end_intermediate = datetime(
-                year=datetime_object.year,
-                month=datetime_object.month,
-                day=datetime_object.day,
-                hour=end_hour,
-                minute=end_minute,
-                tzinfo=datetime_object.tzinfo
-            )
-            if is_in_interval(datetime_object=datetime_object, interval_start=start_intermediate, interval_end=end_intermediate):
-                return "intermediate"
-
-        return "off_peak"
+    schedule = get_tariff_schedule(peak_times=tuple(peak_times), intermediate_times=tuple(intermediate_times))
+    return schedule.rate(datetime_object=datetime_object)
@@ -10,6 +10,12 @@ The best way to use this module functionalities is by using Dojot class.
 
 >>> dojot = Dojot(user="admin", password="admin", ip="192.168.0.111", http_port=8000, mqtt_port=1883)
 
+The HTTP and MQTT connections are kept open between calls, so close them when you are done, or use the class as a
+context manager:
+
+>>> with Dojot(user="admin", password="admin", ip="192.168.0.111", http_port=8000, mqtt_port=1883) as dojot:
+>>>     dojot.get_device("fv_ceamazon_1")
+
 If you are using the default templates file, you can create them on Dojot by using:
 
 >>> dojot.create_all_templates(monthly=True)
@@ -49,22 +55,34 @@ You can recover the data from a device by using:
 >>> dojot.get_device_history(device_label="fv_ceamazon_1", last_n=10)
 """
 
+import csv
+import numpy as np
 import requests
 import json
-import paho.mqtt.publish as publish
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from datetime import datetime
-from os.path import abspath, dirname, join
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from datetime import datetime, timedelta, timezone
+from os.path import abspath, dirname, join, splitext
 
 from date_tools import (get_localized_datetime, get_localized_current_datetime, convert_from_string, get_timezone,
                               convert_timezone, convert_to_utc)
 from exception import (TemplateNotExists, TemplateAlreadyExists, DeviceNotExists, DeviceAlreadyExists,
                                   DataTemplateMismatch)
+from mqtt import PublisherPool
 
 
 default_timezone = "America/Belem"
 """str: Timezone string to use on datetime objects."""
 
+JSON_HEADERS = {"Content-Type": "application/json"}
+"""dict: Headers of the requests sending a JSON body."""
+
 
 override_stdout = None
 
@@ -217,10 +235,84 @@ def set_jwt(jwt, path=None):
         json.dump(jwt_dict, json_file)
 
 
+def convert_history_to_columns(history):
+    """
+    Convert the data returned by the history API function to NumPy columns, parsing each attribute in batch.
+
+    Parameters
+    ----------
+    history : dict
+        Dict that was returned by history API.
+
+    Returns
+    -------
+    dict
+        Dict with the format::
+
+            {
+                "attr": {
+                    "datetime": np.ndarray,  # datetime64[us] in UTC
+                    "value": np.ndarray  # See convert_values_to_column
+                }
+            }
+    """
+    history_columns = {}
+    for attr, values in history.items():
+        history_columns[attr] = {
+            "datetime": np.array([value["timestamp"].rstrip("Z") for value in values], dtype="datetime64[us]"),
+            "value": convert_values_to_column(values=[value["value"] for value in values])
+        }
+    return history_columns
+
+
+def convert_values_to_column(values, timezone=default_timezone):
+    """
+    Convert a list of history values to a typed NumPy array.
+
+    Numbers and numeric strings become an int64 array if all of them are integers, or a float64 array otherwise. Any
+    other content becomes an object array with each value converted by :func:`convert_to_correct_type`.
+
+    Parameters
+    ----------
+    values : list
+        Values as returned by the history API.
+    timezone : str
+        Timezone name used by :func:`convert_to_correct_type` on the object arrays.
+
+    Returns
+    -------
+    np.ndarray
+        Array with the converted values.
+    """
+    try:
+        column = np.asarray(values)
+    except ValueError:  # Ragged lists can not be a single array
+        column = None
+
+    if column is not None and column.ndim == 1:
+        if column.dtype.kind in "iub":
+            return column.astype(np.int64)
+        elif column.dtype.kind == "f":
+            return column
+        elif column.dtype.kind == "U":
+            for dtype in (np.int64, np.float64):
+                try:
+                    return column.astype(dtype)
+                except (ValueError, OverflowError):
+                    pass
+
+    column = np.empty(len(values), dtype=object)
+    for index, value in enumerate(values):
+        column[index] = convert_to_correct_type(value=value, timezone=timezone)
+    return column
+
+
 def convert_history_to_dict(history):
     """
     Convert the data returned by the history API function to a dict with correct variable type conversion.
 
+    The timestamps are parsed in batch by :func:`convert_history_to_columns`. Use it directly to get NumPy columns.
+
     Parameters
     ----------
     history : dict
@@ -231,30 +323,45 @@ def convert_history_to_dict(history):
     dict
         Dict with converted numeric types.
     """
+    tz_to = get_timezone(default_timezone)
     history_dict = {}
-    for attr, values in history.items():
+    for attr, columns in convert_history_to_columns(history=history).items():
         history_dict[attr] = {}
-        history_dict[attr]["datetime"] = []
-        history_dict[attr]["value"] = []
-        for value in values:
-            try:
-                history_dict[attr]["datetime"].append(
-                    convert_timezone(
-                        datetime_obj=convert_from_string(datetime_str=value["timestamp"], template="%Y-%m-%dT%H:%M:%S.%fZ"),
-                        tz_to=default_timezone
-                    )
-                )
-            except ValueError:
-                history_dict[attr]["datetime"].append(
-                    convert_timezone(
-                        datetime_obj=convert_from_string(datetime_str=value["timestamp"], template="%Y-%m-%dT%H:%M:%SZ"),
-                        tz_to=default_timezone
-                    )
-                )
-            history_dict[attr]["value"].append(convert_to_correct_type(value=value["value"], timezone=default_timezone))
+        history_dict[attr]["datetime"] = [
+            value.replace(tzinfo=timezone.utc).astimezone(tz_to) for value in columns["datetime"].astype(object)
+        ]
+        if columns["value"].dtype == np.int64:
+            history_dict[attr]["value"] = columns["value"].tolist()
+        else:  # Anything but integers keeps the original value by value conversion
+            history_dict[attr]["value"] = [
+                convert_to_correct_type(value=value["value"], timezone=default_timezone) for value in history[attr]
+            ]
     return history_dict
 
 
+def history_row_to_text(value):
+    """
+    Convert a converted history value or datetime to the text written on exported history files.
+
+    Parameters
+    ----------
+    value : int/float/datetime/dict/str
+        Value as returned by :func:`convert_to_correct_type`.
+
+    Returns
+    -------
+    int/float/str
+        The value itself if it can be written on a JSON or CSV file, its ISO 8601 representation if it is a datetime
+        and its JSON representation if it is a dict.
+    """
+    if isinstance(value, datetime):
+        return value.isoformat()
+    elif isinstance(value, dict):
+        return json.dumps(value)
+    else:
+        return value
+
+
 def convert_to_correct_type(value, timezone=None, strptime_template="%Y-%m-%d %H:%M:%S"):
     """
     Convert an individual value from a generic str to the correct data format to be used on SIMA Core dicts.
@@ -323,8 +430,16 @@ class Dojot(object):
         Dict with all templates.
     jwt : str
         Token access to Dojot API.
+    device_index_ttl : float
+        Seconds the device label/id index is trusted before being fetched again from Dojot.
+    publishers : mqtt.PublisherPool
+        Pool of MQTT connections, one per device, used to send data.
+    session : requests.Session
+        HTTP session whose keep-alive connections are reused by every REST call.
     """
-    def __init__(self, user, password, ip, http_port, mqtt_port, templates=None, stdout=None):
+    def __init__(self, user, password, ip, http_port, mqtt_port, templates=None, stdout=None, device_index_ttl=300,
+                 mqtt_pool_size=64, mqtt_max_inflight=20, mqtt_idle_seconds=60, http_pool_size=10, http_timeout=30,
+                 http_retries=3, http_backoff=0.5, jwt_path=None):
         """
         Constructor of Dojot class.
 
@@ -343,6 +458,26 @@ class Dojot(object):
         templates : dict
             Dict containing all templates information to be used. Follow the structure of file
             :file:`comm/iot/templates.json`.
+        device_index_ttl : float
+            Seconds the device label/id index is trusted before being fetched again from Dojot. The index is also
+            kept up to date by :meth:`.Dojot.create_device` and :meth:`.Dojot.delete_device`.
+        mqtt_pool_size : int
+            Maximum number of device MQTT connections kept open. The least recently used one is closed first.
+        mqtt_max_inflight : int
+            Maximum number of QoS 1 messages waiting for acknowledgement on each device connection.
+        mqtt_idle_seconds : float
+            Seconds after which an unused device MQTT connection is closed.
+        http_pool_size : int
+            Maximum number of keep-alive HTTP connections kept open to Dojot.
+        http_timeout : float/tuple
+            Timeout of each HTTP request, as accepted by :mod:`requests`.
+        http_retries : int
+            Number of retries of a request that failed to connect or got a 5xx response. Only idempotent methods are
+            retried on 5xx responses.
+        http_backoff : float
+            Backoff factor between retries. The n-th retry waits ``http_backoff * 2 ** (n - 1)`` seconds.
+        jwt_path : str/None
+            Path of the file caching the access token. If None, :file:`comm/iot/.jwt.json` is used.
         """
         self.user = user
         self.password = password
@@ -350,14 +485,64 @@ class Dojot(object):
         self.http_port = http_port
         self.mqtt_port = mqtt_port
         self.templates = templates if templates is not None else get_templates()
-        jwt_dict = get_jwt()
+        self.base_url = "http://{0}:{1}".format(ip, http_port)
+        self.http_timeout = http_timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=http_pool_size,
+            max_retries=Retry(
+                total=http_retries,
+                backoff_factor=http_backoff,
+                status_forcelist=(500, 502, 503, 504),
+                raise_on_status=False
+            )
+        )
+        self.session.mount("http://", adapter)
+        self.device_index_ttl = device_index_ttl
+        self._device_id_by_label = {}
+        self._device_label_by_id = {}
+        self._device_index_expires = 0
+        self._device_index_lock = threading.RLock()
+        self.publishers = PublisherPool(
+            host=ip,
+            port=mqtt_port,
+            tenant=user,
+            max_connections=mqtt_pool_size,
+            max_inflight=mqtt_max_inflight,
+            idle_seconds=mqtt_idle_seconds
+        )
+        jwt_dict = get_jwt(path=jwt_path)
         if jwt_dict is not None:
             self.jwt = jwt_dict["jwt"]
         else:
             self.jwt = self.request_token()
-            set_jwt(jwt=self.jwt)
+            set_jwt(jwt=self.jwt, path=jwt_path)
+        self.session.headers["Authorization"] = "Bearer {0}".format(self.jwt)
         set_stdout(stdout=stdout)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Wait for the pending MQTT messages to be acknowledged and close all device and HTTP connections.
+
+        Returns
+        -------
+        None
+            Just close the connections.
+        """
+        self.publishers.close()
+        self.session.close()
+
+    def _request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.http_timeout)
+        return self.session.request(method, self.base_url + path, **kwargs)
+
     def request_token(self):
         """
         Request the access token for ``user`` with ``password``.
@@ -367,13 +552,9 @@ class Dojot(object):
         str
             The API access token, usually called jwt.
         """
-        url_request_token = "http://" + self.ip + ":" + str(self.http_port) + "/auth"
-
-        headers = {"Content-Type": "application/json"}
-
         data = "{\"username\": \"" + self.user + "\", \"passwd\" : \"" + self.password + "\"}"
 
-        request = requests.post(url=url_request_token, headers=headers, data=data)
+        request = self._request("POST", "/auth", headers=JSON_HEADERS, data=data)
 
         jwt = json.loads(request.__dict__["_content"].decode("utf-8"))["jwt"]  # Convert the incoming string into a dict
         # and then get the jwt
@@ -409,10 +590,6 @@ class Dojot(object):
             See also :meth:`.Dojot.create_template_from_dict` and :meth:`.Dojot.create_all_templates` for other ways to
             create templates.
         """
-        url_create_template = "http://" + self.ip + ":" + str(self.http_port) + "/template"
-
-        headers = {"Authorization": "Bearer {0}".format(self.jwt), "Content-Type": "application/json"}
-
         device_template = {
             "label": label,
             "attrs": attrs
@@ -423,7 +600,7 @@ class Dojot(object):
         template_exist = (self.get_template_id_by_label(label=label) is not None)
 
         if not template_exist:
-            request = requests.post(url=url_create_template, headers=headers, data=data)
+            request = self._request("POST", "/template", headers=JSON_HEADERS, data=data)
 
             response = json.loads(request.__dict__["_content"].decode("utf-8"))
 
@@ -556,11 +733,7 @@ class Dojot(object):
         dict
             A dict containing all templates currently on Dojot.
         """
-        url_templates = "http://" + self.ip + ":" + str(self.http_port) + "/template?page_size=999999&sortBy=label"
-
-        headers = {"Authorization": "Bearer {0}".format(self.jwt)}
-
-        request = requests.get(url=url_templates, headers=headers)
+        request = self._request("GET", "/template", params={"page_size": "999999", "sortBy": "label"})
 
         request = json.loads(request.__dict__["_content"].decode("utf-8"))
 
@@ -616,11 +789,7 @@ class Dojot(object):
         template_exist = (template_id is not None)
 
         if template_exist:
-            url_template = "http://" + self.ip + ":" + str(self.http_port) + "/template/" + str(template_id)
-
-            headers = {"Authorization": "Bearer {0}".format(self.jwt)}
-
-            request = requests.get(url=url_template, headers=headers)
+            request = self._request("GET", "/template/" + str(template_id))
 
             response = json.loads(request.__dict__["_content"].decode("utf-8"))
 
@@ -674,11 +843,7 @@ class Dojot(object):
         template_exists = (template_id is not None)
 
         if template_exists:
-            url_delete_template = "http://" + self.ip + ":" + str(self.http_port) + "/template/" + str(template_id)
-
-            headers = {"Authorization": "Bearer {0}".format(self.jwt)}
-
-            request = requests.delete(url=url_delete_template, headers=headers)
+            request = self._request("DELETE", "/template/" + str(template_id))
 
             response = json.loads(request.__dict__["_content"].decode("utf-8"))
 
@@ -743,25 +908,14 @@ class Dojot(object):
         template_exist = (template_id is not None)
 
         if template_exist:
-            url_create_device = "http://" + self.ip + ":" + str(self.http_port) + "/device"
-
-            headers = {"Authorization": "Bearer {0}".format(self.jwt), "Content-Type": "application/json"}
-
             label = device_name
 
-            device = {
-                "label": label,
-                "templates": [str(template_id)]
-            }
-
-            data = json.dumps(device, indent=4)
-
             device_id = self.get_device_id_by_label(label=label)
 
             device_exists = (device_id is not None)
 
             if not device_exists:
-                request = requests.post(url=url_create_device, headers=headers, data=data)
+                request = self._post_device(label=label, template_id=template_id)
 
                 response = json.loads(request.__dict__["_content"].decode("utf-8"))
 
@@ -778,6 +932,59 @@ class Dojot(object):
             error = "A device can not be created without a valid Dojot template"
             raise TemplateNotExists(message=message, error=error)
 
+    def _post_device(self, label, template_id):
+        device = {
+            "label": label,
+            "templates": [str(template_id)]
+        }
+
+        data = json.dumps(device, indent=4)
+
+        request = self._request("POST", "/device", headers=JSON_HEADERS, data=data)
+
+        try:
+            created = request.json().get("devices", [])
+        except (ValueError, AttributeError):
+            created = []
+
+        if created:
+            self._index_devices(devices=created)
+        else:
+            self.invalidate_device_index()
+
+        return request
+
+    def _delete_device_by_id(self, label, device_id):
+        request = self._request("DELETE", "/device/" + str(device_id))
+
+        if request.ok:  # A failed delete leaves the device on Dojot, so it stays on the index
+            self._unindex_device(label=label)
+
+        return request
+
+    def _run_bulk(self, task, labels, skipped, max_workers):
+        succeeded = {}
+        failed = {}
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(task, label): label for label in labels}
+            for future in as_completed(futures):
+                label = futures[future]
+                try:
+                    succeeded[label] = future.result()
+                except Exception as error:
+                    failed[label] = error
+        elapsed = time.perf_counter() - started
+
+        return {
+            "succeeded": succeeded,
+            "skipped": skipped,
+            "failed": failed,
+            "elapsed_seconds": elapsed,
+            "devices_per_second": len(succeeded) / elapsed if elapsed > 0 else 0.0
+        }
+
     def create_complete_device(self, device_name, template_label, static_values=None):
         """
         Create a device and its virtual monthly device.
@@ -808,10 +1015,13 @@ class Dojot(object):
         template_label = "{0}_mensal".format(template_label)
         self.create_device(device_name=device_name, template_label=template_label, static_values=static_values)
 
-    def create_all_devices(self, devices=None):
+    def create_all_devices(self, devices=None, max_workers=8):
         """
         Create all devices from file :file:`comm/iot/devices.json`.
 
+        The existing devices are fetched once and skipped, the remaining ones are created by up to ``max_workers``
+        concurrent requests.
+
         Parameters
         ----------
         devices : dict/None
@@ -833,11 +1043,21 @@ class Dojot(object):
             Each item on template list will generate an entire new device and its corresponding monthly virtual device.
 
             If None, the default file :file:`comm/iot/devices.json` will be read.
+        max_workers : int
+            Maximum number of devices being created at the same time. Keep it below ``http_pool_size``.
 
         Returns
         -------
-        None
-            Just creates the devices.
+        dict
+            Report of the provisioning in the format::
+
+                {
+                    "succeeded": {"device_1": response},
+                    "skipped": ["device_2"],  # Already on Dojot
+                    "failed": {"device_3": exception},
+                    "elapsed_seconds": 1.2,
+                    "devices_per_second": 2.5  # Devices created, the failed ones excluded
+                }
 
         Warnings
         -----
@@ -846,14 +1066,34 @@ class Dojot(object):
         """
         if devices is None:
             devices = get_devices()
+
+        existing = self.refresh_device_index()
+        templates = self.get_all_templates_id()
+
+        template_by_label = {}
+        skipped = []
+        failed = {}
         for template, devices_list in devices.items():
             for device in devices_list:
                 device_name = device["name"]
-                try:
-                    print(f'creating device {device_name}')
-                    self.create_device(device_name=device_name, template_label=template)
-                except DeviceAlreadyExists:
-                    pass
+                if device_name in existing:
+                    skipped.append(device_name)
+                elif template not in templates:
+                    message = "Template with label {0} do not exists on Dojot".format(template)
+                    error = "A device can not be created without a valid Dojot template"
+                    failed[device_name] = TemplateNotExists(message=message, error=error)
+                else:
+                    template_by_label[device_name] = templates[template]
+
+        def create(label):
+            request = self._post_device(label=label, template_id=template_by_label[label])
+            request.raise_for_status()
+            return request.json()
+
+        report = self._run_bulk(task=create, labels=list(template_by_label), skipped=skipped, max_workers=max_workers)
+        report["failed"].update(failed)
+
+        return report
 
     def update_static(self, device_label, static_values):
         """
@@ -875,10 +1115,6 @@ class Dojot(object):
 
         template_id = self.get_device_template_id(device_label=device_label)
 
-        url_update_static = "http://" + self.ip + ":" + str(self.http_port) + "/device/" + device_id
-
-        headers = {"Authorization": "Bearer {0}".format(self.jwt), "Content-Type": "application/json"}
-
         device_info = self.get_device(device_label=device_label)  # Need to send all devices information, not just the
         # parameters to be updated. So, get all information and edit just the corresponding dict keys.
 
@@ -915,7 +1151,7 @@ class Dojot(object):
 
         data = json.dumps(data, indent=4)
 
-        request = requests.put(url=url_update_static, headers=headers, data=data)
+        request = self._request("PUT", "/device/" + device_id, headers=JSON_HEADERS, data=data)
 
         response = json.loads(request.__dict__["_content"].decode("utf-8"))
 
@@ -930,11 +1166,7 @@ class Dojot(object):
         dict
             A dict containing all devices id.
         """
-        url_devices = "http://" + self.ip + ":" + str(self.http_port) + "/device/template/" + str(template_id) + "?page_size=999999"
-
-        headers = {"Authorization": "Bearer {0}".format(self.jwt)}
-
-        request = requests.get(url=url_devices, headers=headers)
+        request = self._request("GET", "/device/template/" + str(template_id), params={"page_size": "999999"})
 
         request = json.loads(request.__dict__["_content"].decode("utf-8"))
 
@@ -942,8 +1174,57 @@ class Dojot(object):
         for device in request["devices"]:
             device_id[device["label"]] = device["id"]
 
+        self._index_devices(devices=request["devices"])
+
         return device_id
 
+    def refresh_device_index(self):
+        """
+        Fetch all devices from Dojot and rebuild the label/id index used by the device lookups.
+
+        Returns
+        -------
+        dict
+            A dict containing all devices id with labels as keys.
+        """
+        request = self._request("GET", "/device", params={"page_size": "999999"})
+
+        request = json.loads(request.__dict__["_content"].decode("utf-8"))
+
+        with self._device_index_lock:
+            self._device_id_by_label = {}
+            self._device_label_by_id = {}
+            self._index_devices(devices=request["devices"])
+            self._device_index_expires = time.monotonic() + self.device_index_ttl
+
+            return dict(self._device_id_by_label)
+
+    def invalidate_device_index(self):
+        """
+        Discard the device label/id index, so the next lookup fetches it again from Dojot.
+
+        Returns
+        -------
+        None
+            Just invalidate the index.
+        """
+        self._device_index_expires = 0
+
+    def _index_devices(self, devices):
+        with self._device_index_lock:
+            for device in devices:
+                self._device_id_by_label[device["label"]] = device["id"]
+                self._device_label_by_id[device["id"]] = device["label"]
+
+    def _unindex_device(self, label):
+        with self._device_index_lock:
+            device_id = self._device_id_by_label.pop(label, None)
+            self._device_label_by_id.pop(device_id, None)
+
+    def _ensure_device_index(self):
+        if time.monotonic() >= self._device_index_expires:
+            self.refresh_device_index()
+
     def get_device_id_by_label(self, label):
         """
         Get the device id of a specific device.
@@ -958,13 +1239,8 @@ class Dojot(object):
         str/None
             Device id of the device if founded, None otherwise.
         """
-        try:
-            devices = self.get_all_devices_id(5)
-            device_id = devices[label]
-        except KeyError:
-            return None
-        else:
-            return device_id
+        self._ensure_device_index()
+        return self._device_id_by_label.get(label)
 
     def get_device_label_by_id(self, device_id):
         """
@@ -980,13 +1256,8 @@ class Dojot(object):
         str/None
             Label of the device if founded, None otherwise.
         """
-        devices = self.get_all_devices_id()
-        device_label = None
-        for label, dev_id in devices.items():
-            if device_id == dev_id:
-                device_label = label
-                break
-        return device_label
+        self._ensure_device_index()
+        return self._device_label_by_id.get(device_id)
 
     def device_exists(self, label):
         """
@@ -1032,11 +1303,7 @@ class Dojot(object):
         device_exist = (device_id is not None)
 
         if device_exist:
-            url_devices = "http://" + self.ip + ":" + str(self.http_port) + "/device/" + device_id
-
-            headers = {"Authorization": "Bearer {0}".format(self.jwt)}
-
-            request = requests.get(url=url_devices, headers=headers)
+            request = self._request("GET", "/device/" + device_id)
 
             response = json.loads(request.__dict__["_content"].decode("utf-8"))
 
@@ -1107,11 +1374,7 @@ class Dojot(object):
         device_exist = (device_id is not None)
 
         if device_exist:
-            url_delete_device = "http://" + self.ip + ":" + str(self.http_port) + "/device/" + str(device_id)
-
-            headers = {"Authorization": "Bearer {0}".format(self.jwt)}
-
-            request = requests.delete(url=url_delete_device, headers=headers)
+            request = self._delete_device_by_id(label=device_label, device_id=device_id)
 
             response = json.loads(request.__dict__["_content"].decode("utf-8"))
 
@@ -1121,28 +1384,54 @@ class Dojot(object):
             error = "A device not created can not be deleted"
             raise DeviceNotExists(message=message, error=error)
 
-    def delete_all_created_devices(self):
+    def delete_all_created_devices(self, devices=None, max_workers=8):
         """
-        Delete all devices currently on Dojot.
+        Delete all devices from file :file:`comm/iot/devices.json` currently on Dojot.
+
+        The existing devices are fetched once, the ones not on Dojot are skipped and the remaining ones are deleted by
+        up to ``max_workers`` concurrent requests.
+
+        Parameters
+        ----------
+        devices : dict/None
+            The dict containing all devices separated by template, as in :meth:`.Dojot.create_all_devices`. If None,
+            the default file :file:`comm/iot/devices.json` will be read.
+        max_workers : int
+            Maximum number of devices being deleted at the same time. Keep it below ``http_pool_size``.
 
         Returns
         -------
-        None
-            Just delete devices.
+        dict
+            Report of the deletion in the same format of :meth:`.Dojot.create_all_devices`, where ``skipped`` are
+            the devices not found on Dojot.
 
         Warnings
         --------
-        If some of the devices was deleted from Dojot GUI during the execution of this method, it will be ignored.
+        If some of the devices was deleted from Dojot GUI during the execution of this method, it will be reported
+        in ``failed``.
         """
-        devices = get_devices()
+        if devices is None:
+            devices = get_devices()
+
+        existing = self.refresh_device_index()
 
+        labels = []
+        skipped = []
         for template, device_list in devices.items():
             for device in device_list:
-                try:
-                    print(f"deleting device {device['name']}")
-                    self.delete_device(device_label=device["name"])
-                except DeviceNotExists:
-                    pass
+                if device["name"] in existing:
+                    labels.append(device["name"])
+                else:
+                    skipped.append(device["name"])
+
+        def delete(label):
+            request = self._delete_device_by_id(label=label, device_id=existing[label])
+            request.raise_for_status()
+            return request.json()
+
+        report = self._run_bulk(task=delete, labels=labels, skipped=skipped, max_workers=max_workers)
+
+        return report
 
     def get_history(self, device_id, params):
         """
@@ -1167,11 +1456,7 @@ class Dojot(object):
         :meth:`comm.iot.dojot.get_device_history` uses this method to make a request and post-process the data
         recovered.
         """
-        url_device_history = "http://" + self.ip + ":" + str(self.http_port) + "/history/device/" + device_id + "/history"
-
-        headers = {"Authorization": "Bearer {0}".format(self.jwt)}
-
-        request = requests.get(url_device_history, headers=headers, params=params)
+        request = self._request("GET", "/history/device/" + device_id + "/history", params=params)
 
         response = request.json()
 
@@ -1197,6 +1482,8 @@ class Dojot(object):
             Start time of a time-based query as %Y-%m-%dT%H:%M:%S.%f%z.
         date_to : str
             End time of a time-based query as %Y-%m-%dT%H:%M:%S.%f%z.
+        columnar : bool
+            If True, return the NumPy columns of :func:`convert_history_to_columns` instead of lists.
 
         Returns
         -------
@@ -1233,7 +1520,10 @@ class Dojot(object):
 
             response = self.get_history(device_id=device_id, params=params)
 
-            history = convert_history_to_dict(history=response)
+            if kwargs.get("columnar", False):
+                history = convert_history_to_columns(history=response)
+            else:
+                history = convert_history_to_dict(history=response)
 
             return history
         else:
@@ -1241,10 +1531,193 @@ class Dojot(object):
             error = "A device not created can not be accessed"
             raise DeviceNotExists(message=message, error=error)
 
+    def iter_device_history(self, device_label, date_from, date_to, window=timedelta(hours=1)):
+        """
+        Iterate over the history of a specific device with ``device_label``, one time window at a time.
+
+        The interval between ``date_from`` and ``date_to`` is requested in chunks of ``window``, and only the rows of
+        the current chunk are kept in memory.
+
+        Parameters
+        ----------
+        device_label : str
+            Label of the device whose data will be requested.
+        date_from : datetime
+            Start of the interval. Naive datetimes are considered to be on ``default_timezone``.
+        date_to : datetime
+            End of the interval. Naive datetimes are considered to be on ``default_timezone``.
+        window : timedelta
+            Length of each chunk requested to Dojot.
+
+        Yields
+        ------
+        dict
+            Rows sorted by datetime in the format::
+
+                {"attr": "meter_values", "datetime": datetime, "value": value}
+
+        Raises
+        ------
+        DeviceNotExists
+            If the selected device do not exists on Dojot platform.
+        """
+        device_id = self.get_device_id_by_label(label=device_label)
+
+        if device_id is None:
+            message = "Device with label {0} do not exists on Dojot".format(device_label)
+            error = "A device not created can not be accessed"
+            raise DeviceNotExists(message=message, error=error)
+
+        template_label = self.get_device_template_label(device_label=device_label)
+
+        attrs = list(self.templates[template_label]["dynamic"].keys())
+
+        if date_from.tzinfo is None:
+            date_from = get_localized_datetime(datetime_object=date_from, timezone=default_timezone)
+        if date_to.tzinfo is None:
+            date_to = get_localized_datetime(datetime_object=date_to, timezone=default_timezone)
+
+        window_start = convert_to_utc(date_from)
+        date_to = convert_to_utc(date_to)
+
+        while window_start <= date_to:
+            window_end = min(window_start + window - timedelta(microseconds=1), date_to)  # dateTo is inclusive
+
+            params = {
+                "attr": attrs,
+                "dateFrom": window_start.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                "dateTo": window_end.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+            }
+
+            request = self._request("GET", "/history/device/" + device_id + "/history", params=params)
+
+            if request.status_code != 404:  # History answers 404 when the window has no data
+                request.raise_for_status()
+
+                response = request.json()
+                if isinstance(response, list):  # A single attribute is answered as a list of values
+                    response = {attrs[0]: response}
+
+                history = convert_history_to_dict(history=response)
+
+                rows = []
+                for attr, values in history.items():
+                    for row_datetime, value in zip(values["datetime"], values["value"]):
+                        rows.append({"attr": attr, "datetime": row_datetime, "value": value})
+                rows.sort(key=lambda row: row["datetime"])
+
+                for row in rows:
+                    yield row
+
+            window_start = window_end + timedelta(microseconds=1)
+
+    def export_device_history(self, device_label, path, date_from, date_to, window=timedelta(hours=1)):
+        """
+        Write the history of a specific device to a CSV or JSON Lines file, using
+        :meth:`.Dojot.iter_device_history` so memory usage does not grow with the interval.
+
+        Parameters
+        ----------
+        device_label : str
+            Label of the device whose data will be exported.
+        path : str
+            Path of the output file. Files ending with ``.csv`` are written as CSV, any other as JSON Lines.
+        date_from : datetime
+            Start of the interval.
+        date_to : datetime
+            End of the interval.
+        window : timedelta
+            Length of each chunk requested to Dojot.
+
+        Returns
+        -------
+        int
+            Number of rows written.
+        """
+        rows = self.iter_device_history(device_label=device_label, date_from=date_from, date_to=date_to,
+                                        window=window)
+
+        written = 0
+        with open(path, "w", newline="") as export_file:
+            if splitext(str(path))[1].lower() == ".csv":
+                writer = csv.writer(export_file)
+                writer.writerow(["device", "attr", "datetime", "value"])
+                for row in rows:
+                    writer.writerow([device_label, row["attr"], history_row_to_text(row["datetime"]),
+                                     history_row_to_text(row["value"])])
+                    written += 1
+            else:
+                for row in rows:
+                    export_file.write(json.dumps({
+                        "device": device_label,
+                        "attr": row["attr"],
+                        "datetime": history_row_to_text(row["datetime"]),
+                        "value": history_row_to_text(row["value"])
+                    }) + "\n")
+                    written += 1
+
+        return written
+
+    def export_fleet_history(self, device_labels, directory, date_from, date_to, window=timedelta(hours=1),
+                             extension="jsonl", max_workers=4):
+        """
+        Export the history of several devices at the same time, one file per device.
+
+        Parameters
+        ----------
+        device_labels : list
+            Labels of the devices whose data will be exported.
+        directory : str
+            Directory where the files ``<device_label>.<extension>`` will be written.
+        date_from : datetime
+            Start of the interval.
+        date_to : datetime
+            End of the interval.
+        window : timedelta
+            Length of each chunk requested to Dojot.
+        extension : str
+            ``csv`` or ``jsonl``.
+        max_workers : int
+            Maximum number of devices being exported at the same time. Keep it below ``http_pool_size``.
+
+        Returns
+        -------
+        dict
+            Report in the same format of :meth:`.Dojot.create_all_devices`, with the number of rows written by device
+            on ``succeeded``.
+        """
+        def export(label):
+            return self.export_device_history(device_label=label, path=join(directory, label + "." + extension),
+                                              date_from=date_from, date_to=date_to, window=window)
+
+        return self._run_bulk(task=export, labels=list(device_labels), skipped=[], max_workers=max_workers)
+
+    def _serialize_data(self, data, template_label, check_attrs):
+        if isinstance(data["timestamp"], datetime):  # If the data timestamp is a datetime object, convert it to a str
+            data["timestamp"] = convert_to_utc(data["timestamp"])
+            data["timestamp"] = data["timestamp"].strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+        if check_attrs:
+            data_attr = sorted(list(data.keys()))
+            data_attr.remove("timestamp")  # Ignore timestamp on comparing to the template
+
+            template_attr = sorted(list(self.templates[template_label]["dynamic"].keys()))
+
+            if data_attr != template_attr:  # Never send data whose attributes do not match the template
+                message = "The provided data do not match the expected pattern from defined templates"
+                error = "Provided data and template expected pattern mismatch"
+                raise DataTemplateMismatch(message=message, error=error)
+
+        return json.dumps(data)
+
     def send_data_to_device(self, device_label, data, check_attrs=False):
         """
         Send data to a defined device on Dojot using paho-mqtt publishing mechanisms.
 
+        The message is published with QoS 1 over the device connection kept by :attr:`.Dojot.publishers`, so
+        consecutive calls reuse the same connection. Use :meth:`.Dojot.close` or ``self.publishers.flush()`` to wait
+        for the acknowledgements.
+
         Parameters
         ----------
         device_label : str
@@ -1269,39 +1742,49 @@ class Dojot(object):
 
         template_label = self.get_device_template_label(device_label=device_label)
 
-        if isinstance(data["timestamp"], datetime):  # If the data timestamp is a datetime object, convert it to a str
-            data["timestamp"] = convert_to_utc(data["timestamp"])
-            data["timestamp"] = data["timestamp"].strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        data_to_send = self._serialize_data(data=data, template_label=template_label, check_attrs=check_attrs)
 
-        data_to_send = json.dumps(data)
+        self.publishers.publish(device_id=device_id, payload=data_to_send, qos=1)
 
-        attrs_match = False
+    def send_many(self, device_label, data_list, check_attrs=False, timeout=None):
+        """
+        Send a sequence of data to a defined device on Dojot and wait for all of them to be acknowledged.
 
-        if check_attrs:
-            data_attr = sorted(list(data.keys()))
-            data_attr.remove("timestamp")  # Ignore timestamp on comparing to the template
+        The device lookup is done once and every message goes through the same pooled connection, keeping up to
+        ``mqtt_max_inflight`` messages in flight.
 
-            template_attr = sorted(list(self.templates[template_label]["dynamic"].keys()))
+        Parameters
+        ----------
+        device_label : str
+            Label of the device to receive the data.
+        data_list : iterable
+            Iterable of dicts, each one as the ``data`` of :meth:`.Dojot.send_data_to_device`.
+        check_attrs : bool
+            Check if each data attributes match with the expected pattern from template before send.
+        timeout : float/None
+            Seconds to wait for the acknowledgements. If None, wait forever.
 
-            attrs_match = (data_attr == template_attr)  # Check if data and template attributes match
-
-        if attrs_match or not check_attrs:  # Just send data if the attributes match or check_attrs is False
-            topic = "{0}:{1}/attrs".format(self.user, device_id)
-
-            publish.single(
-                topic=topic,
-                payload=data_to_send,
-                hostname=self.ip,
-                port=self.mqtt_port,
-                client_id=f"{self.user}:{device_id}",
-                qos=1,
-                auth={
-                    "username": f"{self.user}:{device_id}",
-                    "password": device_id
-                }
-            )
+        Returns
+        -------
+        int
+            Number of messages sent.
 
-        else:
-            message = "The provided data do not match the expected pattern from defined templates"
-            error = "Provided data and template expected pattern mismatch"
-            raise DataTemplateMismatch(message=message, error=error)
+        Raises
+        ------
+        DataTemplateMismatch
+            If ``check_attrs`` is True and some data attributes do not match the expected pattern from defined
+            templates. The data before it are still sent.
+        """
+        device_id = self.get_device_id_by_label(label=device_label)
+
+        template_label = self.get_device_template_label(device_label=device_label)
+
+        sent = 0
+        for data in data_list:
+            data_to_send = self._serialize_data(data=data, template_label=template_label, check_attrs=check_attrs)
+            self.publishers.publish(device_id=device_id, payload=data_to_send, qos=1)
+            sent += 1
+
+        self.publishers.flush(timeout=timeout)
+
+        return sent
@@ -0,0 +1,214 @@
+"""
+Charging curve of the simulated vehicles.
+
+Each session charges a vehicle of random battery capacity and starting state of charge (SoC) at the lower of the
+charger and vehicle powers. The curve is the usual constant current / constant voltage (CC/CV) one: full power up to
+:data:`CV_SOC`, then a power falling linearly with the SoC, which makes the SoC approach 100% exponentially. Both
+phases are integrated exactly, so the result does not depend on how often a session is advanced. The energy register
+of the charger grows by the energy drawn from the grid, the stored energy over :data:`EFFICIENCY`, so it only ever
+increases.
+
+:func:`cc_cv_step` works on NumPy arrays, so every open session is advanced by one call per tick:
+
+>>> sessions = ChargingSessions(seed=1)
+>>> row = sessions.open(now=0, meter_wh=2656119, charger_power_w=22000)
+>>> sessions.advance(now=60)
+>>> sessions.soc_percent(row), sessions.energy_wh(row)
+(35, 2656485)
+"""
+import numpy as np
+
+CV_SOC = 0.8
+"""float: SoC where the constant voltage phase starts and the power starts to taper."""
+
+EFFICIENCY = 0.92
+"""float: Fraction of the energy drawn from the grid that is stored on the battery."""
+
+CHARGER_POWER_W = (7400, 11000, 22000, 50000)
+"""tuple: Maximum power of the chargers, one drawn for each charger."""
+
+VEHICLE_CAPACITY_WH = (40000, 100000)
+"""tuple: Range of the battery capacity of the vehicles."""
+
+VEHICLE_POWER_W = (7400, 150000)
+"""tuple: Range of the maximum power the vehicles accept."""
+
+INITIAL_SOC = (0.1, 0.6)
+"""tuple: Range of the SoC of the vehicles when plugged in."""
+
+INITIAL_METER_WH = (0, 10 ** 7)
+"""tuple: Range of the energy register of the chargers when the simulation starts."""
+
+
+def cc_cv_step(soc, capacity_wh, power_w, seconds, cv_soc=CV_SOC, efficiency=EFFICIENCY):
+    """
+    Advance charging sessions along the CC/CV curve.
+
+    Parameters
+    ----------
+    soc : np.ndarray
+        SoC of each session, from 0 to 1.
+    capacity_wh : np.ndarray
+        Battery capacity of each session.
+    power_w : np.ndarray
+        Power of each session during the constant current phase.
+    seconds : float/np.ndarray
+        Seconds to advance each session.
+    cv_soc : float
+        SoC where the constant voltage phase starts.
+    efficiency : float
+        Fraction of the grid energy stored on the battery.
+
+    Returns
+    -------
+    tuple
+        The new SoC and the energy drawn from the grid (Wh) of each session.
+    """
+    rate = power_w * efficiency / (capacity_wh * 3600.0)  # SoC per second at full power
+    cc_seconds = np.clip((cv_soc - soc) / rate, 0.0, seconds)
+    new_soc = soc + rate * cc_seconds
+    new_soc = 1.0 - (1.0 - new_soc) * np.exp(-rate / (1.0 - cv_soc) * (seconds - cc_seconds))
+    return new_soc, (new_soc - soc) * capacity_wh / efficiency
+
+
+def draw_sessions(random, charger_power_w):
+    """
+    Draw the vehicles of new sessions.
+
+    Parameters
+    ----------
+    random : np.random.Generator
+        Random generator.
+    charger_power_w : np.ndarray
+        Maximum power of the charger of each session.
+
+    Returns
+    -------
+    tuple
+        Starting SoC, battery capacity (Wh) and charging power (W) of each session.
+    """
+    count = len(charger_power_w)
+    soc = random.uniform(*INITIAL_SOC, count)
+    capacity_wh = random.uniform(*VEHICLE_CAPACITY_WH, count)
+    power_w = np.minimum(charger_power_w, random.uniform(*VEHICLE_POWER_W, count))
+    return soc, capacity_wh, power_w
+
+
+class ChargingSessions:
+    """
+    Table of open charging sessions, one row each, advanced together by :meth:`advance`.
+
+    Rows of closed sessions are reused by the next ones.
+
+    Attributes
+    ----------
+    random : np.random.Generator
+        Generator of the vehicles.
+    soc, capacity_wh, power_w, meter_wh, updated_at : np.ndarray
+        SoC, battery capacity, charging power, energy register of the charger and clock seconds of the last update
+        of each row.
+    active : np.ndarray
+        Whether each row holds an open session.
+    """
+    _fields = {
+        "soc": np.float64,
+        "capacity_wh": np.float64,
+        "power_w": np.float64,
+        "meter_wh": np.float64,
+        "updated_at": np.float64,
+        "active": bool,
+    }
+
+    def __init__(self, capacity=64, seed=None):
+        self.random = np.random.default_rng(seed)
+        self._capacity = 0
+        self._rows = 0
+        self._free = []
+        self._grow(max(capacity, 1))
+
+    def __len__(self):
+        return self._rows - len(self._free)
+
+    def _grow(self, capacity):
+        for name, dtype in self._fields.items():
+            array = np.zeros(capacity, dtype=dtype)
+            if self._capacity:
+                array[:self._capacity] = getattr(self, name)
+            setattr(self, name, array)
+        self._capacity = capacity
+
+    def open(self, now, meter_wh, charger_power_w):
+        """
+        Plug a new vehicle.
+
+        Parameters
+        ----------
+        now : float
+            Clock seconds.
+        meter_wh : int
+            Energy register of the charger.
+        charger_power_w : float
+            Maximum power of the charger.
+
+        Returns
+        -------
+        int
+            Row of the session.
+        """
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self._rows == self._capacity:
+                self._grow(self._capacity * 2)
+            row = self._rows
+            self._rows += 1
+
+        soc, capacity_wh, power_w = draw_sessions(self.random, np.array([charger_power_w], dtype=np.float64))
+        self.soc[row] = soc[0]
+        self.capacity_wh[row] = capacity_wh[0]
+        self.power_w[row] = power_w[0]
+        self.meter_wh[row] = meter_wh
+        self.updated_at[row] = now
+        self.active[row] = True
+        return row
+
+    def advance(self, now, rows=None):
+        """
+        Advance the open sessions, or only ``rows``, to ``now``.
+
+        Parameters
+        ----------
+        now : float
+            Clock seconds.
+        rows : np.ndarray/None
+            Rows to advance, every open one if None.
+        """
+        if rows is None:
+            rows = np.flatnonzero(self.active[:self._rows])
+        if not len(rows):
+            return
+        seconds = np.maximum(now - self.updated_at[rows], 0.0)
+        soc, grid_wh = cc_cv_step(self.soc[rows], self.capacity_wh[rows], self.power_w[rows], seconds)
+        self.soc[rows] = soc
+        self.meter_wh[rows] += grid_wh
+        self.updated_at[rows] = now
+
+    def close(self, row, now):
+        """
+        Unplug the vehicle of ``row``, after advancing it to ``now``.
+
+        Returns
+        -------
+        int
+            Energy register of the charger at the end of the session.
+        """
+        self.advance(now, rows=np.array([row]))
+        self.active[row] = False
+        self._free.append(row)
+        return int(self.meter_wh[row])
+
+    def soc_percent(self, row):
+        return int(self.soc[row] * 100)
+
+    def energy_wh(self, row):
+        return int(self.meter_wh[row])
@@ -0,0 +1,412 @@
+"""
+Local stand-in of the Dojot REST API, to measure :class:`dojot.Dojot` without a real Dojot instance.
+
+It keeps templates, devices and a synthetic history in memory and answers the routes the client uses:
+
+* ``POST /auth``
+* ``GET/POST /template``, ``GET/DELETE /template/<id>``
+* ``GET/POST /device``, ``GET/PUT/DELETE /device/<id>``
+* ``GET /device/template/<id>``
+* ``GET /history/device/<id>/history``
+
+Every request waits ``latency`` seconds on its own server thread, as a round trip to a remote Dojot would, and is
+counted by route, so a benchmark can check how many round trips each client operation takes.
+
+>>> with FakeDojot(latency=0.002, history_size=1000) as server:
+>>>     server.populate(template_label="eletroposto_simulado", attrs=["authorize"], labels=["device_0"])
+>>>     dojot = Dojot(user="admin", password="admin", ip="127.0.0.1", http_port=server.port, mqtt_port=1883,
+>>>                   jwt_path=jwt_path)
+>>>     dojot.get_device("device_0")
+>>>     server.stats()["requests"]
+{'POST /auth': 1, 'GET /device': 1, 'GET /device/<id>': 1}
+"""
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+HISTORY_START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+"""datetime: Timestamp of the first synthetic history value of every attribute."""
+
+ROUTES = (
+    ("/auth", re.compile(r"^/auth$")),
+    ("/template", re.compile(r"^/template$")),
+    ("/template/<id>", re.compile(r"^/template/(?P<id>[^/]+)$")),
+    ("/device", re.compile(r"^/device$")),
+    ("/device/template/<id>", re.compile(r"^/device/template/(?P<id>[^/]+)$")),
+    ("/device/<id>", re.compile(r"^/device/(?P<id>[^/]+)$")),
+    ("/history/device/<id>/history", re.compile(r"^/history/device/(?P<id>[^/]+)/history$")),
+)
+
+
+def _timestamp(value):
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _parse_timestamp(text):
+    return datetime.strptime(text.rstrip("Z"), "%Y-%m-%dT%H:%M:%S.%f").replace(tzinfo=timezone.utc)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, as the client session expects
+    disable_nagle_algorithm = True  # Headers and body are separate writes; do not hold the body for an ACK
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        route, match = "<unknown>", None
+        for name, pattern in ROUTES:
+            match = pattern.match(url.path)
+            if match is not None:
+                route = name
+                break
+
+        dojot = self.server.dojot
+        dojot._count("{0} {1}".format(method, route))
+        if dojot.latency > 0:
+            time.sleep(dojot.latency)
+
+        if match is None:
+            status, response = 404, {"message": "not found"}
+        elif route != "/auth" and self.headers.get("Authorization") != "Bearer " + dojot.jwt:
+            status, response = 401, {"message": "invalid token"}
+        else:
+            handler = getattr(dojot, "_{0}_{1}".format(
+                method.lower(), route.strip("/").replace("/<id>", "_id").replace("/", "_")), None)
+            if handler is None:
+                status, response = 405, {"message": "method not allowed"}
+            else:
+                try:
+                    data = json.loads(body) if body else None
+                except ValueError:
+                    status, response = 400, {"message": "invalid JSON"}
+                else:
+                    status, response = handler(params=parse_qs(url.query), data=data, **match.groupdict())
+
+        payload = json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+class FakeDojot:
+    """
+    In-memory Dojot REST API served by a threaded HTTP server.
+
+    Attributes
+    ----------
+    host : str
+        Address the server listens on.
+    port : int
+        Port the server listens on. 0 picks a free one, available after :meth:`start`.
+    latency : float
+        Seconds each request waits before being answered.
+    history_size : int
+        Number of history values of each dynamic attribute of each device, one per second from
+        :data:`HISTORY_START`.
+    jwt : str
+        Token answered by ``/auth`` and required on every other route.
+    templates : dict
+        Templates by id.
+    devices : dict
+        Devices by id.
+    requests : dict
+        Number of requests by ``"<method> <route>"``.
+    """
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, history_size=100, jwt="fake-jwt"):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.history_size = history_size
+        self.jwt = jwt
+        self.templates = {}
+        self.devices = {}
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._template_ids = itertools.count(1)
+        self._device_ids = itertools.count(1)
+        self._server = None
+        self._thread = None
+
+    def _count(self, route):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def stats(self):
+        """
+        Get the number of requests by route and the dataset size.
+
+        Returns
+        -------
+        dict
+            ``{"requests": {"GET /device": 1}, "templates": 1, "devices": 160}``.
+        """
+        with self._lock:
+            return {"requests": dict(self.requests), "templates": len(self.templates), "devices": len(self.devices)}
+
+    def reset(self):
+        """
+        Zero the request counts, keeping templates and devices.
+        """
+        with self._lock:
+            self.requests = {}
+
+    def populate(self, template_label, attrs, labels, static_attrs=None):
+        """
+        Create a template, if there is none with ``template_label``, and a device for each label, without requests.
+
+        Parameters
+        ----------
+        template_label : str
+            Label of the template.
+        attrs : list
+            Labels of the dynamic attributes of the template.
+        labels : iterable
+            Labels of the devices to be created.
+        static_attrs : dict/None
+            Static attributes of the template as ``{"label": {"type": "string", "value": "value"}}``.
+
+        Returns
+        -------
+        int
+            Template id.
+        """
+        with self._lock:
+            template = self._find_template(template_label)
+            if template is None:
+                template_attrs = [{"label": attr, "type": "dynamic", "value_type": "float"} for attr in attrs]
+                for attr, attr_param in (static_attrs or {}).items():
+                    template_attrs.append({"label": attr, "type": "static", "value_type": attr_param["type"],
+                                           "static_value": attr_param["value"]})
+                template = self._add_template(template_label, template_attrs)
+            for label in labels:
+                self._add_device(label, template["id"])
+            return template["id"]
+
+    def _find_template(self, label):
+        for template in self.templates.values():
+            if template["label"] == label:
+                return template
+        return None
+
+    def _add_template(self, label, attrs):
+        template_id = next(self._template_ids)
+        created = _timestamp(datetime.now(timezone.utc))
+        template = {
+            "id": template_id,
+            "label": label,
+            "created": created,
+            "attrs": [
+                dict(attr, id=index, template_id=str(template_id), created=created)
+                for index, attr in enumerate(attrs, start=1)
+            ]
+        }
+        self.templates[template_id] = template
+        return template
+
+    def _add_device(self, label, template_id):
+        device_id = format(next(self._device_ids), "06x")
+        template = self.templates[template_id]
+        device = {
+            "id": device_id,
+            "label": label,
+            "created": _timestamp(datetime.now(timezone.utc)),
+            "templates": [template_id],
+            "attrs": {
+                str(template_id): [dict(attr, is_static_overridden=False) for attr in template["attrs"]]
+            },
+            "status": "disabled",
+            "tags": []
+        }
+        self.devices[device_id] = device
+        return device
+
+    @staticmethod
+    def _summary(device):
+        return {"id": device["id"], "label": device["label"]}
+
+    def _post_auth(self, params, data):
+        if not data or "username" not in data or "passwd" not in data:
+            return 401, {"message": "missing credentials"}
+        return 200, {"jwt": self.jwt}
+
+    def _get_template(self, params, data):
+        with self._lock:
+            templates = sorted(self.templates.values(), key=lambda template: template["label"])
+            return 200, {"templates": templates, "pagination": {"total": len(templates)}}
+
+    def _post_template(self, params, data):
+        with self._lock:
+            if self._find_template(data["label"]) is not None:
+                return 400, {"message": "template label already in use"}
+            return 200, {"result": "ok", "template": self._add_template(data["label"], data.get("attrs", []))}
+
+    def _get_template_id(self, params, data, id):
+        template = self.templates.get(int(id)) if id.isdigit() else None
+        if template is None:
+            return 404, {"message": "No such template: {0}".format(id)}
+        return 200, template
+
+    def _delete_template_id(self, params, data, id):
+        with self._lock:
+            template = self.templates.pop(int(id), None) if id.isdigit() else None
+        if template is None:
+            return 404, {"message": "No such template: {0}".format(id)}
+        return 200, {"result": "ok", "removed": template}
+
+    def _get_device(self, params, data):
+        with self._lock:
+            return 200, {"devices": list(self.devices.values()), "pagination": {"total": len(self.devices)}}
+
+    def _post_device(self, params, data):
+        with self._lock:
+            template_ids = [int(template_id) for template_id in data.get("templates", [])]
+            if not template_ids or any(template_id not in self.templates for template_id in template_ids):
+                return 400, {"message": "unknown template"}
+            device = self._add_device(data["label"], template_ids[0])
+            return 200, {"message": "devices created", "devices": [self._summary(device)]}
+
+    def _get_device_id(self, params, data, id):
+        device = self.devices.get(id)
+        if device is None:
+            return 404, {"message": "No such device: {0}".format(id)}
+        return 200, device
+
+    def _put_device_id(self, params, data, id):
+        with self._lock:
+            device = self.devices.get(id)
+            if device is None:
+                return 404, {"message": "No such device: {0}".format(id)}
+            for attr in data.get("attrs", []):
+                for current in device["attrs"][attr["template_id"]]:
+                    if current["id"] == attr["id"]:
+                        current["static_value"] = attr["static_value"]
+                        current["is_static_overridden"] = True
+            return 200, {"message": "device updated", "device": self._summary(device)}
+
+    def _delete_device_id(self, params, data, id):
+        with self._lock:
+            device = self.devices.pop(id, None)
+        if device is None:
+            return 404, {"message": "No such device: {0}".format(id)}
+        return 200, {"result": "ok", "removed_device": device}
+
+    def _get_device_template_id(self, params, data, id):
+        template_id = int(id) if id.isdigit() else None
+        with self._lock:
+            devices = [device for device in self.devices.values() if template_id in device["templates"]]
+        return 200, {"devices": devices, "pagination": {"total": len(devices)}}
+
+    def _get_history_device_id_history(self, params, data, id):
+        device = self.devices.get(id)
+        if device is None:
+            return 404, {"message": "No such device: {0}".format(id)}
+
+        first, last = 0, self.history_size
+        if "dateFrom" in params:
+            start = (_parse_timestamp(params["dateFrom"][0]) - HISTORY_START).total_seconds()
+            first = max(first, int(-(-start // 1)))  # First whole second at or after dateFrom
+        if "dateTo" in params:
+            end = (_parse_timestamp(params["dateTo"][0]) - HISTORY_START).total_seconds()
+            last = min(last, int(end // 1) + 1)
+        if "lastN" in params:
+            first = max(first, last - int(params["lastN"][0]))
+        if first >= last:
+            return 404, {"message": "No data for the given attribute could be found"}
+
+        attrs = params.get("attr", [])
+        history = {}
+        for attr in attrs:
+            history[attr] = [
+                {
+                    "device_id": id,
+                    "attr": attr,
+                    "value": round(220 + (second % 60) / 10, 1),
+                    "timestamp": _timestamp(HISTORY_START + timedelta(seconds=second))
+                }
+                for second in range(last - 1, first - 1, -1)  # Newest first, as Dojot answers
+            ]
+        if len(attrs) == 1:  # A single attribute is answered as a list of values
+            return 200, history[attrs[0]]
+        return 200, history
+
+    def start(self):
+        """
+        Start serving on a background thread.
+
+        Returns
+        -------
+        FakeDojot
+            This server, with ``port`` set.
+        """
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self._server.dojot = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-dojot", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in of the Dojot REST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds each request waits")
+    parser.add_argument("--history-size", type=int, default=100, help="history values of each attribute")
+    parser.add_argument("--devices", type=int, default=0, help="devices created at start")
+    parser.add_argument("--template", default="eletroposto_simulado", help="template of the devices created at start")
+    args = parser.parse_args()
+
+    server = FakeDojot(host=args.host, port=args.port, latency=args.latency, history_size=args.history_size)
+    if args.devices:
+        with open("templates.json", "r") as templates_file:
+            attrs = list(json.load(templates_file)[args.template]["dynamic"])
+        server.populate(template_label=args.template, attrs=attrs,
+                        labels=("{0}_{1}".format(args.template, index) for index in range(args.devices)))
+    server.start()
+    print("listening on {0}:{1}".format(server.host, server.port), flush=True)
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
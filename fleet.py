@@ -0,0 +1,348 @@
+"""
+Compact, array-backed charger state for large fleets.
+
+A :class:`ChargePoint` is a Python object with a ``__dict__`` and three coroutines per charging session. A
+:class:`Fleet` instead keeps the state of every charger in NumPy arrays (one element per charger) and drives all the
+sessions of a stage from a single task: each tick it finds, with vectorized comparisons, the chargers due to start,
+stop or sample a meter value, and only loops in Python over those. The chargers themselves are :class:`Charger`
+handles, two slots each, so the scenario runner and the connection manager can treat them as charge points.
+
+The messages, metrics and logs are the same as :class:`ChargePoint` with a :class:`scheduler.SamplingScheduler`:
+
+>>> fleet = Fleet(lambda device_id: AsyncClient("admin", device_id))
+>>> chargers = [fleet.add(label, device_id) for label, device_id in devices.items()]
+>>> stats = await fleet.run([cp.index for cp in chargers], start_offsets=0, charging_seconds=600, clock=VirtualClock())
+"""
+import logging
+
+import numpy as np
+
+from charge_point import ACTIONS, ACTIVE_SESSIONS, send_message, track_charge_point
+from clock import Clock
+from energy import CHARGER_POWER_W, INITIAL_METER_WH, cc_cv_step, draw_sessions
+from latency import probe_message_id
+from logs import log_meter_value
+from ocpp_messages import AUTHORIZE, START_TRANSACTION, METER_VALUES, STOP_TRANSACTION
+
+logger = logging.getLogger('charge_point')
+
+IDLE, AUTHORIZED, CHARGING, DONE = range(4)
+"""int: Session states of a charger on :attr:`Fleet.state`."""
+
+STATE_FIELDS = {
+    "state": (np.int8, IDLE),
+    "soc": (np.float64, 0.0),
+    "capacity_wh": (np.float64, 1.0),
+    "power_w": (np.float64, 0.0),
+    "charger_power_w": (np.float32, 0.0),
+    "meter_wh": (np.float64, 0.0),
+    "updated_at": (np.float64, 0.0),
+    "transaction_id": (np.int64, 0),
+    "start_at": (np.float64, 0.0),
+    "stop_at": (np.float64, 0.0),
+    "next_due": (np.float64, 0.0),
+    "sequence": (np.int64, 0),
+}
+"""dict: dtype and initial value of each per charger array of :class:`Fleet`."""
+
+_EPSILON = 1e-9  # Deadlines summed from float steps may land a hair after the tick meant to process them
+
+
+class Charger:
+    """
+    Handle of one charger of a :class:`Fleet`, exposing what the scenario runner and the connection manager use.
+    """
+    __slots__ = ("fleet", "index", "__weakref__")
+
+    def __init__(self, fleet, index):
+        self.fleet = fleet
+        self.index = index
+
+    @property
+    def id(self):
+        return self.fleet.ids[self.index]
+
+    @property
+    def mqtt_client(self):
+        return self.fleet.clients[self.index]
+
+    @property
+    def is_charging(self):
+        return self.fleet.state[self.index] == CHARGING
+
+
+class Fleet:
+    """
+    State of a fleet of chargers, stored column-wise, and the task running their sessions.
+
+    Attributes
+    ----------
+    make_client : callable
+        ``make_client(device_id)`` creates the :class:`mqtt.Client` of a charger.
+    ids : list
+        Label of each charger, used as its idTag and on the logs.
+    clients : list
+        :class:`mqtt.Client` of each charger.
+    state : np.ndarray
+        Session state of each charger: :data:`IDLE`, :data:`AUTHORIZED`, :data:`CHARGING` or :data:`DONE`.
+    soc, capacity_wh, power_w : np.ndarray
+        State of charge (0 to 1), battery capacity and charging power of the vehicle of each charger's session.
+    charger_power_w : np.ndarray
+        Maximum power of each charger.
+    meter_wh : np.ndarray
+        Energy register of each charger, in Wh.
+    updated_at : np.ndarray
+        Clock seconds up to which each session was advanced along the charging curve.
+    transaction_id : np.ndarray
+        Transaction of the current (or last) session of each charger.
+    start_at, stop_at, next_due : np.ndarray
+        Clock seconds at which each charger starts, stops and sends its next meter value.
+    sequence : np.ndarray
+        Next message sequence of each charger, for the latency probe ids.
+    sample_interval_seconds : float
+        Seconds between two meter values of a charger.
+    actions : tuple
+        Actions sent, the other ones are skipped.
+    latency_probe : bool
+        Stamp the message ids for :class:`latency.LatencyProbe`.
+    """
+    sample_interval_seconds = 1
+    actions = ACTIONS
+    latency_probe = False
+
+    def __init__(self, make_client, latency_probe=None, capacity=1024, seed=None):
+        self.make_client = make_client
+        if latency_probe is not None:
+            self.latency_probe = latency_probe
+        self.ids = []
+        self.clients = []
+        self._capacity = 0
+        self._grow(capacity)
+        self._random = np.random.default_rng(seed)
+        self._transactions = 0
+        self.ticks = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        """
+        int: Bytes allocated by the state arrays.
+        """
+        return sum(getattr(self, name).nbytes for name in STATE_FIELDS)
+
+    def _grow(self, capacity):
+        for name, (dtype, initial) in STATE_FIELDS.items():
+            array = np.full(capacity, initial, dtype=dtype)
+            if self._capacity:
+                array[:self._capacity] = getattr(self, name)
+            setattr(self, name, array)
+        self._capacity = capacity
+
+    def add(self, label, device_id):
+        """
+        Add a charger, with a new MQTT client.
+
+        Parameters
+        ----------
+        label : str
+            Label of the charger.
+        device_id : str
+            Dojot id of its device.
+
+        Returns
+        -------
+        Charger
+            Handle of the new charger.
+        """
+        if len(self.ids) == self._capacity:
+            self._grow(self._capacity * 2)
+        charger = Charger(self, len(self.ids))
+        self.charger_power_w[charger.index] = self._random.choice(CHARGER_POWER_W)
+        self.meter_wh[charger.index] = self._random.integers(*INITIAL_METER_WH)
+        self.ids.append(label)
+        self.clients.append(self.make_client(device_id))
+        track_charge_point(charger)
+        return charger
+
+    def _message_fields(self, index):
+        if not self.latency_probe:
+            return {}
+
+        message_id = probe_message_id(self.clients[index].device_id, int(self.sequence[index]))
+        self.sequence[index] += 1
+
+        return {'message_id': message_id}
+
+    def _ready(self, index, action):
+        # Session messages wait for room on the window, as ChargePoint.publish does, by staying due until next tick
+        return action not in self.actions or self.clients[index].has_room()
+
+    def _send(self, index, action, msg):
+        if action in self.actions:
+            send_message(self.clients[index], action, msg)
+
+    def _advance_sessions(self, charging, now):
+        soc, grid_wh = cc_cv_step(self.soc[charging], self.capacity_wh[charging], self.power_w[charging],
+                                  now - self.updated_at[charging])
+        self.soc[charging] = soc
+        self.meter_wh[charging] += grid_wh
+        self.updated_at[charging] = now
+
+    def _start_sessions(self, due, now, timestamp):
+        state = self.state
+        for index in due.tolist():
+            if state[index] == IDLE:
+                if not self._ready(index, 'authorize'):
+                    continue
+                charger_id = self.ids[index]
+                msg = AUTHORIZE.encode(**self._message_fields(index), id_tag=charger_id)
+                logger.info('%s:%s', charger_id, msg.decode())
+                self._send(index, 'authorize', msg)
+                state[index] = AUTHORIZED
+
+            if not self._ready(index, 'start_transaction'):
+                continue
+            self._transactions += 1
+            self.transaction_id[index] = self._transactions
+            soc, capacity_wh, power_w = draw_sessions(self._random, self.charger_power_w[index:index + 1])
+            self.soc[index] = soc[0]
+            self.capacity_wh[index] = capacity_wh[0]
+            self.power_w[index] = power_w[0]
+            self.updated_at[index] = now
+            charger_id = self.ids[index]
+            msg = START_TRANSACTION.encode(
+                **self._message_fields(index),
+                id_tag=charger_id,
+                meter_start=int(self.meter_wh[index]),
+                timestamp=timestamp
+            )
+            logger.info('%s:%s', charger_id, msg.decode())
+            self._send(index, 'start_transaction', msg)
+            state[index] = CHARGING
+            ACTIVE_SESSIONS.inc()
+
+    def _stop_sessions(self, due, timestamp):
+        for index in due.tolist():
+            if not self._ready(index, 'stop_transaction'):
+                continue
+            self.state[index] = DONE
+            ACTIVE_SESSIONS.dec()
+            msg = STOP_TRANSACTION.encode(
+                **self._message_fields(index),
+                transaction_id=int(self.transaction_id[index]),
+                meter_stop=int(self.meter_wh[index]),
+                timestamp=timestamp
+            )
+            self._send(index, 'stop_transaction', msg)
+            logger.info('%s:%s', self.ids[index], msg.decode())
+
+    def _sample_meter_values(self, due, interval):
+        self.next_due[due] += interval
+        soc = (self.soc[due] * 100).astype(np.int64).tolist()
+        energy_wh = self.meter_wh[due].astype(np.int64).tolist()
+        for index, soc_value, energy_value in zip(due.tolist(), soc, energy_wh):
+            msg = METER_VALUES.encode(**self._message_fields(index), soc=soc_value, energy_wh=energy_value)
+            self._send(index, 'meter_values', msg)
+            log_meter_value(self.ids[index], msg)
+
+    def _next_event(self, rows):
+        state = self.state[rows]
+        waiting = rows[state < CHARGING]
+        charging = rows[state == CHARGING]
+        times = []
+        if len(waiting):
+            times.append(self.start_at[waiting].min())
+        if len(charging):
+            times.append(min(self.next_due[charging].min(), self.stop_at[charging].min()))
+        return min(times) if times else None
+
+    def stats(self):
+        return {
+            "sampling_ticks": self.ticks,
+            "sampling_lag_seconds_total": self.total_lag,
+            "max_sampling_lag_seconds": self.max_lag
+        }
+
+    async def run(self, indices, start_offsets, charging_seconds, clock=None, sample_interval_seconds=None, phases=1,
+                  actions=None):
+        """
+        Run one charging session on each of the ``indices`` chargers, from a single task.
+
+        The work is done on a grid of ticks ``sample_interval_seconds / phases`` apart, skipping the ticks with
+        nothing due. Each charger is assigned a phase, so the meter values of chargers starting together are spread
+        along the interval.
+
+        Parameters
+        ----------
+        indices : array_like
+            :attr:`Charger.index` of each charger to run, e.g. the connected ones. The others are left alone.
+        start_offsets : float/array_like
+            Seconds from now to the start of each session.
+        charging_seconds : float/array_like
+            Length of each session.
+        clock : clock.Clock/None
+            Clock of the sessions, a wall :class:`clock.Clock` by default.
+        sample_interval_seconds : float/None
+            Overrides :attr:`sample_interval_seconds`.
+        phases : int
+            Slots each interval is split into.
+        actions : iterable/None
+            Overrides :attr:`actions`.
+
+        Returns
+        -------
+        dict
+            Sampling stats, with the same keys as :meth:`scheduler.SamplingScheduler.stats`.
+        """
+        clock = clock if clock is not None else Clock()
+        if sample_interval_seconds is not None:
+            self.sample_interval_seconds = sample_interval_seconds
+        if actions is not None:
+            self.actions = tuple(actions)
+        interval = self.sample_interval_seconds
+        slot_seconds = interval / phases
+        self.ticks = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+
+        rows = np.asarray(indices, dtype=np.int64).reshape(-1)
+        count = len(rows)
+        origin = clock.time()
+        self.state[rows] = IDLE
+        self.start_at[rows] = origin + np.broadcast_to(np.asarray(start_offsets, dtype=np.float64), (count,))
+        self.stop_at[rows] = self.start_at[rows] + np.asarray(charging_seconds, dtype=np.float64)
+        self.next_due[rows] = self.start_at[rows] + (np.arange(count) % phases) * slot_seconds
+
+        step = 0
+        while True:
+            next_event = self._next_event(rows)
+            if next_event is None:
+                break
+            step = max(step, int(np.ceil((next_event - origin) / slot_seconds - _EPSILON)))
+            deadline = origin + step * slot_seconds
+            await clock.sleep(max(0.0, deadline - clock.time()))  # Yield even when late
+
+            now = clock.time()
+            lag = max(0.0, now - deadline)
+            self.ticks += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+
+            limit = now + _EPSILON
+            state = self.state[rows]
+            timestamp = clock.now().isoformat()
+
+            self._advance_sessions(rows[state == CHARGING], now)  # One batch for every open session
+            self._start_sessions(rows[(state < CHARGING) & (self.start_at[rows] <= limit)], now, timestamp)
+            state = self.state[rows]
+            self._stop_sessions(rows[(state == CHARGING) & (self.stop_at[rows] <= limit)], timestamp)
+            state = self.state[rows]
+            self._sample_meter_values(rows[(state == CHARGING) & (self.next_due[rows] <= limit)], interval)
+
+            step += 1
+
+        return self.stats()
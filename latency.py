@@ -0,0 +1,293 @@
+"""
+End to end latency measurement of the messages published by the simulator.
+
+In probe mode each OCPP message id carries ``<device_id>:<sequence>:<send time in microseconds>`` (see
+:func:`probe_message_id`). A :class:`LatencyProbe` subscribes to the stream where the processed device data comes
+out (Dojot, or a local broker stand-in), matches each received message to its send time and records the latency on
+a :class:`LatencyHistogram`, counting the messages lost and duplicated on the way. Stamping is done by the senders,
+so the probe also measures scenarios sharded on several processes.
+
+The topic is an MQTT topic filter, whose ``+`` and ``#`` wildcards fill whole levels: ``+/attrs`` matches the data
+of every device, ``admin:+/attrs`` matches nothing.
+
+>>> probe = LatencyProbe(host, port, topic="+/attrs")
+>>> probe.start()
+>>> charge_point = ChargePoint(..., latency_probe=True)
+>>> probe.report(sent=charge_point.mqtt_client.messages_sent)  # After the scenario
+"""
+import json
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of latencies in the spirit of HdrHistogram.
+
+    Values are kept in microseconds. Below ``2 ** significant_bits`` each value has its own bucket, above it every
+    power of two is divided in ``2 ** (significant_bits - 1)`` buckets, so the relative error of any reported value is
+    below ``2 ** (1 - significant_bits)`` (under 1.6% with the default 7 bits) whatever the range.
+
+    Attributes
+    ----------
+    count : int
+        Number of recorded values.
+    min : int/None
+        Smallest recorded value in microseconds.
+    max : int/None
+        Largest recorded value in microseconds.
+    """
+    def __init__(self, significant_bits=7):
+        self.significant_bits = significant_bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        linear = 1 << self.significant_bits
+        if value < linear:
+            return value
+        exponent = value.bit_length() - self.significant_bits
+        half = linear >> 1
+        return linear + (exponent - 1) * half + ((value >> exponent) - half)
+
+    def _highest_value(self, index):
+        linear = 1 << self.significant_bits
+        if index < linear:
+            return index
+        half = linear >> 1
+        exponent = (index - linear) // half + 1
+        mantissa = (index - linear) % half + half
+        return ((mantissa + 1) << exponent) - 1
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1e6))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percentile):
+        """
+        Get the value below which ``percentile`` percent of the recorded values are.
+
+        Parameters
+        ----------
+        percentile : float
+            Percentile between 0 and 100.
+
+        Returns
+        -------
+        float/None
+            The value in seconds, or None if nothing was recorded.
+        """
+        if not self.count:
+            return None
+        target = max(1, -(-self.count * percentile // 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._highest_value(index), self.max) / 1e6
+        return self.max / 1e6
+
+    def summary(self):
+        """
+        Summarize the histogram in milliseconds.
+
+        Returns
+        -------
+        dict
+            Dict with ``count``, ``mean_ms``, ``p50_ms``, ``p95_ms``, ``p99_ms`` and ``max_ms``.
+        """
+        def milliseconds(seconds):
+            return None if seconds is None else round(seconds * 1e3, 3)
+
+        return {
+            "count": self.count,
+            "mean_ms": milliseconds(self.total / self.count / 1e6) if self.count else None,
+            "p50_ms": milliseconds(self.percentile(50)),
+            "p95_ms": milliseconds(self.percentile(95)),
+            "p99_ms": milliseconds(self.percentile(99)),
+            "max_ms": milliseconds(None if self.max is None else self.max / 1e6)
+        }
+
+
+def probe_message_id(device_id, sequence):
+    """
+    Create the message id of a probed message, stamped with the current wall time.
+
+    Parameters
+    ----------
+    device_id : str
+        Dojot id of the sending device.
+    sequence : int
+        Sequence number of the message on the device.
+
+    Returns
+    -------
+    str
+        Message id ``<device_id>:<sequence>:<send time in microseconds>``.
+    """
+    return "{0}:{1}:{2}".format(device_id, sequence, int(time.time() * 1e6))
+
+
+def check_topic_filter(topic):
+    """
+    Check that ``topic`` is a valid MQTT topic filter.
+
+    Raises
+    ------
+    ValueError
+        If a wildcard does not fill a whole level, or ``#`` is not the last level.
+    """
+    levels = topic.split("/")
+    for index, level in enumerate(levels):
+        if ("+" in level or "#" in level) and level not in ("+", "#"):
+            raise ValueError("wildcards must fill a whole level of the topic filter {0!r}, e.g. '+/attrs'".format(
+                topic))
+        if level == "#" and index != len(levels) - 1:
+            raise ValueError("'#' must be the last level of the topic filter {0!r}".format(topic))
+
+
+def find_message_id(payload):
+    """
+    Get the OCPP message id of a published payload, as ``{"<action>": [2, "<message id>", ...]}``.
+
+    Parameters
+    ----------
+    payload : dict
+        Decoded payload.
+
+    Returns
+    -------
+    str/None
+        The message id, or None if the payload is not an OCPP call.
+    """
+    for value in payload.values():
+        if isinstance(value, list) and len(value) > 1 and isinstance(value[1], str):
+            return value[1]
+    return None
+
+
+class LatencyProbe:
+    """
+    Receives the processed device data and measures how long the probed messages took to come out of the pipeline.
+
+    Attributes
+    ----------
+    histogram : LatencyHistogram
+        Latencies of the messages received once.
+    duplicated : int
+        Number of messages received more than once.
+    stale : int
+        Number of messages sent before the last :meth:`reset`, ignored so they do not count on the next stage.
+    """
+    def __init__(self, host, port, topic="+/attrs", username=None, password=None):
+        check_topic_filter(topic)
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.histogram = LatencyHistogram()
+        self.duplicated = 0
+        self.stale = 0
+        self._reset_at = 0.0  # Wall time of the last reset, sequences restart on every stage
+        self._received = {}  # device_id -> set of received sequence numbers
+        self._lock = threading.Lock()
+        self._last_received = time.monotonic()
+        self.client = mqtt.Client()
+        if username is not None:
+            self.client.username_pw_set(username, password)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+
+    def start(self):
+        self.client.connect(self.host, self.port)
+        self.client.loop_start()
+
+    def stop(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def _on_connect(self, client, userdata, flags, rc):
+        client.subscribe(self.topic, qos=1)
+
+    def _on_message(self, client, userdata, message):
+        received = time.time()
+        try:
+            message_id = find_message_id(json.loads(message.payload))
+            device_id, sequence, sent = message_id.rsplit(":", 2)
+            sequence = int(sequence)
+            sent = int(sent) / 1e6
+        except (ValueError, AttributeError, TypeError):
+            return  # Not a probed message
+
+        with self._lock:
+            self._last_received = time.monotonic()
+            if sent < self._reset_at:
+                self.stale += 1
+                return
+            sequences = self._received.setdefault(device_id, set())
+            if sequence in sequences:
+                self.duplicated += 1
+                return
+            sequences.add(sequence)
+            self.histogram.record(received - sent)
+
+    def drain(self, quiet_seconds=2, timeout=30):
+        """
+        Wait until nothing is received for ``quiet_seconds`` (or ``timeout`` elapses), so the messages still in the
+        pipeline are not counted as lost.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and time.monotonic() - self._last_received < quiet_seconds:
+            time.sleep(0.1)
+
+    def reset(self):
+        with self._lock:
+            self.histogram = LatencyHistogram()
+            self.duplicated = 0
+            self.stale = 0
+            self._received = {}
+            self._reset_at = time.time()
+
+    def report(self, sent):
+        """
+        Summarize the latencies and losses since the probe started or was reset.
+
+        Parameters
+        ----------
+        sent : int
+            Number of probed messages published meanwhile.
+
+        Returns
+        -------
+        dict
+            :meth:`LatencyHistogram.summary` plus the ``sent``, ``lost``, ``duplicated`` and ``stale`` counts.
+        """
+        with self._lock:
+            received = sum(len(sequences) for sequences in self._received.values())
+            report = self.histogram.summary()
+            report.update({
+                "sent": sent,
+                "lost": max(0, sent - received),
+                "duplicated": self.duplicated,
+                "stale": self.stale
+            })
+        return report
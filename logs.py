@@ -0,0 +1,271 @@
+"""
+Logging setup of the simulator.
+
+In ``queue`` mode the records are put, unformatted, on an in-memory queue, and a background thread formats and writes
+them in batches (one write and flush per batch and handler), so the event loop never waits on log I/O. The queue is
+bounded: when the writer falls behind, new records are dropped instead of growing the memory, and counted on the
+``simulator_dropped_log_records`` metric. Meter value logs can be sampled to 1 in N, and every record can also be
+written as JSON Lines.
+
+Meter values are logged through :func:`log_meter_value`, which samples them before any record is built and leaves
+the payload decoding to the formatter, so the skipped ones cost a counter increment.
+
+>>> configure_logging(mode="queue", sample_meter_values=10, json_path="simulation.jsonl")
+"""
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler
+
+from metrics import Gauge
+
+METER_VALUES_LOGGER = "charge_point.meter_values"
+
+
+class SampleFilter(logging.Filter):
+    """
+    Lets 1 in ``every`` records through.
+    """
+    def __init__(self, every):
+        super().__init__()
+        self.every = every
+        self.count = 0
+
+    def sample(self):
+        self.count += 1
+        return self.every == 1 or self.count % self.every == 1
+
+    def filter(self, record):
+        return self.sample()
+
+
+meter_values_sampler = SampleFilter(1)
+"""SampleFilter: Sampling of :func:`log_meter_value`, set by :func:`configure_logging`."""
+
+_meter_values_logger = logging.getLogger(METER_VALUES_LOGGER)
+
+DROPPED_LOG_RECORDS = Gauge('simulator_dropped_log_records', 'Log records dropped because the log queue was full')
+
+
+class Utf8Text:
+    """
+    Bytes shown as UTF-8 text, decoded only if a formatter asks for it.
+    """
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return self.data.decode()
+
+
+def log_meter_value(charger_id, msg):
+    """
+    Log a published meter value message, if it is among the sampled ones.
+
+    Parameters
+    ----------
+    charger_id : str
+        Label of the charger.
+    msg : bytes
+        Encoded message.
+    """
+    if _meter_values_logger.isEnabledFor(logging.INFO) and meter_values_sampler.sample():
+        _meter_values_logger.info('%s:%s', charger_id, Utf8Text(msg))
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object with its time, level, logger and message.
+    """
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that enqueues the record as is, leaving the message formatting to the listener thread.
+
+    The default QueueHandler formats the message in the logging thread so the record can be pickled; the listener
+    here runs in the same process, so the record does not need to be. When the queue is full the record is dropped
+    and counted on ``dropped``, the logging thread never blocks.
+    """
+    dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _BatchEmitter:
+    def emit_batch(self, records):
+        lines = [self.format(record) for record in records if record.levelno >= self.level and self.filter(record)]
+        if not lines:
+            return
+        self.acquire()
+        try:
+            self.stream.write(self.terminator.join(lines) + self.terminator)
+            self.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+
+class BatchStreamHandler(_BatchEmitter, logging.StreamHandler):
+    """
+    StreamHandler writing a whole batch of records at once.
+    """
+
+
+class BatchFileHandler(_BatchEmitter, logging.FileHandler):
+    """
+    FileHandler writing a whole batch of records at once.
+    """
+
+
+class BatchingListener:
+    """
+    Background thread taking the records from ``queue`` and handing them to the handlers in batches.
+
+    Attributes
+    ----------
+    queue : queue.Queue
+        Queue fed by a :class:`DeferredQueueHandler`.
+    handlers : list
+        Handlers with an ``emit_batch(records)`` method.
+    batch_size : int
+        Maximum number of records written at once.
+    """
+    _sentinel = None
+
+    def __init__(self, queue, handlers, batch_size=512):
+        self.queue = queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Write the records still on the queue and stop the thread.
+        """
+        if self._thread is None:
+            return
+        self.queue.put(self._sentinel)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if self._sentinel in batch:
+                stopping = True
+                batch = [record for record in batch if record is not self._sentinel]
+
+            if batch:
+                for handler in self.handlers:
+                    handler.emit_batch(batch)
+
+
+def configure_logging(mode="sync", level=logging.INFO, json_path=None, sample_meter_values=1, batch_size=512,
+                      max_queued=100000):
+    """
+    Configure the root logger of the simulator.
+
+    Parameters
+    ----------
+    mode : str
+        ``"sync"`` writes each record on stderr from the logging thread, as ``logging.basicConfig`` does; ``"queue"``
+        writes them in batches from a background thread, and turns off, for the whole process, the caller, thread
+        and process lookups of every record (``logging._srcfile``, ``logging.logThreads``...), which its formatters
+        do not print.
+    level : int
+        Level of the root logger.
+    json_path : str/None
+        If not None, also append every record as JSON Lines to this file.
+    sample_meter_values : int
+        Only log 1 in this many meter values.
+    batch_size : int
+        Maximum records written at once in ``"queue"`` mode.
+    max_queued : int
+        Records waiting to be written in ``"queue"`` mode above which new records are dropped.
+
+    Returns
+    -------
+    BatchingListener/None
+        The listener of ``"queue"`` mode, stopped (and flushed) at exit, or None. The records it dropped are exported
+        on :data:`DROPPED_LOG_RECORDS`.
+
+    Raises
+    ------
+    ValueError
+        If the mode is unknown.
+    """
+    meter_values_sampler.every = max(1, sample_meter_values)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+
+    if mode == "sync":
+        logging.basicConfig(level=level)
+        if json_path is not None:
+            json_handler = logging.FileHandler(json_path)
+            json_handler.setFormatter(JsonFormatter())
+            root.addHandler(json_handler)
+        return None
+    elif mode != "queue":
+        raise ValueError("unknown logging mode {0}".format(mode))
+
+    stream_handler = BatchStreamHandler(sys.stderr)
+    stream_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    handlers = [stream_handler]
+    if json_path is not None:
+        json_handler = BatchFileHandler(json_path)
+        json_handler.setFormatter(JsonFormatter())
+        handlers.append(json_handler)
+
+    # Skip gathering what neither formatter prints, as the logging docs suggest for speed: the caller's stack frame,
+    # thread and process
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    records = queue.Queue(maxsize=max_queued)
+    listener = BatchingListener(records, handlers, batch_size=batch_size)
+    queue_handler = DeferredQueueHandler(records)
+    root.addHandler(queue_handler)
+    DROPPED_LOG_RECORDS.set_function(lambda: queue_handler.dropped)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -1,16 +1,39 @@
 import asyncio
+import functools
 import os
 from datetime import datetime
 import json
 import logging
 
 from dojot import Dojot
+from energy import ChargingSessions
 from dotenv import load_dotenv
+from arrivals import LoadGenerator, parse_arrivals
 from charge_point import ChargePoint
+from clock import make_clock
+from connections import ConnectionManager
+from fleet import Fleet
+from latency import LatencyProbe
+from logs import configure_logging
+from metrics import SnapshotWriter, monitor_event_loop_lag, start_http_server
+from mqtt import TRANSPORTS, Client
+from scenarios import DEFAULT_SCENARIO, ScenarioRunner, expand_stages, load_scenario
+from scheduler import SamplingScheduler
+from sharding import run_sharded
+from traces import Replayer, TraceReader, TraceWriter, parse_speed
 
 load_dotenv()
 
-logging.basicConfig(level=logging.INFO)
+# 'queue' formats and writes the logs in batches from a background thread instead of the event loop
+LOG_MODE = os.getenv('LOG_MODE', 'sync')
+# Log only 1 in LOG_SAMPLE_METER_VALUES meter values
+LOG_SAMPLE_METER_VALUES = int(os.getenv('LOG_SAMPLE_METER_VALUES', '1'))
+# When set, also write every log record as JSON Lines to this file
+LOG_JSON_PATH = os.getenv('LOG_JSON_PATH')
+# Records waiting for the 'queue' mode writer above which new ones are dropped
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '100000'))
+
+configure_logging(mode=LOG_MODE, json_path=LOG_JSON_PATH, sample_meter_values=LOG_SAMPLE_METER_VALUES, max_queued=LOG_QUEUE_SIZE)
 
 DOJOT_HOST = os.getenv('DOJOT_HOST')
 MQTT_PORT = int(os.getenv('MQTT_PORT'))
@@ -19,31 +42,239 @@ HTTP_PORT = int(os.getenv('HTTP_PORT'))
 DOJOT_USERNAME = os.getenv('DOJOT_USERNAME')
 DOJOT_PASSWORD = os.getenv('DOJOT_PASSWORD')
 
-async def run_scenario(devices):
-    chargers = [ChargePoint(id=label, device=device_id, host=DOJOT_HOST, port=MQTT_PORT) for label, device_id in devices.items()]
+MQTT_TRANSPORT = os.getenv('MQTT_TRANSPORT', 'thread')
+MQTT_QOS = int(os.getenv('MQTT_QOS', '0'))
+
+# Connections started per second (unset does not limit), reached after CONNECT_RAMP_SECONDS, with at most
+# CONNECT_CONCURRENCY handshakes at once and CONNECT_RETRIES retries of each client
+CONNECT_RATE = os.getenv('CONNECT_RATE')
+CONNECT_RAMP_SECONDS = float(os.getenv('CONNECT_RAMP_SECONDS', '0'))
+CONNECT_CONCURRENCY = int(os.getenv('CONNECT_CONCURRENCY', '32'))
+CONNECT_RETRIES = int(os.getenv('CONNECT_RETRIES', '3'))
+
+# Scenario file (JSON or YAML, see scenarios.py), unset runs the 10, 20, 40, 80 and 160 chargers stages
+SCENARIO_FILE = os.getenv('SCENARIO_FILE')
+SCENARIO_RESULTS_PATH = os.getenv('SCENARIO_RESULTS_PATH', 'scenario_results.json')
+
+# Unset runs every stage in this process, keeping the chargers connected between stages. 'auto' runs each stage
+# on one worker per CPU, connecting its chargers again
+SCENARIO_WORKERS = os.getenv('SCENARIO_WORKERS')
+
+# 'compact' keeps the scenario chargers' state in the arrays of a fleet.Fleet, run by a single task, instead of one
+# ChargePoint object (and its coroutines) per charger
+CHARGER_MODEL = os.getenv('CHARGER_MODEL', 'classic')
+
+# Slots each sampling tick is split into, spreading the meter values along the interval
+SAMPLING_PHASES = int(os.getenv('SAMPLING_PHASES', '1'))
+
+# Unset follows the wall clock, a number speeds time up (e.g. 60) and 'virtual' runs as fast as possible
+SIMULATION_SPEED = os.getenv('SIMULATION_SPEED')
+make_clock(SIMULATION_SPEED) # Fails at startup, not after connecting the chargers, on an invalid speed
+
+# When set (e.g. 'poisson:0.5', 'fixed:1', 'ramp:0.1:2:600', 'trace:sessions.txt'), run an open loop load of
+# sessions for LOAD_SECONDS instead of the scenarios
+LOAD_ARRIVALS = os.getenv('LOAD_ARRIVALS')
+if LOAD_ARRIVALS:
+    parse_arrivals(LOAD_ARRIVALS) # Fails at startup on a rate of 0, negative or not a number
+LOAD_SECONDS = float(os.getenv('LOAD_SECONDS', '3600'))
+SESSION_SECONDS = float(os.getenv('SESSION_SECONDS', str(ChargePoint.charging_seconds)))
+
+# 'corpus' generates all the messages of each scenario stage first, then publishes them as fast as possible,
+# reporting the generation and publishing times apart; 'live' runs the charge points as usual
+STAGE_MODE = os.getenv('STAGE_MODE', 'live')
+
+# When set (e.g. '+/attrs', wildcards fill whole levels), stamp every message and measure its latency until it comes
+# out on this topic
+LATENCY_TOPIC = os.getenv('LATENCY_TOPIC')
+LATENCY_HOST = os.getenv('LATENCY_HOST', DOJOT_HOST)
+LATENCY_PORT = int(os.getenv('LATENCY_PORT', str(MQTT_PORT)))
+LATENCY_DRAIN_SECONDS = float(os.getenv('LATENCY_DRAIN_SECONDS', '30'))
+
+# When set, record every message published by this process (not the SCENARIO_WORKERS ones) to this binary trace,
+# gzip or zstd compressed if it ends with .gz or .zst
+TRACE_RECORD_PATH = os.getenv('TRACE_RECORD_PATH')
+# When set, republish this trace instead of simulating, at TRACE_REPLAY_SPEED times the original speed, or 'max'
+TRACE_REPLAY_PATH = os.getenv('TRACE_REPLAY_PATH')
+TRACE_REPLAY_SPEED = os.getenv('TRACE_REPLAY_SPEED', '1')
+
+# When set, serve the simulator metrics on http://<host>:METRICS_PORT/metrics
+METRICS_PORT = os.getenv('METRICS_PORT')
+# When set, append a snapshot of the metrics to this JSON Lines file every METRICS_SNAPSHOT_SECONDS
+METRICS_SNAPSHOT_PATH = os.getenv('METRICS_SNAPSHOT_PATH')
+METRICS_SNAPSHOT_SECONDS = float(os.getenv('METRICS_SNAPSHOT_SECONDS', '10'))
+
+def make_connection_manager():
+    return ConnectionManager(
+        DOJOT_HOST,
+        MQTT_PORT,
+        rate=float(CONNECT_RATE) if CONNECT_RATE else None,
+        ramp_seconds=CONNECT_RAMP_SECONDS,
+        concurrency=CONNECT_CONCURRENCY,
+        retries=CONNECT_RETRIES
+    )
+
+async def connect_chargers(chargers):
+    manager = make_connection_manager()
+    try:
+        report = await manager.connect_all([cp.mqtt_client for cp in chargers])
+    finally:
+        manager.close()
+
+    if report['connect_failures']:
+        logging.warning(f"{report['connect_failures']} of {len(chargers)} chargers could not connect")
+
+    return [cp for cp in chargers if cp.mqtt_client.connected], report
+
+def make_charger(label, device_id):
+    return ChargePoint(id=label, device=device_id, host=DOJOT_HOST, port=MQTT_PORT, transport=MQTT_TRANSPORT, latency_probe=bool(LATENCY_TOPIC), qos=MQTT_QOS)
+
+def make_fleet():
+    return Fleet(lambda device_id: TRANSPORTS[MQTT_TRANSPORT]('admin', device_id, qos=MQTT_QOS), latency_probe=bool(LATENCY_TOPIC))
+
+def make_scenario_runner(devices):
+    fleet = make_fleet() if CHARGER_MODEL == 'compact' else None
+
+    return ScenarioRunner(devices, make_charger if fleet is None else fleet.add, connect_chargers, lambda: make_clock(SIMULATION_SPEED), phases=SAMPLING_PHASES, fleet=fleet)
+
+async def run_stage(runner, stage):
+    if STAGE_MODE == 'corpus':
+        return await runner.run_corpus_stage(stage)
+
+    return await runner.run_stage(stage)
+
+async def run_scenario(devices, stage=None):
+    if stage is None:
+        stage = expand_stages({"stages": [{"chargers": len(devices)}]})[0]
+
+    runner = make_scenario_runner(devices)
+    try:
+        return await run_stage(runner, stage)
+    finally:
+        runner.close()
 
-    tasks = [cp.run() for cp in chargers]
+async def run_load(devices):
+    clock = make_clock(SIMULATION_SPEED)
 
-    await asyncio.gather(*tasks)
+    sessions = ChargingSessions(capacity=len(devices))
+
+    scheduler = SamplingScheduler(interval=ChargePoint.sample_interval_seconds, phases=SAMPLING_PHASES, clock=clock, on_tick=sessions.advance)
+
+    chargers = [ChargePoint(id=label, device=device_id, host=DOJOT_HOST, port=MQTT_PORT, transport=MQTT_TRANSPORT, scheduler=scheduler, clock=clock, qos=MQTT_QOS, sessions=sessions) for label, device_id in devices.items()]
+
+    chargers, connect_report = await connect_chargers(chargers)
+    logging.info(f'connected {len(chargers)} chargers: {connect_report}')
+
+    generator = LoadGenerator(chargers, parse_arrivals(LOAD_ARRIVALS), session_seconds=SESSION_SECONDS, duration=LOAD_SECONDS, clock=clock)
+
+    try:
+        report = await generator.run()
+    finally:
+        for cp in chargers:
+            cp.mqtt_client.disconnect()
+
+    logging.info(f'load with {len(chargers)} chargers: {report}')
+
+    return report
+
+async def run_scenario_sharded(devices, stage=None):
+    workers = None if SCENARIO_WORKERS == 'auto' else int(SCENARIO_WORKERS)
+
+    return await asyncio.to_thread(run_sharded, functools.partial(run_scenario, stage=stage), devices, workers)
+
+async def run_replay(path):
+    with TraceReader(path) as reader:
+        trace = reader.scan()
+        logging.info(f"replaying {trace['messages']} messages of {len(trace['devices'])} devices along {trace['seconds']:.1f} s")
+
+        clients = {device_id: TRANSPORTS[MQTT_TRANSPORT]('admin', device_id, qos=MQTT_QOS) for device_id in trace['devices']}
+        manager = make_connection_manager()
+        try:
+            connect_report = await manager.connect_all(list(clients.values()))
+        finally:
+            manager.close()
+        connected = {device_id: client for device_id, client in clients.items() if client.connected}
+        logging.info(f'connected {len(connected)} of {len(clients)} devices: {connect_report}')
+
+        try:
+            report = await Replayer(reader, connected, speed=parse_speed(TRACE_REPLAY_SPEED)).run()
+        finally:
+            for client in connected.values():
+                client.disconnect()
+
+    logging.info(f'replay: {report}')
+
+    return report
 
 async def run_scenarios(devices):
-    scenarios = [10,20,40,80,160]
+    scenario = load_scenario(SCENARIO_FILE) if SCENARIO_FILE else DEFAULT_SCENARIO
+    stages = expand_stages(scenario, available=len(devices))
     checkpoints = {
-        "start": datetime.utcnow.isoformat()
+        "start": datetime.utcnow().isoformat()
     }
+    results = []
+    latencies = {}
+
+    probe = None
+    if LATENCY_TOPIC:
+        probe = LatencyProbe(LATENCY_HOST, LATENCY_PORT, topic=LATENCY_TOPIC)
+        probe.start()
+
+    runner = None if SCENARIO_WORKERS else make_scenario_runner(devices)
+
+    try:
+        for stage in stages:
+            if runner is None:
+                splitted_devices = dict(list(devices.items())[:stage['chargers']])
+                counters = {"stage": stage['name'], **await run_scenario_sharded(splitted_devices, stage)}
+            else:
+                counters = await run_stage(runner, stage)
+            logging.info(f"stage {stage['name']}: {counters}")
+
+            if probe is not None:
+                await asyncio.to_thread(probe.drain, timeout=LATENCY_DRAIN_SECONDS)
+                latencies[stage['name']] = probe.report(sent=counters['messages_sent'])
+                probe.reset()
+                logging.info(f"latency of stage {stage['name']}: {latencies[stage['name']]}")
 
-    for num_chargers in scenarios:
-        splitted_devices = dict(list(devices.items())[:num_chargers])
-        await run_scenario(splitted_devices)
+            results.append(counters)
+    finally:
+        if runner is not None:
+            runner.close()
 
-    checkpoints["end"] = datetime.utcnow.isoformat()
+    checkpoints["end"] = datetime.utcnow().isoformat()
 
     with open('simulation_checkpoints.json', 'w') as json_file:
         json.dump(checkpoints, json_file)
 
+    with open(SCENARIO_RESULTS_PATH, 'w') as json_file:
+        json.dump(results, json_file, indent=2)
+
+    if probe is not None:
+        probe.stop()
+        with open('latency_report.json', 'w') as json_file:
+            json.dump(latencies, json_file, indent=2)
+
 
 
 async def main():
+    snapshots = None
+    if METRICS_PORT or METRICS_SNAPSHOT_PATH:
+        asyncio.get_running_loop().create_task(monitor_event_loop_lag())
+    if METRICS_PORT:
+        start_http_server(int(METRICS_PORT))
+    if METRICS_SNAPSHOT_PATH:
+        snapshots = SnapshotWriter(METRICS_SNAPSHOT_PATH, interval=METRICS_SNAPSHOT_SECONDS)
+        snapshots.start()
+
+    if TRACE_REPLAY_PATH:
+        await run_replay(TRACE_REPLAY_PATH)
+        if snapshots is not None:
+            snapshots.stop()
+        return
+
+    if TRACE_RECORD_PATH:
+        Client.recorder = TraceWriter(TRACE_RECORD_PATH)
+
     dojot = Dojot(
         ip=DOJOT_HOST,
         http_port=HTTP_PORT,
@@ -52,9 +283,20 @@ async def main():
         password=DOJOT_PASSWORD
     )
 
-    devices = dojot.get_all_devices_id(template_id=5)
+    try:
+        devices = dojot.get_all_devices_id(template_id=5)
+
+        if LOAD_ARRIVALS:
+            await run_load(devices)
+        else:
+            await run_scenarios(devices)
+    finally:
+        if Client.recorder is not None:
+            Client.recorder.close()
+        dojot.close() # Waits for the acks of the messages sent through dojot.publishers
 
-    await run_scenarios(devices)
+    if snapshots is not None:
+        snapshots.stop()
 
 
 
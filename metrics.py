@@ -0,0 +1,357 @@
+"""
+Metrics of the simulator, exported in the OpenMetrics text format.
+
+Counters, gauges and histograms only do plain attribute increments on the hot path: no lock is taken, they rely on
+the GIL and on being written mostly from the event loop thread. Values that are cheaper to read than to maintain
+(e.g. how many clients are connected) are gauges backed by a function, evaluated only when the metrics are read.
+
+>>> MESSAGES = Counter("simulator_messages_published", "Messages published", ["action"])
+>>> MESSAGES.labels("authorize").inc()
+>>> start_http_server(9100)  # Serves REGISTRY.render() on /metrics
+>>> SnapshotWriter("metrics.jsonl", interval=10).start()
+"""
+import asyncio
+import bisect
+import json
+import math
+import threading
+
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+class Registry:
+    """
+    Collection of metrics rendered together.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError("metric {0} is already registered".format(metric.name))
+            self._metrics[metric.name] = metric
+
+    def unregister(self, metric):
+        with self._lock:
+            self._metrics.pop(metric.name, None)
+
+    def collect(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self):
+        """
+        Render every metric in the OpenMetrics text format.
+
+        Returns
+        -------
+        str
+            The exposition, ended by ``# EOF``.
+        """
+        lines = []
+        for metric in self.collect():
+            lines.append("# TYPE {0} {1}".format(metric.name, metric.type))
+            lines.append("# HELP {0} {1}".format(metric.name, _escape(metric.documentation, label=False)))
+            for name, labels, value in metric.samples():
+                lines.append("{0}{1} {2}".format(name, _format_labels(labels), _format_value(value)))
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """
+        Get the current value of every sample.
+
+        Returns
+        -------
+        dict
+            Values by sample, keyed as ``name{label="value"}``.
+        """
+        return {
+            name + _format_labels(labels): value
+            for metric in self.collect()
+            for name, labels, value in metric.samples()
+        }
+
+
+REGISTRY = Registry()
+
+
+def _escape(text, label=True):
+    text = text.replace("\\", "\\\\").replace("\n", "\\n")
+    return text.replace('"', '\\"') if label else text
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{0}="{1}"'.format(key, _escape(str(value))) for key, value in labels) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+class _CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class _GaugeValue:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set_function(self, function):
+        self.function = function
+
+    def get(self):
+        return self.function() if self.function is not None else self.value
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "buckets", "sum", "count")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.buckets = [0] * (len(upper_bounds) + 1)  # The last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_value()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """
+        Get the child of a set of label values, to be kept by the caller so the hot path skips the lookup.
+
+        Parameters
+        ----------
+        *values
+            Value of each label, in the order of ``labelnames``.
+        """
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError("{0} expects the labels {1}".format(self.name, self.labelnames))
+            child = self._children.setdefault(values, self._new_value())
+        return child
+
+    def _labelled_children(self):
+        for values, child in list(self._children.items()):
+            yield tuple(zip(self.labelnames, values)), child
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """
+    Monotonic count, exposed as ``<name>_total``.
+    """
+    type = "counter"
+
+    def _new_value(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+    def samples(self):
+        for labels, child in self._labelled_children():
+            yield self.name + "_total", labels, child.value
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down, or is computed by a function when read.
+    """
+    type = "gauge"
+
+    def _new_value(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self._children[()].set(value)
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+    def dec(self, amount=1):
+        self._children[()].dec(amount)
+
+    def set_function(self, function):
+        self._children[()].set_function(function)
+
+    def samples(self):
+        for labels, child in self._labelled_children():
+            yield self.name, labels, child.get()
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observations on fixed buckets.
+    """
+    type = "histogram"
+    default_buckets = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=None, registry=None):
+        self.upper_bounds = tuple(sorted(buckets if buckets is not None else self.default_buckets))
+        super().__init__(name, documentation, labelnames=labelnames, registry=registry)
+
+    def _new_value(self):
+        return _HistogramValue(self.upper_bounds)
+
+    def observe(self, value):
+        self._children[()].observe(value)
+
+    def samples(self):
+        for labels, child in self._labelled_children():
+            cumulative = 0
+            buckets = list(child.buckets)
+            for upper_bound, count in zip(self.upper_bounds + (math.inf,), buckets):
+                cumulative += count
+                yield self.name + "_bucket", labels + (("le", _format_value(float(upper_bound))),), cumulative
+            yield self.name + "_count", labels, cumulative
+            yield self.name + "_sum", labels, child.sum
+
+
+EVENT_LOOP_LAG = Histogram(
+    "simulator_event_loop_lag_seconds",
+    "Delay of the event loop in waking up a task past its deadline",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+
+async def monitor_event_loop_lag(interval=0.5, histogram=EVENT_LOOP_LAG):
+    """
+    Observe, every ``interval`` seconds, how late the running event loop wakes up a sleeping task.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        histogram.observe(max(0.0, loop.time() - start - interval))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep the scrapes out of the simulator log
+
+
+def start_http_server(port, addr="", registry=None):
+    """
+    Serve the metrics on ``http://<addr>:<port>/metrics`` from a daemon thread.
+
+    Parameters
+    ----------
+    port : int
+        Port to listen on, 0 for any free port.
+    addr : str
+        Address to bind.
+    registry : Registry/None
+        Metrics served, the default :data:`REGISTRY` if None.
+
+    Returns
+    -------
+    ThreadingHTTPServer
+        The running server, stopped with ``shutdown()``.
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry if registry is not None else REGISTRY})
+    server = ThreadingHTTPServer((addr, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+class SnapshotWriter:
+    """
+    Appends a JSON line with the timestamp and :meth:`Registry.snapshot` to ``path`` every ``interval`` seconds.
+    """
+    def __init__(self, path, interval=10, registry=None):
+        self.path = path
+        self.interval = interval
+        self.registry = registry if registry is not None else REGISTRY
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def write(self):
+        line = json.dumps({
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "metrics": self.registry.snapshot()
+        })
+        with open(self.path, "a") as snapshot_file:
+            snapshot_file.write(line + "\n")
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the periodic dumps and write a last snapshot.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.write()
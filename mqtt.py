@@ -1,16 +1,413 @@
+import asyncio
+import threading
+import time
+import weakref
+
+from collections import OrderedDict, deque
+
 import paho.mqtt.client as mqtt
 
 class Client:
-  def __init__(self, tenant, device_id):
+  """
+  MQTT client of one device, publishing on its attrs topic.
+
+  At most max_inflight + max_queued messages are outstanding (handed to
+  paho and not yet acknowledged, or written to the socket for QoS 0):
+  publish() waits for room and send() drops the message when the window
+  is full, so a slow broker never grows paho's queues without bound.
+  Counters are only written from one thread each, so they need no lock.
+
+  A disconnect wakes the waiters. Unless paho is going to reconnect and
+  resend them (QoS 1 on the network thread), the outstanding messages are
+  counted as lost, so the window opens again instead of staying full.
+  """
+  recorder = None # e.g. traces.TraceWriter, records every message sent by any client
+  reconnects = True # paho's network thread reconnects after a lost connection
+
+  def __init__(self, tenant, device_id, qos=0, max_inflight=20, max_queued=100):
     self.tenant = tenant
     self.device_id = device_id
+    self.topic = f'{tenant}:{device_id}/attrs'
+    self.qos = qos
+    self.max_inflight = max_inflight
+    self.max_queued = max_queued
+    self.messages_sent = 0
+    self.bytes_sent = 0
+    self.acked = 0
+    self.dropped = 0
+    self.lost = 0 # QoS 0 messages still outstanding when the connection dropped
+    self.connected = False
+    self.closed = False # disconnect() was called
+    self.connack = None
+    self.connack_received = threading.Event()
+    self._waiters = deque()
     self.client = mqtt.Client(f'{tenant}:{device_id}')
     self.client.username_pw_set(f'{self.tenant}:{self.device_id}', None)
+    self.client.max_inflight_messages_set(max_inflight)
+    self.client.max_queued_messages_set(max_inflight + max_queued) # paho counts the in-flight ones too
+    self.client.on_connect = self._on_connect
+    self.client.on_disconnect = self._on_disconnect
+    self.client.on_publish = self._on_publish
+
+  @property
+  def outstanding(self):
+    return self.messages_sent - self.acked - self.lost
+
+  @property
+  def inflight(self):
+    return min(self.outstanding, self.max_inflight)
+
+  @property
+  def queued(self):
+    return self.outstanding - self.inflight
+
+  def has_room(self):
+    return self.outstanding < self.max_inflight + self.max_queued
+
+  def _on_connect(self, client, userdata, flags, rc):
+    self.connack = rc
+    self.connected = rc == mqtt.CONNACK_ACCEPTED
+    self.connack_received.set()
+
+  def _on_disconnect(self, client, userdata, rc):
+    self.connected = False
+    if self.qos == 0 or self.closed or not self.reconnects:
+      self.lost += max(0, self.outstanding)
+    self._wake_waiters()
+
+  def _on_publish(self, client, userdata, mid):
+    self.acked += 1
+    self._wake_waiters()
+
+  def _wake_waiters(self):
+    # Every waiter re-checks the window, so a cancelled one cannot swallow
+    # the wake up of the others
+    while self._waiters:
+      loop, future = self._waiters.popleft()
+      loop.call_soon_threadsafe(_wake, future)
+
+  def _reset(self):
+    # A client connected again after disconnect() (a retry) is live again,
+    # and must not see the CONNACK of the previous attempt
+    self.closed = False
+    self.connack = None
+    self.connack_received.clear()
+
+  def connect(self, host, port):
+    self._reset()
+    self.client.connect(host, port)
+    self.client.loop_start()
+
+  def disconnect(self):
+    self.closed = True
+    self.client.disconnect()
+    self.client.loop_stop()
+
+  @property
+  def gone(self):
+    # Disconnected for good: nothing will ever free the window again
+    return not self.connected and self.connack is not None and (self.closed or not self.reconnects)
+
+  async def wait_for_room(self, timeout=None):
+    """
+    Wait until the window has room. Returns False instead if the client is
+    gone or the timeout (seconds) elapses first.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    while not self.has_room():
+      if self.gone:
+        return False
+      future = loop.create_future()
+      self._waiters.append((loop, future))
+      if self.has_room() or self.gone: # acked or disconnected between the check and the append
+        continue
+      remaining = None if deadline is None else deadline - loop.time()
+      if remaining is not None and remaining <= 0:
+        return False
+      done, _ = await asyncio.wait((future,), timeout=remaining)
+      if not done:
+        return False
+    return True
+
+  def send(self, message, qos=None):
+    """
+    Publish without waiting. Returns False and counts the message as
+    dropped if the window is full or paho refuses it.
+    """
+    if not self.has_room():
+      self.dropped += 1
+      return False
+    qos = self.qos if qos is None else qos
+    info = self.client.publish(self.topic, message, qos=qos)
+    if info.rc == mqtt.MQTT_ERR_QUEUE_SIZE or (info.rc != mqtt.MQTT_ERR_SUCCESS and qos == 0):
+      self.dropped += 1
+      return False
+    self.messages_sent += 1
+    self.bytes_sent += len(message)
+    if self.recorder is not None:
+      self.recorder.record(self.device_id, self.topic, message)
+    return True
+
+  async def publish(self, message, qos=None, timeout=None):
+    """
+    Publish once the window has room, so a slow broker slows the caller.
+    Drops the message if the client is gone or the timeout elapses.
+    """
+    await self.wait_for_room(timeout=timeout)
+    return self.send(message, qos=qos)
+
+
+def _wake(future):
+  if not future.done():
+    future.set_result(None)
+
+
+class _LoopDriver:
+  # Runs the paho housekeeping (keepalive pings, retries) for every
+  # AsyncClient bound to one event loop from a single task.
+  misc_interval_seconds = 1
+
+  def __init__(self, loop):
+    self.loop = loop
+    self.clients = set()
+    self.task = None
+
+  def register(self, client):
+    self.clients.add(client)
+    if self.task is None:
+      self.task = self.loop.create_task(self._misc_loop())
+
+  def unregister(self, client):
+    self.clients.discard(client)
+
+  async def _misc_loop(self):
+    while self.clients:
+      await asyncio.sleep(self.misc_interval_seconds)
+      for client in list(self.clients):
+        client.loop_misc()
+    self.task = None
+
+
+_drivers = weakref.WeakKeyDictionary()
+
+def get_loop_driver(loop):
+  driver = _drivers.get(loop)
+  if driver is None:
+    driver = _drivers[loop] = _LoopDriver(loop)
+  return driver
+
+
+class AsyncClient(Client):
+  """
+  Client whose socket is driven by the asyncio event loop instead of a paho
+  network thread, so every AsyncClient on a loop shares that loop. It does
+  not reconnect.
+  """
+  reconnects = False
+  def __init__(self, tenant, device_id, loop=None, **kwargs):
+    super().__init__(tenant, device_id, **kwargs)
+    if loop is None:
+      try:
+        loop = asyncio.get_running_loop()
+      except RuntimeError:
+        loop = None
+    self.loop = loop
+    self.client.on_socket_open = self._on_socket_open
+    self.client.on_socket_close = self._on_socket_close
+    self.client.on_socket_register_write = self._on_socket_register_write
+    self.client.on_socket_unregister_write = self._on_socket_unregister_write
 
   def connect(self, host, port):
+    if self.loop is None:
+      self.loop = asyncio.get_running_loop()
+    self._reset()
     self.client.connect(host, port)
+
+  def disconnect(self):
+    self.closed = True
+    self.client.disconnect()
+
+  def _in_loop(self, callback, *args):
+    # paho fires the socket callbacks from whatever thread called connect,
+    # but the selector may only be touched from the loop thread.
+    try:
+      running = asyncio.get_running_loop()
+    except RuntimeError:
+      running = None
+    if running is self.loop:
+      callback(*args)
+    elif self.loop.is_closed():
+      return # paho closing the socket after the loop is gone, nothing to unwatch
+    else:
+      self.loop.call_soon_threadsafe(callback, *args)
+
+  def _on_socket_open(self, client, userdata, sock):
+    self._in_loop(self._watch_socket, sock)
+
+  def _on_socket_close(self, client, userdata, sock):
+    self._in_loop(self._unwatch_socket, sock)
+
+  def _on_socket_register_write(self, client, userdata, sock):
+    self._in_loop(self.loop.add_writer, sock, self.client.loop_write)
+
+  def _on_socket_unregister_write(self, client, userdata, sock):
+    self._in_loop(self.loop.remove_writer, sock)
+
+  def _watch_socket(self, sock):
+    self.loop.add_reader(sock, self.client.loop_read)
+    get_loop_driver(self.loop).register(self.client)
+
+  def _unwatch_socket(self, sock):
+    self.loop.remove_reader(sock)
+    self.loop.remove_writer(sock)
+    get_loop_driver(self.loop).unregister(self.client)
+
+
+TRANSPORTS = {
+  'thread': Client,
+  'asyncio': AsyncClient,
+}
+
+
+class _PooledConnection:
+  def __init__(self, tenant, device_id, max_inflight, keepalive):
+    self.last_used = time.monotonic()
+    self.topic = f'{tenant}:{device_id}/attrs'
+    self.window = threading.BoundedSemaphore(max_inflight)
+    self.max_inflight = max_inflight
+    self.keepalive = keepalive
+    self.connected = threading.Event()
+    self.connack = None
+    self.client = mqtt.Client(f'{tenant}:{device_id}')
+    self.client.username_pw_set(f'{tenant}:{device_id}', device_id)
+    self.client.max_inflight_messages_set(max_inflight)
+    self.client.on_connect = self._on_connect
+    self.client.on_publish = self._on_publish
+
+  def _on_connect(self, client, userdata, flags, rc):
+    self.connack = rc
+    self.connected.set()
+
+  def _on_publish(self, client, userdata, mid):
+    self.window.release()
+
+  def connect(self, host, port, timeout):
+    self.client.connect(host, port, keepalive=self.keepalive)
     self.client.loop_start()
+    if not self.connected.wait(timeout):
+      self.close()
+      raise TimeoutError(f'no CONNACK from {host}:{port} after {timeout} seconds')
+    if self.connack != mqtt.CONNACK_ACCEPTED:
+      self.close()
+      raise ConnectionRefusedError(mqtt.connack_string(self.connack))
+
+  def publish(self, payload, qos):
+    self.last_used = time.monotonic()
+    self.window.acquire()
+    info = self.client.publish(self.topic, payload, qos=qos)
+    # paho keeps a QoS > 0 message published while disconnected and resends
+    # it on reconnect, so its slot is only freed by the ack
+    if info.rc == mqtt.MQTT_ERR_QUEUE_SIZE or (info.rc != mqtt.MQTT_ERR_SUCCESS and qos == 0):
+      self.window.release()
+      raise ConnectionError(mqtt.error_string(info.rc))
+    return info
+
+  def drain(self, timeout=None):
+    # Holding every slot of the window means nothing is waiting for an ack
+    deadline = None if timeout is None else time.monotonic() + timeout
+    acquired = 0
+    try:
+      for _ in range(self.max_inflight):
+        remaining = None if deadline is None else max(0, deadline - time.monotonic())
+        if not self.window.acquire(timeout=remaining):
+          return False
+        acquired += 1
+      return True
+    finally:
+      for _ in range(acquired):
+        self.window.release()
+
+  def close(self):
+    self.client.disconnect()
+    self.client.loop_stop()
+
+
+class PublisherPool:
+  """
+  Keeps one authenticated connection per device open between publishes, so
+  repeated sends to a device skip the TCP and MQTT CONNECT handshakes.
+
+  At most ``max_connections`` are kept, the least recently used one being
+  closed first, and connections unused for ``idle_seconds`` are closed on the
+  next publish. Each connection allows ``max_inflight`` messages waiting for
+  their acknowledgement; publish blocks while that window is full.
+  """
+  def __init__(self, host, port, tenant, max_connections=64, max_inflight=20, idle_seconds=60,
+               keepalive=60, connect_timeout=10):
+    self.host = host
+    self.port = port
+    self.tenant = tenant
+    self.max_connections = max_connections
+    self.max_inflight = max_inflight
+    self.idle_seconds = idle_seconds
+    self.keepalive = keepalive
+    self.connect_timeout = connect_timeout
+    self._connections = OrderedDict()
+    self._lock = threading.Lock()
+
+  def publish(self, device_id, payload, qos=1):
+    return self._acquire(device_id).publish(payload, qos)
+
+  def flush(self, timeout=None):
+    with self._lock:
+      connections = list(self._connections.values())
+    return all(connection.drain(timeout) for connection in connections)
+
+  def evict_idle(self):
+    threshold = time.monotonic() - self.idle_seconds
+    with self._lock:
+      idle = [device_id for device_id, connection in self._connections.items() if connection.last_used < threshold]
+      evicted = [self._connections.pop(device_id) for device_id in idle]
+    for connection in evicted:
+      connection.drain(self.connect_timeout)
+      connection.close()
+
+  def close(self):
+    with self._lock:
+      evicted = list(self._connections.values())
+      self._connections.clear()
+    for connection in evicted:
+      connection.drain(self.connect_timeout)
+      connection.close()
+
+  def __len__(self):
+    return len(self._connections)
+
+  def _acquire(self, device_id):
+    self.evict_idle()
+    with self._lock:
+      connection = self._connections.get(device_id)
+      if connection is not None:
+        self._connections.move_to_end(device_id)
+        return connection
+
+    connection = _PooledConnection(self.tenant, device_id, self.max_inflight, self.keepalive)
+    connection.connect(self.host, self.port, self.connect_timeout)
+
+    with self._lock:
+      existing = self._connections.get(device_id)
+      if existing is None:
+        self._connections[device_id] = connection
+        evicted = []
+        while len(self._connections) > self.max_connections:
+          evicted.append(self._connections.popitem(last=False)[1])
+      else:  # Another thread connected the same device meanwhile
+        evicted = [connection]
+        connection = existing
+
+    for old in evicted:
+      old.drain(self.connect_timeout)
+      old.close()
 
-  def send(self, message):
-    topic = f'{self.tenant}:{self.device_id}/attrs'
-    self.client.publish(topic, message)
\ No newline at end of file
+    return connection
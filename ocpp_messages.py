@@ -0,0 +1,182 @@
+"""
+Pre-encoded OCPP messages published by the simulated charge points.
+
+Each action is encoded once with ``json.dumps`` and split around its variable fields (slots), so encoding a message
+is just joining the constant chunks with the JSON of each slot value. The result is byte for byte what ``json.dumps``
+gives for the whole message.
+
+>>> AUTHORIZE.encode(id_tag="eletroposto_simulado_0")
+b'{"authorize": [2, "abcdefg", "Authorize", {"idTag": "eletroposto_simulado_0"}]}'
+"""
+import json
+
+
+class Slot:
+    """
+    Marks a variable field on a message structure.
+
+    Attributes
+    ----------
+    name : str
+        Keyword used to fill the slot on :meth:`MessageTemplate.encode`.
+    default : object
+        Value used when the slot is not filled. If None, the slot is required.
+    """
+    def __init__(self, name, default=None):
+        self.name = name
+        self.default = default
+
+
+def _placeholder(name):
+    return "\x00{0}\x00".format(name)
+
+
+def _replace_slots(structure, slots):
+    if isinstance(structure, Slot):
+        slots.append(structure)
+        return _placeholder(structure.name)
+    elif isinstance(structure, dict):
+        return {key: _replace_slots(value, slots) for key, value in structure.items()}
+    elif isinstance(structure, list):
+        return [_replace_slots(value, slots) for value in structure]
+    else:
+        return structure
+
+
+def encode_value(value):
+    """
+    Encode a single slot value as ``json.dumps`` would inside a message.
+
+    Parameters
+    ----------
+    value : object
+        JSON serializable value.
+
+    Returns
+    -------
+    bytes
+        The JSON of ``value``.
+    """
+    if type(value) is int:
+        return str(value).encode()
+    return json.dumps(value).encode()
+
+
+class MessageTemplate:
+    """
+    A message structure compiled to constant byte chunks and slots.
+
+    Attributes
+    ----------
+    chunks : list
+        Constant bytes around the slots, always one more than ``slots``.
+    slots : list
+        :class:`Slot` in the order they appear on the encoded message.
+    """
+    def __init__(self, structure):
+        slots = []
+        encoded = json.dumps(_replace_slots(structure, slots))
+
+        self.slots = []
+        self.chunks = []
+        for slot in sorted(slots, key=lambda slot: encoded.index(json.dumps(_placeholder(slot.name)))):
+            placeholder = json.dumps(_placeholder(slot.name))
+            before, encoded = encoded.split(placeholder, 1)
+            self.chunks.append(before.encode())
+            self.slots.append(slot)
+        self.chunks.append(encoded.encode())
+
+        self._defaults = {slot.name: slot.default for slot in self.slots}
+
+    def encode(self, **values):
+        """
+        Encode the message with ``values`` on its slots.
+
+        Parameters
+        ----------
+        **values
+            Value of each slot, by slot name. Missing slots use their default.
+
+        Returns
+        -------
+        bytes
+            The encoded message.
+        """
+        chunks = self.chunks
+        parts = [chunks[0]]
+        for index, slot in enumerate(self.slots, start=1):
+            value = values.get(slot.name, self._defaults[slot.name])
+            if value is None:
+                raise KeyError("slot {0} has no value".format(slot.name))
+            parts.append(encode_value(value))
+            parts.append(chunks[index])
+        return b"".join(parts)
+
+
+AUTHORIZE = MessageTemplate({
+    "authorize": [
+        2,
+        Slot("message_id", "abcdefg"),
+        "Authorize",
+        {"idTag": Slot("id_tag")}
+    ]
+})
+
+START_TRANSACTION = MessageTemplate({
+    "start_transaction": [
+        2,
+        Slot("message_id", "2961:137638"),
+        "StartTransaction",
+        {
+            "connectorId": 1,
+            "idTag": Slot("id_tag"),
+            "meterStart": Slot("meter_start"),
+            "timestamp": Slot("timestamp")
+        }
+    ]
+})
+
+METER_VALUES = MessageTemplate({
+    "meter_values": [
+        2,
+        Slot("message_id", "2961:137639"),
+        "MeterValues",
+        {
+            "connectorId": 1,
+            "meterValue": [
+                {
+                    "sampledValue": [
+                        {
+                            "unit": "Percent",
+                            "context": "Transaction.Begin",
+                            "measurand": "SoC",
+                            "location": "EV",
+                            "value": Slot("soc")
+                        },
+                        {
+                            "unit": "Wh",
+                            "context": "Sample.Periodic",
+                            "measurand": "Energy.Active.Import.Register",
+                            "location": "Outlet",
+                            "value": Slot("energy_wh")
+                        }
+                    ]
+                }
+            ]
+        }
+    ]
+})
+
+STOP_TRANSACTION = MessageTemplate({
+    "stop_transaction": [
+        2,
+        Slot("message_id", "2961:137794"),
+        "StopTransaction",
+        {
+            "reason": "Other",
+            "transactionId": Slot("transaction_id", 0),
+            "meterStop": Slot("meter_stop"),
+            "timestamp": Slot("timestamp")
+        }
+    ]
+})
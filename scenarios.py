@@ -0,0 +1,323 @@
+"""
+Declarative simulation scenarios.
+
+A scenario is a JSON (or YAML, if PyYAML is installed) file with a list of stages run one after the other, each
+stage overriding the scenario ``defaults``::
+
+    {
+        "defaults": {"hold_seconds": 600, "charging_seconds": 600},
+        "stages": [
+            {"name": "warm up", "chargers": 10},
+            {"chargers": 160, "ramp_seconds": 60, "charging_seconds": [300, 900], "messages": ["meter_values"]}
+        ]
+    }
+
+Stage keys:
+
+* ``chargers``: number of chargers, the first ones of the device list (required).
+* ``name``: name on the results, ``"<chargers> chargers"`` by default.
+* ``hold_seconds``: seconds the chargers stay connected and idle before their session.
+* ``ramp_seconds``: seconds along which the session starts are evenly spread.
+* ``charging_seconds``: session length, or ``[min, max]`` to draw it uniformly for each charger.
+* ``sample_interval_seconds``: seconds between two meter values of a charger.
+* ``messages``: actions sent, among ``authorize``, ``start_transaction``, ``meter_values`` and ``stop_transaction``.
+
+:class:`ScenarioRunner` keeps the chargers connected between stages, so a stage only connects the chargers the
+previous ones did not use. Given a :class:`fleet.Fleet`, it runs each stage from the fleet's single task instead of
+one ``charge`` per charger. :meth:`ScenarioRunner.run_corpus_stage` instead publishes the messages of a stage
+pre-generated by :mod:`corpus`, as fast as possible, to measure the broker rather than the simulator.
+"""
+import asyncio
+import json
+import random
+import time
+
+from os.path import splitext
+
+from charge_point import ACTIONS
+from corpus import generate_corpus, publish_corpus
+from energy import ChargingSessions
+from scheduler import SamplingScheduler
+
+try:
+    import yaml
+except ImportError:  # YAML scenarios are optional
+    yaml = None
+
+STAGE_DEFAULTS = {
+    "name": None,
+    "hold_seconds": 600,
+    "ramp_seconds": 0,
+    "charging_seconds": 600,
+    "sample_interval_seconds": 1,
+    "messages": list(ACTIONS)
+}
+
+# The scenarios the simulator always ran: each size holds 10 minutes, then charges for 10 minutes
+DEFAULT_SCENARIO = {
+    "stages": [{"chargers": chargers} for chargers in (10, 20, 40, 80, 160)]
+}
+
+
+def load_scenario(path):
+    """
+    Read a scenario file.
+
+    Parameters
+    ----------
+    path : str
+        Path to a ``.json``, ``.yaml`` or ``.yml`` file.
+
+    Returns
+    -------
+    dict
+        The scenario.
+
+    Raises
+    ------
+    ImportError
+        If the file is YAML and PyYAML is not installed.
+    """
+    with open(path, "r") as scenario_file:
+        if splitext(path)[1].lower() in (".yaml", ".yml"):
+            if yaml is None:
+                raise ImportError("PyYAML is required to read {0}".format(path))
+            return yaml.safe_load(scenario_file)
+        return json.load(scenario_file)
+
+
+def expand_stages(scenario, available=None):
+    """
+    Get the stages of a scenario with every key filled.
+
+    Parameters
+    ----------
+    scenario : dict
+        Scenario with ``stages`` and optional ``defaults``.
+    available : int/None
+        Number of devices, to check no stage asks for more.
+
+    Returns
+    -------
+    list
+        Stage dicts.
+
+    Raises
+    ------
+    ValueError
+        If a stage has an unknown key or action, misses ``chargers`` or asks for more chargers than available.
+    """
+    defaults = dict(STAGE_DEFAULTS, **scenario.get("defaults", {}))
+    stages = []
+    for index, overrides in enumerate(scenario["stages"]):
+        stage = dict(defaults, **overrides)
+
+        unknown = set(stage) - set(STAGE_DEFAULTS) - {"chargers"}
+        if unknown:
+            raise ValueError("stage {0} has unknown keys {1}".format(index, sorted(unknown)))
+        if "chargers" not in stage:
+            raise ValueError("stage {0} has no chargers".format(index))
+        if available is not None and stage["chargers"] > available:
+            raise ValueError("stage {0} needs {1} chargers, only {2} devices exist".format(
+                index, stage["chargers"], available))
+        unknown = set(stage["messages"]) - set(ACTIONS)
+        if unknown:
+            raise ValueError("stage {0} has unknown messages {1}".format(index, sorted(unknown)))
+
+        if stage["name"] is None:
+            stage["name"] = "{0} chargers".format(stage["chargers"])
+        stages.append(stage)
+    return stages
+
+
+def _charging_seconds(profile):
+    if isinstance(profile, (list, tuple)):
+        return random.uniform(*profile)
+    return profile
+
+
+class ScenarioRunner:
+    """
+    Runs stages over a growing set of connected chargers.
+
+    Attributes
+    ----------
+    devices : list
+        ``(label, device_id)`` pairs, in the order the stages take them.
+    make_charger : callable
+        ``make_charger(label, device_id)`` creates a ChargePoint.
+    connect : callable
+        Coroutine function connecting a list of chargers, returning the connected ones and a report dict.
+    make_clock : callable
+        Creates the clock of each stage.
+    phases : int
+        Phases of each stage's SamplingScheduler.
+    drain_seconds : float
+        Seconds to wait, after a stage, for its outstanding messages to be acknowledged.
+    fleet : fleet.Fleet/None
+        Fleet whose ``add`` is ``make_charger``, running the sessions of the stages.
+    chargers : list
+        Chargers connected so far.
+    """
+    def __init__(self, devices, make_charger, connect, make_clock, phases=1, drain_seconds=5, fleet=None):
+        self.devices = list(devices.items())
+        self.make_charger = make_charger
+        self.connect = connect
+        self.make_clock = make_clock
+        self.phases = phases
+        self.drain_seconds = drain_seconds
+        self.fleet = fleet
+        self.chargers = []
+        self._next_device = 0
+
+    async def connect_up_to(self, count):
+        """
+        Create and connect the first ``count`` chargers not created yet.
+
+        Returns
+        -------
+        dict
+            Report of the new connections, empty if there were none.
+        """
+        missing = self.devices[self._next_device:count]
+        if not missing:
+            return {}
+        self._next_device = count
+        connected, report = await self.connect([self.make_charger(label, device_id) for label, device_id in missing])
+        self.chargers.extend(connected)
+        return report
+
+    async def _session(self, charge_point, clock, delay, charging_seconds):
+        await clock.sleep(delay)
+        await charge_point.charge(charging_seconds=charging_seconds)
+
+    async def _drain(self, chargers):
+        deadline = time.monotonic() + self.drain_seconds
+        while time.monotonic() < deadline and any(cp.mqtt_client.outstanding > 0 for cp in chargers):
+            await asyncio.sleep(0.01)
+
+    def _counters(self, chargers):
+        return {
+            "messages_sent": sum(cp.mqtt_client.messages_sent for cp in chargers),
+            "bytes_sent": sum(cp.mqtt_client.bytes_sent for cp in chargers),
+            "messages_acked": sum(cp.mqtt_client.acked for cp in chargers),
+            "messages_dropped": sum(cp.mqtt_client.dropped + cp.mqtt_client.lost for cp in chargers)
+        }
+
+    async def run_stage(self, stage):
+        """
+        Run a stage, connecting only the chargers not connected yet.
+
+        Parameters
+        ----------
+        stage : dict
+            Stage from :func:`expand_stages`.
+
+        Returns
+        -------
+        dict
+            Results of the stage: name, chargers, the report of the new connections, the messages, bytes, acks and
+            drops of the stage, its wall and simulated seconds, messages per second and sampling stats.
+        """
+        connect_report = await self.connect_up_to(stage["chargers"])
+        chargers = self.chargers[:stage["chargers"]]
+
+        clock = self.make_clock()
+        before = self._counters(chargers)
+        start = time.perf_counter()
+        spacing = stage["ramp_seconds"] / len(chargers) if chargers else 0
+
+        if self.fleet is not None:
+            sampling = await self.fleet.run(
+                [cp.index for cp in chargers],
+                start_offsets=[stage["hold_seconds"] + index * spacing for index in range(len(chargers))],
+                charging_seconds=[_charging_seconds(stage["charging_seconds"]) for _ in chargers],
+                clock=clock,
+                sample_interval_seconds=stage["sample_interval_seconds"],
+                phases=self.phases,
+                actions=stage["messages"]
+            )
+        else:
+            sessions = ChargingSessions(capacity=len(chargers))
+            scheduler = SamplingScheduler(interval=stage["sample_interval_seconds"], phases=self.phases, clock=clock,
+                                          on_tick=sessions.advance)
+            for cp in chargers:
+                cp.clock = clock
+                cp.scheduler = scheduler
+                cp.sessions = sessions
+                cp.sample_interval_seconds = stage["sample_interval_seconds"]
+                cp.actions = tuple(stage["messages"])
+
+            await asyncio.gather(*(
+                self._session(
+                    cp, clock, stage["hold_seconds"] + index * spacing, _charging_seconds(stage["charging_seconds"]))
+                for index, cp in enumerate(chargers)
+            ))
+            sampling = scheduler.stats()
+
+        elapsed = time.perf_counter() - start
+        await self._drain(chargers)  # So the acks of this stage are not counted on the next one
+        counters = {key: value - before[key] for key, value in self._counters(chargers).items()}
+        return {
+            "stage": stage["name"],
+            "chargers": len(chargers),
+            **connect_report,
+            **counters,
+            "elapsed_seconds": elapsed,
+            "messages_per_second": counters["messages_sent"] / elapsed if elapsed else 0.0,
+            "max_simulated_seconds": clock.time(),
+            **sampling
+        }
+
+    async def run_corpus_stage(self, stage):
+        """
+        Generate every message of a stage up front, then publish them as fast as the windows allow.
+
+        ``hold_seconds`` and ``ramp_seconds`` are ignored: the payloads of :func:`corpus.generate_corpus` are only
+        sliced and sent, one after the other.
+
+        Parameters
+        ----------
+        stage : dict
+            Stage from :func:`expand_stages`.
+
+        Returns
+        -------
+        dict
+            Results of the stage as :meth:`run_stage`, elapsed and rate counting the publishing only, with the
+            seconds spent generating and publishing, the fraction of both spent generating and the corpus bytes.
+        """
+        connect_report = await self.connect_up_to(stage["chargers"])
+        chargers = self.chargers[:stage["chargers"]]
+
+        before = self._counters(chargers)
+        corpus = generate_corpus(
+            [cp.id for cp in chargers],
+            charging_seconds=[_charging_seconds(stage["charging_seconds"]) for _ in chargers],
+            sample_interval_seconds=stage["sample_interval_seconds"],
+            actions=stage["messages"],
+            start=self.make_clock().now()
+        )
+        publishing = await publish_corpus(corpus, [cp.mqtt_client for cp in chargers])
+
+        await self._drain(chargers)
+        counters = {key: value - before[key] for key, value in self._counters(chargers).items()}
+        elapsed = publishing["publish_seconds"]
+        total = corpus.generation_seconds + elapsed
+        return {
+            "stage": stage["name"],
+            "chargers": len(chargers),
+            **connect_report,
+            **counters,
+            "elapsed_seconds": elapsed,
+            "messages_per_second": counters["messages_sent"] / elapsed if elapsed else 0.0,
+            "generation_seconds": corpus.generation_seconds,
+            "publish_seconds": elapsed,
+            "generation_fraction": corpus.generation_seconds / total if total else 0.0,
+            "corpus_bytes": corpus.nbytes
+        }
+
+    def close(self):
+        for cp in self.chargers:
+            cp.mqtt_client.disconnect()
+        self.chargers = []
@@ -0,0 +1,114 @@
+"""
+Central meter value sampling for a fleet of charge points.
+
+Instead of one ``asyncio.sleep`` loop per charging ChargePoint, a single task wakes on a fixed grid of absolute
+deadlines and samples every registered charger. The tick can be split in ``phases`` slots, each charger being
+assigned to one of them, so the publishes are spread along the interval instead of bursting at its start.
+
+The tick never waits for a charger: ``sample_meter_value`` sends without waiting for room on the MQTT window, so a
+sample whose window is full is dropped (and counted on ``simulator_messages_dropped``) instead of delaying the rest of
+the fleet. Without a scheduler, each ChargePoint waits for room before every sample instead.
+
+>>> scheduler = SamplingScheduler(interval=1, phases=10)
+>>> scheduler.register(charge_point)  # charge_point.sample_meter_value() is now called once per second
+"""
+import asyncio
+
+from clock import Clock
+
+
+class SamplingScheduler:
+    """
+    Calls ``sample_meter_value()`` of every registered charger once per ``interval``.
+
+    Deadlines are computed from the start of the schedule, never from the previous wake up, so the lag of a slow
+    tick does not accumulate and the long-run rate stays exactly ``1 / interval`` per charger.
+
+    Attributes
+    ----------
+    interval : float
+        Seconds between two samples of the same charger.
+    phases : int
+        Number of slots the interval is divided into.
+    ticks : int
+        Number of slots processed so far.
+    last_lag : float
+        Seconds between the deadline of the last slot and the moment it was processed.
+    max_lag : float
+        Largest lag seen.
+    total_lag : float
+        Sum of the lag of all slots.
+    clock : clock.Clock
+        Clock giving the deadlines, so the schedule follows scaled or virtual time.
+    on_tick : callable/None
+        Called with the clock time before each slot is sampled, e.g. to advance the charging sessions of the whole
+        fleet at once.
+    """
+    def __init__(self, interval=1, phases=1, clock=None, on_tick=None):
+        self.interval = interval
+        self.phases = phases
+        self.clock = clock if clock is not None else Clock()
+        self.on_tick = on_tick
+        self.ticks = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self._slots = [{} for _ in range(phases)]  # dicts keep the registration order and allow O(1) removal
+        self._slot_of = {}
+        self._next_slot = 0
+        self._task = None
+
+    @property
+    def mean_lag(self):
+        return self.total_lag / self.ticks if self.ticks else 0.0
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def register(self, charge_point):
+        if charge_point in self._slot_of:
+            return
+        slot = self._next_slot
+        self._next_slot = (self._next_slot + 1) % self.phases
+        self._slots[slot][charge_point] = None
+        self._slot_of[charge_point] = slot
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def unregister(self, charge_point):
+        slot = self._slot_of.pop(charge_point, None)
+        if slot is not None:
+            del self._slots[slot][charge_point]
+
+    def stats(self):
+        return {
+            "sampling_ticks": self.ticks,
+            "sampling_lag_seconds_total": self.total_lag,
+            "max_sampling_lag_seconds": self.max_lag
+        }
+
+    async def _run(self):
+        clock = self.clock
+        slot_seconds = self.interval / self.phases
+        start = clock.time()
+        step = 0
+
+        while self._slot_of:
+            deadline = start + step * slot_seconds
+            await clock.sleep(max(0.0, deadline - clock.time()))  # Yield even when late
+
+            lag = max(0.0, clock.time() - deadline)
+            self.ticks += 1
+            self.last_lag = lag
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+
+            if self.on_tick is not None:
+                self.on_tick(clock.time())
+
+            for charge_point in list(self._slots[step % self.phases]):
+                charge_point.sample_meter_value()
+
+            step += 1
+
+        self._task = None
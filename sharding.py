@@ -0,0 +1,176 @@
+"""
+Run a fleet scenario split across several worker processes.
+
+Every worker gets its own interpreter and event loop, so JSON encoding, logging and MQTT work for the fleet are
+spread over all cores instead of being capped at one.
+
+>>> totals = run_sharded(run_scenario, devices, workers=4)
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import time
+
+
+def partition_devices(devices, shards):
+    """
+    Split a ``{label: device_id}`` dict into ``shards`` dicts of (almost) the same size.
+
+    Parameters
+    ----------
+    devices : dict
+        Devices as returned by :meth:`dojot.Dojot.get_all_devices_id`.
+    shards : int
+        Number of partitions.
+
+    Returns
+    -------
+    list
+        List of dicts, empty partitions are removed.
+    """
+    partitions = [{} for _ in range(shards)]
+    for index, (label, device_id) in enumerate(devices.items()):
+        partitions[index % shards][label] = device_id
+    return [partition for partition in partitions if partition]
+
+
+def _run_shard(index, scenario, devices, barrier, results, start_timeout):
+    counters = {"shard": index, "pid": os.getpid(), "chargers": len(devices)}
+    try:
+        barrier.wait(timeout=start_timeout)
+        started = time.perf_counter()
+        counters.update(asyncio.run(scenario(devices)) or {})
+        counters["elapsed_seconds"] = time.perf_counter() - started
+    except Exception as error:
+        counters["error"] = repr(error)
+    results.put(counters)
+
+
+def aggregate_counters(counters):
+    """
+    Sum the numeric counters reported by each shard.
+
+    Parameters
+    ----------
+    counters : list
+        List of dicts returned by each shard.
+
+    Returns
+    -------
+    dict
+        Dict with the summed counters, the largest ``elapsed_seconds``, ``max_*`` and ``*max_ms`` counters, the mean
+        of the ``*_fraction`` ones and the list of shard ``errors``. The other latency summaries (``*_ms``, e.g. a
+        percentile) cannot be combined from the shards' summaries: the largest one is reported as
+        ``worst_shard_*_ms``, an upper bound of the fleet's value rather than the value itself.
+    """
+    totals = {"shards": len(counters), "errors": []}
+    for shard in counters:
+        for key, value in shard.items():
+            if key in ("shard", "pid"):
+                continue
+            elif key == "error":
+                totals["errors"].append(value)
+            elif value is None:
+                continue
+            elif key == "elapsed_seconds" or key.startswith("max_") or key.endswith("max_ms"):
+                totals[key] = max(totals.get(key, 0), value)
+            elif key.endswith("_ms"):
+                totals["worst_shard_" + key] = max(totals.get("worst_shard_" + key, 0), value)
+            elif key.endswith("_fraction"):
+                totals[key] = totals.get(key, 0) + value / len(counters)
+            elif isinstance(value, (int, float)):
+                totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def _collect(processes, results, poll_seconds):
+    counters = []
+    suspects = set()
+    while len(counters) < len(processes):
+        try:
+            counters.append(results.get(timeout=poll_seconds))
+            continue
+        except queue.Empty:
+            pass
+        reported = {shard["shard"] for shard in counters}
+        exited = {index for index, process in enumerate(processes)
+                  if process.exitcode is not None and index not in reported}
+        # A worker reporting right before exiting gets one more poll for its counters to come through
+        failed = exited & suspects
+        if failed:
+            index = min(failed)
+            raise RuntimeError("shard {0} exited with code {1} without reporting".format(
+                index, processes[index].exitcode))
+        suspects = exited
+    return counters
+
+
+def run_sharded(scenario, devices, workers=None, start_timeout=60, poll_seconds=1):
+    """
+    Run ``scenario`` over ``devices`` partitioned across ``workers`` processes.
+
+    All workers wait on a shared barrier before starting their event loop, so the shards begin the scenario at the
+    same instant.
+
+    Parameters
+    ----------
+    scenario : coroutine function
+        Module level coroutine function receiving a ``{label: device_id}`` dict and returning a dict of counters.
+    devices : dict
+        Devices as returned by :meth:`dojot.Dojot.get_all_devices_id`.
+    workers : int/None
+        Number of processes. If None, the CPU count is used.
+    start_timeout : float
+        Seconds to wait for every worker to reach the start barrier.
+    poll_seconds : float
+        Seconds between two checks that the workers not reported yet are still alive.
+
+    Returns
+    -------
+    dict
+        Counters aggregated with :func:`aggregate_counters`.
+
+    Raises
+    ------
+    ValueError
+        If ``workers`` is below 1.
+    RuntimeError
+        If a worker dies without reporting (e.g. killed by the OOM killer). The other workers are terminated.
+    threading.BrokenBarrierError
+        If the workers do not all reach the start barrier in ``start_timeout``. The workers are terminated.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("workers must be at least 1, not {0}".format(workers))
+
+    partitions = partition_devices(devices, workers)
+
+    context = multiprocessing.get_context("spawn")  # Never fork a process that owns a running event loop
+    barrier = context.Barrier(len(partitions) + 1)
+    results = context.Queue()
+
+    processes = [
+        context.Process(target=_run_shard, args=(index, scenario, partition, barrier, results, start_timeout))
+        for index, partition in enumerate(partitions)
+    ]
+    completed = False
+    try:
+        for process in processes:
+            process.start()
+
+        barrier.wait(timeout=start_timeout)
+        logging.info(f'started {len(partitions)} shards with {len(devices)} chargers')
+
+        counters = _collect(processes, results, poll_seconds)
+        completed = True
+    finally:
+        for process in processes:
+            if not completed and process.is_alive():
+                process.terminate()
+            if process.pid is not None:
+                process.join()
+
+    return aggregate_counters(counters)
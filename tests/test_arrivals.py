@@ -0,0 +1,83 @@
+"""
+Arrival processes and the open loop load generator, run on a virtual clock.
+"""
+import asyncio
+import itertools
+
+import pytest
+
+from arrivals import LoadGenerator, fixed_rate, parse_arrivals, poisson, ramp, trace
+from clock import VirtualClock
+
+
+def first(arrivals, count):
+    return list(itertools.islice(arrivals, count))
+
+
+def test_fixed_rate():
+    assert first(fixed_rate(4), 4) == [0.0, 0.25, 0.5, 0.75]
+
+
+def test_poisson_mean_gap_and_seed():
+    offsets = first(poisson(2, seed=1), 20000)
+    assert offsets == sorted(offsets)
+    assert offsets[-1] / len(offsets) == pytest.approx(0.5, rel=0.05)
+    assert first(poisson(2, seed=1), 5) == offsets[:5]
+
+
+def test_ramp_reaches_end_rate():
+    offsets = first(ramp(1, 4, duration=10), 60)
+    assert offsets[1] - offsets[0] == 1.0
+    assert offsets[-1] - offsets[-2] == 0.25
+
+
+def test_trace_keeps_the_gaps():
+    assert list(trace([105.0, 100.0, 101.5])) == [0.0, 1.5, 5.0]
+
+
+def test_parse_arrivals():
+    assert first(parse_arrivals("fixed:2"), 3) == [0.0, 0.5, 1.0]
+    assert first(parse_arrivals("ramp:1:1:0"), 3) == [0.0, 1.0, 2.0]
+    assert first(parse_arrivals("poisson:3"), 1)[0] > 0
+
+
+@pytest.mark.parametrize("spec", ["fixed:0", "poisson:-1", "fixed:x", "ramp:0:2:10", "ramp:1:2:-1", "ramp:1:2",
+                                  "fixed:1:2", "poisson:nan", "constant:1"])
+def test_parse_arrivals_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        parse_arrivals(spec)
+
+
+class MqttClient:
+    messages_sent = 0
+
+
+class Charger:
+    actions = ("authorize", "start_transaction", "meter_values", "stop_transaction")
+    sample_interval_seconds = 1
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.mqtt_client = MqttClient()
+
+    async def charge(self, charging_seconds):
+        self.mqtt_client.messages_sent += 2
+        await self.clock.sleep(charging_seconds)
+        self.mqtt_client.messages_sent += 1 + charging_seconds
+
+
+def test_load_generator_rejects_sessions_without_idle_charger():
+    clock = VirtualClock()
+    chargers = [Charger(clock), Charger(clock)]
+    generator = LoadGenerator(chargers, fixed_rate(1), session_seconds=3, duration=9, clock=clock)
+    report = asyncio.run(generator.run())
+
+    # Sessions arrive every second and last 3 (a charger is idle again at the arrival ending its session), so the
+    # two chargers take two arrivals in three
+    assert report["sessions_scheduled"] == 10
+    assert report["sessions_started"] == 7
+    assert report["sessions_rejected"] == 3
+    assert report["sessions_completed"] == 7
+    assert report["target_messages"] == 10 * 6
+    assert report["messages_sent"] == 7 * 6
+    assert report["elapsed_seconds"] == 12.0
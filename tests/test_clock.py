@@ -0,0 +1,71 @@
+"""
+Virtual and scaled clocks, and the parsing of the simulation speed.
+"""
+import asyncio
+import datetime
+import math
+
+import pytest
+
+from clock import Clock, ScaledClock, VirtualClock, make_clock
+
+
+def test_virtual_clock_jumps_to_each_wake_up_in_order():
+    clock = VirtualClock(start=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+    woken = []
+
+    async def sleeper(name, seconds):
+        await clock.sleep(seconds)
+        woken.append((name, clock.time()))
+
+    async def main():
+        await asyncio.gather(sleeper("late", 3600), sleeper("early", 60), sleeper("tie", 60), sleeper("now", 0))
+
+    asyncio.run(main())
+    assert woken == [("now", 0.0), ("early", 60.0), ("tie", 60.0), ("late", 3600.0)]
+    assert clock.now() == datetime.datetime(2020, 1, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def test_virtual_clock_sleeps_add_up():
+    clock = VirtualClock()
+
+    async def main():
+        for _ in range(10):
+            await clock.sleep(0.5)
+
+    asyncio.run(main())
+    assert clock.time() == 5.0
+
+
+def test_virtual_clock_skips_cancelled_sleepers():
+    clock = VirtualClock()
+
+    async def main():
+        cancelled = asyncio.ensure_future(clock.sleep(10))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await clock.sleep(20)
+
+    asyncio.run(main())
+    assert clock.time() == 20.0
+
+
+@pytest.mark.parametrize("speed, kind", [(None, Clock), ("", Clock), ("1", Clock), (1, Clock), ("virtual", VirtualClock),
+                                         (" Virtual ", VirtualClock), ("60", ScaledClock), (0.5, ScaledClock)])
+def test_make_clock(speed, kind):
+    assert type(make_clock(speed)) is kind
+
+
+def test_make_clock_scaled_speed():
+    assert make_clock("60").speed == 60.0
+
+
+@pytest.mark.parametrize("speed", ["0", 0, "-2", "fast", "nan", math.inf])
+def test_make_clock_rejects_invalid_speeds(speed):
+    with pytest.raises(ValueError, match="SIMULATION_SPEED"):
+        make_clock(speed)
+
+
+def test_scaled_clock_rejects_invalid_speeds():
+    with pytest.raises(ValueError):
+        ScaledClock(speed=0)
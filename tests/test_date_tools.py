@@ -0,0 +1,62 @@
+"""
+The compiled tariff schedule must classify every instant as the former window by window implementation did.
+"""
+import random
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+import pytz
+
+from benchmarks.tariff_rate import legacy_tariff_rate
+from date_tools import TARIFF_RATES, TariffSchedule, from_timestamp, get_tariff_rate, get_tariff_schedule
+
+TIMEZONE = pytz.timezone("America/Belem")
+
+# A working day, a holiday (Friday 15) and a weekend, from Thursday 2024-11-14
+START = TIMEZONE.localize(datetime(2024, 11, 14))
+
+
+def instants():
+    # Every minute, the window ends and some instants inside a minute
+    rng = random.Random(1)
+    for minute in range(4 * 24 * 60):
+        moment = START + timedelta(minutes=minute)
+        yield moment
+        yield moment + timedelta(seconds=rng.randrange(1, 60), microseconds=rng.randrange(10 ** 6))
+    yield START + timedelta(hours=18, minutes=29, seconds=59, microseconds=999999)
+
+
+def test_scalar_rate_matches_the_former_implementation():
+    moments = list(instants())
+    assert [get_tariff_rate(moment) for moment in moments] == [legacy_tariff_rate(moment) for moment in moments]
+    assert {get_tariff_rate(moment) for moment in moments} == set(TARIFF_RATES)
+
+
+def test_window_ends_are_included():
+    assert get_tariff_rate(START + timedelta(hours=17, minutes=30)) == "intermediate"
+    assert get_tariff_rate(START + timedelta(hours=18, minutes=30)) == "peak"
+    assert get_tariff_rate(START + timedelta(hours=22, minutes=30)) == "intermediate"
+    assert get_tariff_rate(START + timedelta(hours=22, minutes=30, microseconds=1)) == "off_peak"
+
+
+def test_holidays_and_weekends_are_off_peak():
+    for day in (1, 2, 3):  # Friday holiday, Saturday and Sunday
+        assert get_tariff_rate(START + timedelta(days=day, hours=19)) == "off_peak"
+
+
+def test_classify_matches_the_scalar_rate():
+    moments = list(instants())
+    timestamps = np.array([moment.timestamp() for moment in moments])
+    codes = get_tariff_schedule().classify(timestamps, timezone="America/Belem")
+    expected = [get_tariff_rate(from_timestamp(timestamp, timezone=TIMEZONE)) for timestamp in timestamps.tolist()]
+    assert np.array(TARIFF_RATES)[codes].tolist() == expected
+
+
+@pytest.mark.parametrize("peak_times, intermediate_times", [(("08:00-12:00",), ()), (("10:00-11:00",), ("09:00-12:00",))])
+def test_custom_windows(peak_times, intermediate_times):
+    schedule = TariffSchedule(peak_times=peak_times, intermediate_times=intermediate_times)
+    for moment in list(instants())[:2 * 24 * 60]:  # The working day
+        assert schedule.rate(moment) == legacy_tariff_rate(
+            moment, peak_times=peak_times, intermediate_times=intermediate_times)
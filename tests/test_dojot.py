@@ -0,0 +1,60 @@
+"""
+Columnar conversion of the history API data.
+"""
+from datetime import datetime, timezone
+
+import numpy as np
+
+from dojot import convert_history_to_columns, convert_history_to_dict, convert_to_correct_type, \
+    convert_values_to_column
+
+HISTORY = {
+    "energy": [
+        {"timestamp": "2020-02-05T20:38:54.741000Z", "value": "2810542", "device_id": "a1b2", "attr": "energy"},
+        {"timestamp": "2020-02-05T20:38:55.742000Z", "value": 2810600, "device_id": "a1b2", "attr": "energy"}
+    ],
+    "soc": [
+        {"timestamp": "2020-02-05T20:38:54Z", "value": "57.5", "device_id": "a1b2", "attr": "soc"}
+    ],
+    "status": [
+        {"timestamp": "2020-02-05T20:38:54Z", "value": "charging", "device_id": "a1b2", "attr": "status"},
+        {"timestamp": "2020-02-05T20:38:56Z", "value": "12", "device_id": "a1b2", "attr": "status"}
+    ]
+}
+
+
+def test_convert_history_to_columns():
+    columns = convert_history_to_columns(HISTORY)
+    assert set(columns) == set(HISTORY)
+
+    energy = columns["energy"]
+    assert energy["datetime"].dtype == np.dtype("datetime64[us]")
+    assert energy["datetime"][0] == np.datetime64("2020-02-05T20:38:54.741000")
+    assert energy["value"].dtype == np.int64
+    assert energy["value"].tolist() == [2810542, 2810600]
+
+    assert columns["soc"]["value"].dtype == np.float64
+    assert columns["soc"]["value"].tolist() == [57.5]
+
+    assert columns["status"]["value"].dtype == object
+    assert columns["status"]["value"].tolist() == ["charging", 12]
+
+
+def test_convert_values_to_column_matches_value_by_value_conversion():
+    for values in (["1", "2", "-3"], ["1", "2.5"], ["a", "1", "1.5"], [[1, 2], 3], []):
+        column = convert_values_to_column(values)
+        assert column.tolist() == [convert_to_correct_type(value) for value in values]
+
+
+def test_convert_values_to_column_keeps_float_numbers():
+    column = convert_values_to_column([1, 2.5])
+    assert column.dtype == np.float64
+    assert column.tolist() == [1.0, 2.5]
+
+
+def test_convert_history_to_dict():
+    history = convert_history_to_dict(HISTORY)
+    assert history["energy"]["value"] == [2810542, 2810600]
+    assert history["soc"]["value"] == [57.5]
+    assert history["status"]["value"] == ["charging", 12]
+    assert history["energy"]["datetime"][0] == datetime(2020, 2, 5, 20, 38, 54, 741000, tzinfo=timezone.utc)
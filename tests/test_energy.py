@@ -0,0 +1,63 @@
+"""
+CC/CV charging curve and the table of charging sessions.
+"""
+import numpy as np
+import pytest
+
+from energy import CV_SOC, EFFICIENCY, ChargingSessions, cc_cv_step
+
+CAPACITY_WH = np.array([60000.0, 60000.0, 60000.0])
+POWER_W = np.array([11000.0, 11000.0, 50000.0])
+
+
+def test_constant_current_phase_is_linear():
+    soc, grid_wh = cc_cv_step(np.array([0.2]), CAPACITY_WH[:1], POWER_W[:1], 3600)
+    assert soc[0] == pytest.approx(0.2 + 11000 * EFFICIENCY / 60000)
+    assert grid_wh[0] == pytest.approx(11000)
+
+
+def test_constant_voltage_phase_tapers_below_full():
+    soc, _ = cc_cv_step(np.array([0.1, 0.5, 0.79]), CAPACITY_WH, np.full(3, 11000.0), 20 * 3600)
+    assert np.all(soc > 0.999)
+    assert np.all(soc < 1.0)
+    cc_end, _ = cc_cv_step(np.array([0.1]), CAPACITY_WH[:1], POWER_W[:1], 0.7 / (11000 * EFFICIENCY / 60000 / 3600))
+    assert cc_end[0] == pytest.approx(CV_SOC)
+
+
+def test_result_does_not_depend_on_the_step():
+    start = np.array([0.1, 0.5, 0.79])
+    once, once_wh = cc_cv_step(start, CAPACITY_WH, POWER_W, 7200)
+    soc, total_wh = start, np.zeros(3)
+    for _ in range(7200 // 60):
+        soc, grid_wh = cc_cv_step(soc, CAPACITY_WH, POWER_W, 60)
+        total_wh += grid_wh
+    np.testing.assert_allclose(soc, once)
+    np.testing.assert_allclose(total_wh, once_wh)
+
+
+def test_per_session_seconds():
+    soc, grid_wh = cc_cv_step(np.array([0.3, 0.3]), CAPACITY_WH[:2], POWER_W[:2], np.array([0.0, 60.0]))
+    assert soc[0] == pytest.approx(0.3) and grid_wh[0] == pytest.approx(0.0, abs=1e-6)
+    assert soc[1] > 0.3
+
+
+def test_sessions_advance_the_energy_register_and_reuse_rows():
+    sessions = ChargingSessions(capacity=1, seed=1)
+    first = sessions.open(now=0, meter_wh=1000, charger_power_w=22000)
+    second = sessions.open(now=30, meter_wh=5000, charger_power_w=7400)
+    assert (first, second, len(sessions)) == (0, 1, 2)
+
+    soc = sessions.soc_percent(first)
+    sessions.advance(now=600)
+    assert sessions.soc_percent(first) >= soc
+    assert sessions.energy_wh(first) > 1000
+    assert sessions.updated_at[second] == 600
+
+    meter_stop = sessions.close(first, now=1200)
+    assert meter_stop == sessions.energy_wh(first)
+    assert len(sessions) == 1
+    sessions.advance(now=1800)
+    assert sessions.energy_wh(first) == meter_stop  # Closed rows are not advanced
+
+    assert sessions.open(now=1800, meter_wh=meter_stop, charger_power_w=11000) == first
+    assert len(sessions) == 2
@@ -0,0 +1,93 @@
+"""
+Latency histogram accuracy and the matching of the probed messages.
+"""
+import json
+import math
+import random
+import time
+
+from types import SimpleNamespace
+
+import pytest
+
+from latency import LatencyHistogram, LatencyProbe, check_topic_filter, find_message_id, probe_message_id
+
+
+def exact_percentile(values, percentile):
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(len(ordered) * percentile / 100)) - 1]
+
+
+def test_small_values_are_exact():
+    histogram = LatencyHistogram()
+    for microseconds in range(1, 101):
+        histogram.record(microseconds / 1e6)
+    assert histogram.percentile(50) == pytest.approx(50e-6)
+    assert histogram.percentile(99) == pytest.approx(99e-6)
+    assert histogram.percentile(100) == pytest.approx(100e-6)
+
+
+def test_percentiles_within_relative_error():
+    rng = random.Random(1)
+    values = [rng.lognormvariate(-4, 1.5) for _ in range(10000)]
+    histogram = LatencyHistogram(significant_bits=7)
+    for value in values:
+        histogram.record(value)
+    for percentile in (50, 90, 99, 99.9):
+        assert histogram.percentile(percentile) == pytest.approx(exact_percentile(values, percentile), rel=2 ** -6)
+    assert histogram.max == int(max(values) * 1e6)
+
+
+def test_merge_equals_recording_everything_once():
+    rng = random.Random(2)
+    values = [rng.expovariate(100) for _ in range(2000)]
+    whole, first, second = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for index, value in enumerate(values):
+        whole.record(value)
+        (first if index % 2 else second).record(value)
+    first.merge(second)
+    assert first.summary() == whole.summary()
+
+
+def test_empty_summary():
+    assert LatencyHistogram().summary() == {
+        "count": 0, "mean_ms": None, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None
+    }
+
+
+@pytest.mark.parametrize("topic", ["+/attrs", "#", "admin:abc/attrs", "+/+/#"])
+def test_valid_topic_filters(topic):
+    check_topic_filter(topic)
+
+
+@pytest.mark.parametrize("topic", ["admin:+/attrs", "a/#/b", "attrs#"])
+def test_invalid_topic_filters(topic):
+    with pytest.raises(ValueError):
+        check_topic_filter(topic)
+
+
+def test_find_message_id():
+    assert find_message_id({"authorize": [2, "abc", "Authorize", {}]}) == "abc"
+    assert find_message_id({"soc": 57}) is None
+
+
+def receive(probe, message_id):
+    probe._on_message(None, None, SimpleNamespace(payload=json.dumps({"meter_values": [2, message_id]}).encode()))
+
+
+def test_probe_counts_duplicates_stale_and_lost_messages():
+    probe = LatencyProbe("localhost", 1883)
+    receive(probe, probe_message_id("a1b2", 0))
+    receive(probe, probe_message_id("a1b2", 0))
+    receive(probe, probe_message_id("a1b2", 1))
+    receive(probe, "not a probed id")
+    report = probe.report(sent=3)
+    assert (report["count"], report["duplicated"], report["lost"], report["stale"]) == (2, 1, 1, 0)
+
+    late = probe_message_id("a1b2", 2)
+    time.sleep(0.001)
+    probe.reset()
+    receive(probe, late)
+    receive(probe, probe_message_id("a1b2", 0))
+    report = probe.report(sent=1)
+    assert (report["count"], report["duplicated"], report["lost"], report["stale"]) == (1, 0, 0, 1)
@@ -0,0 +1,109 @@
+"""
+The precompiled OCPP templates must give byte for byte what json.dumps gives for the whole message.
+"""
+import json
+
+import pytest
+
+from ocpp_messages import AUTHORIZE, START_TRANSACTION, METER_VALUES, STOP_TRANSACTION, encode_value
+
+ID_TAGS = [
+    "eletroposto_simulado_0",
+    "",
+    'quote " and backslash \\ and slash /',
+    "control \n\t\r\b\f \u0000 \u001f",
+    "acentuação çãé",
+    "emoji \U0001F600 and   separator",
+]
+
+TIMESTAMPS = ["2020-02-05T20:38:54.741000+00:00", "2038-01-19T03:14:07+00:00"]
+
+
+def authorize(id_tag, message_id="abcdefg"):
+    return json.dumps({"authorize": [2, message_id, "Authorize", {"idTag": id_tag}]}).encode()
+
+
+def start_transaction(id_tag, meter_start, timestamp, message_id="2961:137638"):
+    return json.dumps({
+        "start_transaction": [2, message_id, "StartTransaction", {
+            "connectorId": 1,
+            "idTag": id_tag,
+            "meterStart": meter_start,
+            "timestamp": timestamp
+        }]
+    }).encode()
+
+
+def meter_values(soc, energy_wh, message_id="2961:137639"):
+    return json.dumps({
+        "meter_values": [2, message_id, "MeterValues", {
+            "connectorId": 1,
+            "meterValue": [{
+                "sampledValue": [
+                    {"unit": "Percent", "context": "Transaction.Begin", "measurand": "SoC", "location": "EV",
+                     "value": soc},
+                    {"unit": "Wh", "context": "Sample.Periodic", "measurand": "Energy.Active.Import.Register",
+                     "location": "Outlet", "value": energy_wh}
+                ]
+            }]
+        }]
+    }).encode()
+
+
+def stop_transaction(meter_stop, timestamp, transaction_id=0, message_id="2961:137794"):
+    return json.dumps({
+        "stop_transaction": [2, message_id, "StopTransaction", {
+            "reason": "Other",
+            "transactionId": transaction_id,
+            "meterStop": meter_stop,
+            "timestamp": timestamp
+        }]
+    }).encode()
+
+
+@pytest.mark.parametrize("id_tag", ID_TAGS)
+def test_authorize(id_tag):
+    assert AUTHORIZE.encode(id_tag=id_tag) == authorize(id_tag)
+
+
+@pytest.mark.parametrize("id_tag", ID_TAGS)
+@pytest.mark.parametrize("timestamp", TIMESTAMPS)
+def test_start_transaction(id_tag, timestamp):
+    encoded = START_TRANSACTION.encode(id_tag=id_tag, meter_start=2656119, timestamp=timestamp)
+    assert encoded == start_transaction(id_tag, 2656119, timestamp)
+
+
+@pytest.mark.parametrize("soc, energy_wh", [(0, 0), (57, 2810542), (99.5, 10 ** 20), (-1, 1.5e-7), (True, False)])
+def test_meter_values(soc, energy_wh):
+    assert METER_VALUES.encode(soc=soc, energy_wh=energy_wh) == meter_values(soc, energy_wh)
+
+
+@pytest.mark.parametrize("timestamp", TIMESTAMPS)
+@pytest.mark.parametrize("transaction_id", [0, 42])
+def test_stop_transaction(timestamp, transaction_id):
+    encoded = STOP_TRANSACTION.encode(meter_stop=2810542, timestamp=timestamp, transaction_id=transaction_id)
+    assert encoded == stop_transaction(2810542, timestamp, transaction_id=transaction_id)
+
+
+@pytest.mark.parametrize("message_id", ['bench0:3:1581000000000000', 'id "with" \\ escapes \U0001F600'])
+def test_message_id(message_id):
+    assert AUTHORIZE.encode(message_id=message_id, id_tag="cp") == authorize("cp", message_id=message_id)
+    assert METER_VALUES.encode(message_id=message_id, soc=1, energy_wh=2) == meter_values(1, 2, message_id=message_id)
+
+
+def test_every_message_is_valid_json():
+    for encoded in (AUTHORIZE.encode(id_tag=ID_TAGS[3]), START_TRANSACTION.encode(
+            id_tag=ID_TAGS[5], meter_start=1, timestamp=TIMESTAMPS[0]), METER_VALUES.encode(soc=1, energy_wh=2),
+            STOP_TRANSACTION.encode(meter_stop=1, timestamp=TIMESTAMPS[1])):
+        json.loads(encoded)
+
+
+def test_missing_required_slot():
+    with pytest.raises(KeyError):
+        START_TRANSACTION.encode(id_tag="cp", timestamp=TIMESTAMPS[0])
+
+
+def test_encode_value():
+    assert encode_value(12) == b"12"
+    assert encode_value(True) == b"true"
+    assert encode_value("ç") == json.dumps("ç").encode()
@@ -0,0 +1,56 @@
+"""
+Shared meter value sampling, run on a virtual clock so the schedule is exact.
+"""
+import asyncio
+
+from clock import VirtualClock
+from scheduler import SamplingScheduler
+
+
+class Charger:
+    def __init__(self, scheduler, samples):
+        self.scheduler = scheduler
+        self.samples = samples
+        self.times = []
+
+    def sample_meter_value(self):
+        self.times.append(self.scheduler.clock.time())
+        if len(self.times) == self.samples:
+            self.scheduler.unregister(self)
+
+
+def run(scheduler, chargers):
+    async def main():
+        for charger in chargers:
+            scheduler.register(charger)
+        while len(scheduler):
+            await scheduler.clock.sleep(0.25)
+
+    asyncio.run(main())
+
+
+def test_each_charger_is_sampled_once_per_interval_on_its_phase():
+    scheduler = SamplingScheduler(interval=2, phases=2, clock=VirtualClock())
+    first, second = Charger(scheduler, 3), Charger(scheduler, 3)
+    run(scheduler, [first, second])
+    assert first.times == [0.0, 2.0, 4.0]
+    assert second.times == [1.0, 3.0, 5.0]
+    assert scheduler.stats() == {"sampling_ticks": 6, "sampling_lag_seconds_total": 0.0, "max_sampling_lag_seconds": 0.0}
+
+
+def test_on_tick_runs_before_each_slot():
+    ticks = []
+    scheduler = SamplingScheduler(interval=1, phases=1, clock=VirtualClock(), on_tick=ticks.append)
+    charger = Charger(scheduler, 2)
+    run(scheduler, [charger])
+    assert ticks == [0.0, 1.0]
+    assert charger.times == [0.0, 1.0]
+
+
+def test_register_twice_and_unregister_unknown():
+    scheduler = SamplingScheduler(interval=1, phases=3, clock=VirtualClock())
+    charger = Charger(scheduler, 1)
+    run(scheduler, [charger, charger])
+    assert charger.times == [0.0]
+    scheduler.unregister(charger)
+    assert len(scheduler) == 0
@@ -0,0 +1,43 @@
+"""
+Partitioning of the devices across the shards and merging of the counters they report.
+"""
+import pytest
+
+from sharding import aggregate_counters, partition_devices, run_sharded
+
+
+def test_partition_devices_round_robin():
+    devices = {"cp_{0}".format(index): "id{0}".format(index) for index in range(7)}
+    partitions = partition_devices(devices, 3)
+    assert [len(partition) for partition in partitions] == [3, 2, 2]
+    assert partitions[0] == {"cp_0": "id0", "cp_3": "id3", "cp_6": "id6"}
+    assert {label: device_id for partition in partitions for label, device_id in partition.items()} == devices
+
+
+def test_partition_devices_drops_empty_partitions():
+    assert partition_devices({"cp_0": "id0", "cp_1": "id1"}, 4) == [{"cp_0": "id0"}, {"cp_1": "id1"}]
+    assert partition_devices({}, 2) == []
+
+
+def test_aggregate_counters():
+    totals = aggregate_counters([
+        {"shard": 0, "pid": 10, "messages_sent": 5, "elapsed_seconds": 2.0, "max_simulated_seconds": 60,
+         "connect_p99_ms": 3.0, "connect_max_ms": 5.0, "generation_fraction": 0.2, "connect_mean_ms": None},
+        {"shard": 1, "pid": 11, "messages_sent": 7, "elapsed_seconds": 3.0, "max_simulated_seconds": 50,
+         "connect_p99_ms": 4.0, "connect_max_ms": 9.0, "generation_fraction": 0.4, "error": "OSError()"},
+    ])
+    assert totals == {
+        "shards": 2,
+        "errors": ["OSError()"],
+        "messages_sent": 12,
+        "elapsed_seconds": 3.0,
+        "max_simulated_seconds": 60,
+        "worst_shard_connect_p99_ms": 4.0,
+        "connect_max_ms": 9.0,
+        "generation_fraction": pytest.approx(0.3)
+    }
+
+
+def test_run_sharded_rejects_no_workers():
+    with pytest.raises(ValueError):
+        run_sharded(None, {"cp_0": "id0"}, workers=0)
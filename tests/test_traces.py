@@ -0,0 +1,104 @@
+"""
+Trace recording and reading round trip, and the replay of a trace.
+"""
+import asyncio
+import itertools
+
+import pytest
+
+from traces import Replayer, TraceReader, TraceWriter, compression_of_path, parse_speed
+
+MESSAGES = [
+    ("a1b2", "admin:a1b2/attrs", b'{"authorize": [2, "abcdefg", "Authorize", {"idTag": "cp_0"}]}'),
+    ("c3d4", "admin:c3d4/attrs", b""),
+    ("a1b2", "admin:a1b2/attrs", bytes(range(256)) * 40),
+    ("a1b2", "admin:a1b2/other", b"\x00"),
+]
+
+
+def record(path, **kwargs):
+    timer = itertools.count(0, 0.5).__next__  # Each message half a second after the previous one
+    with TraceWriter(str(path), timer=timer, **kwargs) as writer:
+        for message in MESSAGES:
+            writer.record(*message)
+    return writer
+
+
+@pytest.mark.parametrize("name", ["run.trace", "run.trace.gz", "run.trace.zst"])
+def test_round_trip(tmp_path, name):
+    if name.endswith(".zst"):
+        pytest.importorskip("zstandard")
+    assert record(tmp_path / name).messages == len(MESSAGES)
+
+    with TraceReader(str(tmp_path / name)) as reader:
+        records = list(reader.records())
+        assert [(time_us, payload) for time_us, _, payload in records] == [
+            (500000 * (index + 1), payload) for index, (_, _, payload) in enumerate(MESSAGES)]
+        assert [reader.streams[stream] for _, stream, _ in records] == [
+            (device_id, topic) for device_id, topic, _ in MESSAGES]
+        assert reader.scan() == {
+            "messages": 4, "bytes": sum(len(payload) for _, _, payload in MESSAGES), "seconds": 1.5,
+            "devices": ["a1b2", "c3d4"]
+        }
+
+
+def test_compression_of_path():
+    assert [compression_of_path(path) for path in ("a.trace", "a.trace.gz", "a.zst")] == [None, "gzip", "zstd"]
+
+
+def test_interrupted_recording_loses_only_its_last_record(tmp_path):
+    record(tmp_path / "run.trace")
+    data = (tmp_path / "run.trace").read_bytes()
+    (tmp_path / "cut.trace").write_bytes(data[:-1])
+    with TraceReader(str(tmp_path / "cut.trace")) as reader:
+        assert [payload for _, _, payload in reader.records()] == [payload for _, _, payload in MESSAGES[:-1]]
+
+
+def test_not_a_trace(tmp_path):
+    (tmp_path / "other.bin").write_bytes(b"something else")
+    with pytest.raises(ValueError):
+        TraceReader(str(tmp_path / "other.bin"))
+
+
+def test_close_while_iterating(tmp_path):
+    record(tmp_path / "run.trace")
+    reader = TraceReader(str(tmp_path / "run.trace"))
+    records = reader.records()
+    payload = next(records)[2]
+    reader.close()
+    assert payload == MESSAGES[0][2]
+
+
+def test_parse_speed():
+    assert parse_speed(None) is None
+    assert parse_speed(" MAX ") is None
+    assert parse_speed("2.5") == 2.5
+    with pytest.raises(ValueError):
+        parse_speed("0")
+
+
+class Client:
+    def __init__(self):
+        self.sent = []
+
+    def has_room(self):
+        return True
+
+    async def wait_for_room(self):
+        pass
+
+    def send(self, payload):
+        self.sent.append(payload)
+        return True
+
+
+@pytest.mark.parametrize("speed", [None, 100.0])
+def test_replay_skips_unknown_devices(tmp_path, speed):
+    record(tmp_path / "run.trace")
+    client = Client()
+    with TraceReader(str(tmp_path / "run.trace")) as reader:
+        report = asyncio.run(Replayer(reader, {"a1b2": client}, speed=speed).run())
+    assert (report["published"], report["dropped"], report["skipped"]) == (3, 0, 1)
+    assert client.sent == [payload for device_id, _, payload in MESSAGES if device_id == "a1b2"]
+    if speed is not None:
+        assert report["elapsed_seconds"] >= 1.5 / speed
@@ -0,0 +1,318 @@
+"""
+Record the simulator traffic to a binary trace and replay it.
+
+A trace is an append-only sequence of length-prefixed records after an 8 byte magic::
+
+    kind (uint8) | time_us (uint64) | stream (uint32) | length (uint32) | length bytes
+
+all little endian. A ``DEFINE`` record introduces a stream (``device_id``, a NUL byte and the topic) the first time a
+device publishes, and each ``MESSAGE`` record holds one payload published on a stream, ``time_us`` microseconds after
+the recording started. A recording cut short loses at most its last, partial, record.
+
+The whole file can be gzip or (if the ``zstandard`` package is installed) zstd compressed; the reader recognizes
+both. :class:`TraceReader` memory-maps the trace (decompressing it once to a temporary file first if needed) and
+:class:`Replayer` publishes its payloads again, as they were, over the simulator MQTT clients at the original, a
+scaled or the maximum speed:
+
+>>> mqtt.Client.recorder = TraceWriter("run.trace.gz")  # Every message published from now on is recorded
+>>> ...
+>>> mqtt.Client.recorder.close()
+>>> reader = TraceReader("run.trace.gz")
+>>> report = await Replayer(reader, clients, speed=None).run()
+"""
+import asyncio
+import gzip
+import mmap
+import shutil
+import struct
+import tempfile
+import time
+
+try:
+    import zstandard
+except ImportError:  # zstd traces are optional
+    zstandard = None
+
+MAGIC = b"CPTRACE\x01"
+"""bytes: First bytes of an uncompressed trace."""
+
+DEFINE, MESSAGE = 0, 1
+"""int: Kinds of record."""
+
+RECORD_HEADER = struct.Struct("<BQII")
+"""struct.Struct: Header of every record."""
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def _open_compressed(path, mode, compression):
+    if compression is None:
+        return open(path, mode)
+    elif compression == "gzip":
+        return gzip.open(path, mode, compresslevel=6)
+    elif compression == "zstd":
+        if zstandard is None:
+            raise ImportError("the zstandard package is required to read or write zstd traces")
+        return zstandard.open(path, mode)
+    raise ValueError("unknown trace compression {0}".format(compression))
+
+
+def compression_of_path(path):
+    """
+    Get the compression of a trace from its file name: ``.gz`` is gzip, ``.zst`` is zstd, anything else none.
+    """
+    path = str(path)
+    if path.endswith(".gz"):
+        return "gzip"
+    elif path.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+class TraceWriter:
+    """
+    Appends the published messages to a trace file.
+
+    Meant to be set as :attr:`mqtt.Client.recorder`, which calls :meth:`record` for every message handed to the
+    broker. Not thread safe: record from one thread, the event loop one.
+
+    Attributes
+    ----------
+    path : str
+        Trace file, truncated when the writer is created.
+    compression : str/None
+        ``"gzip"``, ``"zstd"`` or None. By default, taken from the file extension.
+    timer : callable
+        Seconds of the recording timeline, the monotonic wall clock by default.
+    messages : int
+        Messages recorded.
+    """
+    def __init__(self, path, compression="auto", timer=time.monotonic):
+        self.path = path
+        self.compression = compression_of_path(path) if compression == "auto" else compression
+        self.messages = 0
+        self._timer = timer
+        self._origin = timer()
+        self._streams = {}
+        self._file = _open_compressed(path, "wb", self.compression)
+        self._file.write(MAGIC)
+
+    def record(self, device_id, topic, payload):
+        elapsed_us = int((self._timer() - self._origin) * 1e6)
+        key = (device_id, topic)
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = self._streams[key] = len(self._streams)
+            definition = device_id.encode() + b"\x00" + topic.encode()
+            self._file.write(RECORD_HEADER.pack(DEFINE, elapsed_us, stream, len(definition)) + definition)
+        self._file.write(RECORD_HEADER.pack(MESSAGE, elapsed_us, stream, len(payload)))
+        self._file.write(payload)
+        self.messages += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TraceReader:
+    """
+    Memory-mapped view of a trace.
+
+    Attributes
+    ----------
+    path : str
+        Trace file, compressed or not.
+    streams : list
+        ``(device_id, topic)`` of each stream, filled as the records are read.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.streams = []
+        with open(path, "rb") as trace_file:
+            start = trace_file.read(4)
+
+        if start.startswith(_GZIP_MAGIC):
+            compression = "gzip"
+        elif start.startswith(_ZSTD_MAGIC):
+            compression = "zstd"
+        else:
+            compression = None
+
+        if compression is None:
+            self._file = open(path, "rb")
+        else:
+            self._file = tempfile.TemporaryFile()
+            with _open_compressed(path, "rb", compression) as compressed:
+                shutil.copyfileobj(compressed, self._file, 1 << 20)
+            self._file.flush()
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("{0} is not a simulator trace".format(path))
+
+    def records(self):
+        """
+        Iterate over the messages of the trace.
+
+        Yields
+        ------
+        tuple
+            ``(time_us, stream, payload)``, ``payload`` being the bytes of the message and ``stream`` an index of
+            :attr:`streams`. They are copied out of the mapped file, which :meth:`close` can then unmap at any time.
+        """
+        view = self._map  # Slicing the mmap copies, no memoryview stays exported
+        unpack_header = RECORD_HEADER.unpack_from
+        header_size = RECORD_HEADER.size
+        position = len(MAGIC)
+        end = len(view)
+        streams = self.streams
+
+        while position + header_size <= end:
+            kind, time_us, stream, length = unpack_header(view, position)
+            position += header_size
+            if position + length > end:
+                break  # Partial last record of an interrupted recording
+            body = view[position:position + length]
+            position += length
+
+            if kind == MESSAGE:
+                yield time_us, stream, body
+            elif kind == DEFINE:
+                device_id, _, topic = bytes(body).partition(b"\x00")
+                if stream == len(streams):
+                    streams.append((device_id.decode(), topic.decode()))
+
+    def scan(self):
+        """
+        Read the whole trace once, without its payloads.
+
+        Returns
+        -------
+        dict
+            Messages, payload bytes, seconds from the first to the last message and device ids of the trace.
+        """
+        messages = 0
+        payload_bytes = 0
+        first = last = None
+        for time_us, stream, payload in self.records():
+            messages += 1
+            payload_bytes += len(payload)
+            if first is None:
+                first = time_us
+            last = time_us
+        return {
+            "messages": messages,
+            "bytes": payload_bytes,
+            "seconds": (last - first) / 1e6 if messages else 0.0,
+            "devices": sorted({device_id for device_id, _ in self.streams})
+        }
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def parse_speed(speed):
+    """
+    Parse a replay speed: ``"max"`` (or empty) is as fast as possible (None), a number scales the original timing.
+    """
+    if speed is None or str(speed).strip().lower() in ("", "max"):
+        return None
+    speed = float(speed)
+    if speed <= 0:
+        raise ValueError("replay speed must be positive, not {0}".format(speed))
+    return speed
+
+
+class Replayer:
+    """
+    Publishes the messages of a trace again, through connected :class:`mqtt.Client` instances.
+
+    At a given ``speed`` each message is published ``time_us / speed`` after the start of the replay; with None
+    they go out as fast as the clients' windows allow.
+
+    Attributes
+    ----------
+    reader : TraceReader
+        Trace to replay.
+    clients : dict
+        Connected client of each device id of the trace. Messages of other devices are skipped.
+    speed : float/None
+        Replay speed, 1 being the original one.
+    yield_every : int
+        Messages published between two yields to the event loop at maximum speed, so the sockets get written.
+    """
+    yield_every = 256
+
+    def __init__(self, reader, clients, speed=1.0):
+        self.reader = reader
+        self.clients = clients
+        self.speed = speed
+
+    async def run(self):
+        """
+        Replay the whole trace.
+
+        Returns
+        -------
+        dict
+            Messages published, dropped (window full or refused) and skipped (unknown device), the wall seconds of
+            the replay, the messages per second and the largest delay behind the trace timing.
+        """
+        loop = asyncio.get_running_loop()
+        streams = self.reader.streams
+        clients_by_stream = []
+        published = dropped = skipped = 0
+        max_lag = 0.0
+        speed = self.speed
+        first_us = None
+
+        start = loop.time()
+        for time_us, stream, payload in self.reader.records():
+            while stream >= len(clients_by_stream):
+                clients_by_stream.append(self.clients.get(streams[len(clients_by_stream)][0]))
+            client = clients_by_stream[stream]
+            if client is None:
+                skipped += 1
+                continue
+
+            if speed is not None:
+                if first_us is None:
+                    first_us = time_us
+                delay = start + (time_us - first_us) / 1e6 / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    max_lag = max(max_lag, -delay)
+            elif (published + dropped) % self.yield_every == 0:
+                await asyncio.sleep(0)
+
+            if not client.has_room():
+                await client.wait_for_room()
+            if client.send(payload):
+                published += 1
+            else:
+                dropped += 1
+
+        elapsed = loop.time() - start
+        return {
+            "published": published,
+            "dropped": dropped,
+            "skipped": skipped,
+            "elapsed_seconds": elapsed,
+            "messages_per_second": published / elapsed if elapsed else 0.0,
+            "max_lag_seconds": max_lag
+        }